@@ -0,0 +1,317 @@
+# backend/archivo.py
+# Archivo frío de lecturas en Parquet (opcional, ARCHIVO_DIRECTORIO=...).
+#
+# - Los días cerrados (más viejos que ARCHIVO_DIAS_CALIENTES) se escriben a un
+#   archivo Parquet comprimido por sensor y por día:
+#   <ARCHIVO_DIRECTORIO>/sensor=<id>/<AAAA-MM-DD>.parquet
+# - La "frontera" es el inicio del primer día sin archivar. Lo anterior se lee
+#   de los archivos (memory-mapped) y lo posterior de la tabla lecturas, así
+#   nunca se duplican filas aunque no se poden.
+# - Con ARCHIVO_PODAR=1 las filas archivadas se borran de lecturas (por id:
+#   una fila vieja que llega durante la corrida queda para la próxima). Los
+#   rollups no se tocan: los agregados siguen saliendo de la DB.
+# - Con varios workers corre uno a la vez: el resto encuentra el lock
+#   (<ARCHIVO_DIRECTORIO>/.archivando.lock) tomado y saltea esa corrida.
+# - Archivar es idempotente: si un día ya tiene archivo se fusiona por id
+#   (lecturas que llegaron tarde o una corrida que se cortó antes de podar).
+# - Requiere pyarrow (dependencia opcional, solo si se usa ARCHIVO_DIRECTORIO).
+import json
+import logging
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from .models_db import LecturaDB
+from .rollups import a_utc
+from . import metricas
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_DIRECTORIO = os.getenv("ARCHIVO_DIRECTORIO")
+ARCHIVO_DIAS_CALIENTES = int(os.getenv("ARCHIVO_DIAS_CALIENTES", "90"))
+ARCHIVO_PODAR = os.getenv("ARCHIVO_PODAR", "0") == "1"
+ARCHIVO_INTERVALO_HORAS = float(os.getenv("ARCHIVO_INTERVALO_HORAS", "24"))
+FILAS_POR_BLOQUE = 10_000
+
+_estadisticas = {"corridas": 0, "corridas_omitidas": 0, "archivos_escritos": 0, "filas_archivadas": 0, "filas_podadas": 0, "lecturas_frias": 0}
+
+
+class FilaArchivada(NamedTuple):
+    """Misma forma que las filas de crud.consulta_historial."""
+    id: int
+    valor: float
+    fecha: datetime
+    sensor_id: int
+
+
+def _metricas() -> dict:
+    limite = frontera()
+    return {"activo": bool(ARCHIVO_DIRECTORIO), "frontera": limite.isoformat() if limite else None, **_estadisticas}
+
+
+metricas.registrar("archivo", _metricas)
+
+
+def _pyarrow():
+    import pyarrow  # dependencia opcional: solo hace falta si se usa ARCHIVO_DIRECTORIO
+    import pyarrow.compute
+    import pyarrow.parquet
+    return pyarrow
+
+
+def _esquema():
+    pa = _pyarrow()
+    return pa.schema([("id", pa.int64()), ("valor", pa.float64()), ("fecha", pa.timestamp("us", tz="UTC"))])
+
+
+def _ruta(directorio: str, sensor_id: int, dia: date) -> str:
+    return os.path.join(directorio, f"sensor={sensor_id}", f"{dia.isoformat()}.parquet")
+
+
+def _inicio_del_dia(dia: date) -> datetime:
+    return datetime.combine(dia, time.min, tzinfo=timezone.utc)
+
+
+# --- FRONTERA ---
+
+def frontera(directorio: str = None) -> Optional[datetime]:
+    """Inicio del primer día que sigue en la tabla caliente; None si nunca se archivó."""
+    directorio = directorio or ARCHIVO_DIRECTORIO
+    if not directorio:
+        return None
+    try:
+        with open(os.path.join(directorio, "frontera.json"), encoding="utf-8") as archivo:
+            return datetime.fromisoformat(json.load(archivo)["frontera"])
+    except FileNotFoundError:
+        return None
+
+
+def _guardar_frontera(directorio: str, valor: datetime) -> None:
+    temporal = os.path.join(directorio, "frontera.json.tmp")
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump({"frontera": valor.isoformat()}, archivo)
+    os.replace(temporal, os.path.join(directorio, "frontera.json"))
+
+
+# --- ESCRITURA ---
+
+def _escribir_dia(directorio: str, sensor_id: int, dia: date, filas: List[Tuple[int, float, datetime]]) -> None:
+    pa = _pyarrow()
+    ruta = _ruta(directorio, sensor_id, dia)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ids, valores, fechas = zip(*filas)
+    tabla = pa.table([list(ids), list(valores), [a_utc(f) for f in fechas]], schema=_esquema())
+    if os.path.exists(ruta):
+        # Fusión con lo ya archivado: gana la copia archivada de cada id
+        previa = pa.parquet.read_table(ruta, memory_map=True)
+        nuevas = pa.compute.invert(pa.compute.is_in(tabla["id"], value_set=previa["id"]))
+        tabla = pa.concat_tables([previa, tabla.filter(nuevas)])
+    tabla = tabla.sort_by([("fecha", "ascending"), ("id", "ascending")])
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    pa.parquet.write_table(tabla, temporal, compression="zstd")
+    os.replace(temporal, ruta)
+    _estadisticas["archivos_escritos"] += 1
+
+
+@contextmanager
+def _exclusivo(directorio: str) -> Iterator[bool]:
+    """True si este proceso tomó el lock del archivo; False si otro está archivando."""
+    with open(os.path.join(directorio, ".archivando.lock"), "a") as candado:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+
+
+def archivar(db: Session, antes_de: date = None, directorio: str = None, podar: bool = None) -> dict:
+    """
+    Archiva todas las lecturas anteriores a `antes_de` (por defecto hoy - ARCHIVO_DIAS_CALIENTES)
+    y mueve la frontera. Con `podar` borra de la tabla lecturas las filas archivadas.
+    Si otro proceso está archivando no hace nada (`omitida`).
+    """
+    directorio = directorio or ARCHIVO_DIRECTORIO
+    podar = ARCHIVO_PODAR if podar is None else podar
+    antes_de = antes_de or datetime.now(timezone.utc).date() - timedelta(days=ARCHIVO_DIAS_CALIENTES)
+    limite = _inicio_del_dia(antes_de)
+    _pyarrow()
+    os.makedirs(directorio, exist_ok=True)
+
+    with _exclusivo(directorio) as tomado:
+        if not tomado:
+            _estadisticas["corridas_omitidas"] += 1
+            return {"frontera": limite.isoformat(), "archivos": 0, "filas": 0, "podadas": 0, "omitida": True}
+        return _archivar(db, limite, directorio, podar)
+
+
+def _archivar(db: Session, limite: datetime, directorio: str, podar: bool) -> dict:
+    # 1. Una pasada ordenada por (sensor, fecha): en memoria solo vive un sensor-día
+    consulta = (
+        select(LecturaDB.id, LecturaDB.valor, LecturaDB.fecha, LecturaDB.sensor_id)
+        .where(LecturaDB.fecha < limite)
+        .order_by(LecturaDB.sensor_id, LecturaDB.fecha, LecturaDB.id)
+        .execution_options(yield_per=FILAS_POR_BLOQUE)
+    )
+    clave_actual, filas, total, archivos = None, [], 0, 0
+    archivadas = array("q")  # ids de lo escrito: 8 bytes por fila, para podar exactamente eso
+    for fila in db.execute(consulta):
+        clave = (fila.sensor_id, a_utc(fila.fecha).date())
+        if clave != clave_actual and filas:
+            _escribir_dia(directorio, *clave_actual, filas)
+            archivos += 1
+            filas = []
+        clave_actual = clave
+        filas.append((fila.id, fila.valor, fila.fecha))
+        archivadas.append(fila.id)
+        total += 1
+    if filas:
+        _escribir_dia(directorio, *clave_actual, filas)
+        archivos += 1
+
+    # 2. La frontera solo avanza: lo anterior ya se lee de los archivos
+    anterior = frontera(directorio)
+    if anterior is None or limite > anterior:
+        _guardar_frontera(directorio, limite)
+
+    # 3. Poda: los archivos ya están escritos, si se corta acá la próxima corrida fusiona.
+    # Solo los ids archivados: una fila vieja que se commiteó después del SELECT
+    # (lote de un gateway, replay del log de ingesta) sigue en la tabla hasta la próxima corrida.
+    podadas = 0
+    if podar:
+        for inicio in range(0, len(archivadas), FILAS_POR_BLOQUE):
+            bloque = archivadas[inicio:inicio + FILAS_POR_BLOQUE].tolist()
+            podadas += db.execute(
+                delete(LecturaDB).where(LecturaDB.id.in_(bloque), LecturaDB.fecha < limite)
+            ).rowcount
+    db.commit()
+
+    _estadisticas["corridas"] += 1
+    _estadisticas["filas_archivadas"] += total
+    _estadisticas["filas_podadas"] += podadas
+    return {"frontera": limite.isoformat(), "archivos": archivos, "filas": total, "podadas": podadas}
+
+
+# --- LECTURA ---
+
+def leer(
+    sensor_id: int,
+    desde: datetime = None,
+    hasta: datetime = None,
+    despues_de: Tuple[datetime, int] = None,
+    cada: int = None,
+    directorio: str = None,
+) -> Iterator[List[FilaArchivada]]:
+    """
+    Bloques de filas archivadas del sensor ordenadas por (fecha, id), con los mismos
+    filtros que crud.consulta_historial. Solo abre los archivos de los días del rango.
+    """
+    directorio = directorio or ARCHIVO_DIRECTORIO
+    limite = frontera(directorio)
+    if limite is None:
+        return
+    hasta = min(a_utc(hasta), limite) if hasta is not None else limite
+    desde = a_utc(desde) if desde is not None else None
+    if despues_de is not None:
+        despues_de = (a_utc(despues_de[0]), despues_de[1])
+    if desde is not None and desde >= hasta:
+        return
+
+    carpeta = os.path.join(directorio, f"sensor={sensor_id}")
+    try:
+        nombres = sorted(n for n in os.listdir(carpeta) if n.endswith(".parquet"))
+    except FileNotFoundError:
+        return
+
+    pa = _pyarrow()
+    pc = pa.compute
+    numero = 0  # posición dentro del rango, para el submuestreo
+    for nombre in nombres:
+        dia = date.fromisoformat(nombre[:-len(".parquet")])
+        if _inicio_del_dia(dia) >= hasta or (desde is not None and _inicio_del_dia(dia + timedelta(days=1)) <= desde):
+            continue
+        if despues_de is not None and _inicio_del_dia(dia + timedelta(days=1)) <= despues_de[0]:
+            continue
+
+        tabla = pa.parquet.read_table(os.path.join(carpeta, nombre), memory_map=True)
+        mascara = pc.less(tabla["fecha"], hasta)
+        if desde is not None:
+            mascara = pc.and_(mascara, pc.greater_equal(tabla["fecha"], desde))
+        if despues_de is not None:
+            fecha, id_lectura = despues_de
+            posterior = pc.or_(
+                pc.greater(tabla["fecha"], fecha),
+                pc.and_(pc.equal(tabla["fecha"], fecha), pc.greater(tabla["id"], id_lectura)),
+            )
+            mascara = pc.and_(mascara, posterior)
+        tabla = tabla.filter(mascara)
+
+        if cada and cada > 1:
+            # La N-ésima de cada grupo, contando a través de los días
+            primera = (cada - numero % cada - 1) % cada
+            numero += tabla.num_rows
+            tabla = tabla.take(list(range(primera, tabla.num_rows, cada)))
+        if tabla.num_rows:
+            _estadisticas["lecturas_frias"] += tabla.num_rows
+            # to_pylist() con zona horaria es ~2x más lento que sin ella + replace()
+            fechas = tabla["fecha"].cast(pa.timestamp("us")).to_pylist()
+            yield [
+                FilaArchivada(i, v, f.replace(tzinfo=timezone.utc), sensor_id)
+                for i, v, f in zip(tabla["id"].to_pylist(), tabla["valor"].to_pylist(), fechas)
+            ]
+
+
+def inicio_caliente(desde: Optional[datetime]) -> Optional[datetime]:
+    """`desde` para la consulta a la tabla lecturas: nunca antes de la frontera."""
+    limite = frontera()
+    if limite is None:
+        return desde
+    return limite if desde is None or a_utc(desde) < limite else desde
+
+
+def iniciar_archivado_periodico(fabrica_sesion) -> threading.Event:
+    """Archiva ya y después cada ARCHIVO_INTERVALO_HORAS."""
+    detener = threading.Event()
+
+    def _bucle():
+        while True:
+            try:
+                with fabrica_sesion() as db:
+                    resultado = archivar(db)
+                if resultado["filas"]:
+                    logger.info("Lecturas archivadas: %s", resultado)
+            except Exception:
+                logger.exception("Falló el archivado de lecturas")
+            if detener.wait(ARCHIVO_INTERVALO_HORAS * 3600):
+                return
+
+    threading.Thread(target=_bucle, name="archivo-lecturas", daemon=True).start()
+    return detener
+
+
+if __name__ == "__main__":
+    # Uso: ARCHIVO_DIRECTORIO=/datos/archivo python -m backend.archivo
+    from .database import SessionLocal
+
+    if not ARCHIVO_DIRECTORIO:
+        raise SystemExit("❌ Definí ARCHIVO_DIRECTORIO")
+    print(f"📦 Archivando lecturas anteriores a hoy - {ARCHIVO_DIAS_CALIENTES} días en {ARCHIVO_DIRECTORIO}...")
+    with SessionLocal() as db:
+        print(f"✅ {archivar(db)}")
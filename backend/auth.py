@@ -1,10 +1,16 @@
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
 
+from . import metricas
+
 load_dotenv()
 
 # Configuraciones desde el .env
@@ -12,7 +18,12 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", truncate_error=False)
+# Costo de bcrypt y tamaño del pool dedicado a hashear
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_HILOS = int(os.getenv("BCRYPT_HILOS", "2"))
+BCRYPT_MAX_EN_COLA = int(os.getenv("BCRYPT_MAX_EN_COLA", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", truncate_error=False, bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verificar_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -20,6 +31,86 @@ def verificar_password(plain_password, hashed_password):
 def obtener_password_hash(password):
     return pwd_context.hash(password)
 
+class HashingSaturado(Exception):
+    """La cola de bcrypt está llena: conviene responder 503 en vez de esperar."""
+
+class PoolHashing:
+    """
+    Executor acotado solo para bcrypt. Una ráfaga de logins espera acá
+    y no le ocupa los threads de Starlette al resto de los endpoints.
+    """
+
+    def __init__(self, hilos: int, max_en_cola: int):
+        self.hilos = hilos
+        self.max_en_cola = max_en_cola
+        self._executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pendientes = 0  # en cola + ejecutándose
+        self.en_curso = 0
+        self.completadas = 0
+        self.fallidas = 0
+        self.rechazadas = 0
+        self._iniciadas = 0  # las que llegaron a un hilo: base de espera_media_ms
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+
+    async def ejecutar(self, funcion, *args):
+        with self._lock:
+            if self.pendientes >= self.hilos + self.max_en_cola:
+                self.rechazadas += 1
+                raise HashingSaturado()
+            self.pendientes += 1
+        encolada = time.perf_counter()
+
+        def _tarea():
+            espera = time.perf_counter() - encolada
+            with self._lock:
+                self.en_curso += 1
+                self._iniciadas += 1
+                self.espera_total += espera
+                self.espera_maxima = max(self.espera_maxima, espera)
+            try:
+                return funcion(*args)
+            finally:
+                with self._lock:
+                    self.en_curso -= 1
+
+        exito = False
+        try:
+            resultado = await asyncio.get_running_loop().run_in_executor(self._executor, _tarea)
+            exito = True
+            return resultado
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+                if exito:
+                    self.completadas += 1
+                else:
+                    self.fallidas += 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "hilos": self.hilos,
+                "rounds": BCRYPT_ROUNDS,
+                "en_cola": self.pendientes - self.en_curso,
+                "en_curso": self.en_curso,
+                "completadas": self.completadas,
+                "fallidas": self.fallidas,
+                "rechazadas": self.rechazadas,
+                "espera_media_ms": round(self.espera_total / self._iniciadas * 1000, 2) if self._iniciadas else 0.0,
+                "espera_maxima_ms": round(self.espera_maxima * 1000, 2),
+            }
+
+pool_hashing = PoolHashing(BCRYPT_HILOS, BCRYPT_MAX_EN_COLA)
+metricas.registrar("bcrypt", pool_hashing.estadisticas)
+
+async def verificar_password_async(plain_password, hashed_password):
+    return await pool_hashing.ejecutar(verificar_password, plain_password, hashed_password)
+
+async def obtener_password_hash_async(password):
+    return await pool_hashing.ejecutar(obtener_password_hash, password)
+
 def crear_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Genera un token JWT firmado"""
     to_encode = data.copy()
@@ -0,0 +1,173 @@
+# backend/cache.py
+# Caché clave/valor con TTL. Por defecto vive en memoria del proceso (LRU);
+# con CACHE_URL=redis://... se comparte entre todos los workers de uvicorn.
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+CACHE_URL = os.getenv("CACHE_URL")
+
+
+class BackendCache(ABC):
+    """Interfaz mínima que tiene que cumplir cualquier backend de caché."""
+
+    @abstractmethod
+    def obtener(self, clave: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def guardar(self, clave: str, valor: Any, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def borrar(self, clave: str) -> None:
+        ...
+
+    @abstractmethod
+    def limpiar(self) -> None:
+        ...
+
+    @abstractmethod
+    def version(self, clave: str) -> int:
+        """Contador sin vencimiento (0 si no existe). Sirve para invalidar por etiqueta."""
+
+    @abstractmethod
+    def incrementar(self, clave: str) -> int:
+        ...
+
+
+class BackendMemoria(BackendCache):
+    """LRU en memoria con vencimiento por entrada. Seguro para usar desde varios threads."""
+
+    def __init__(self, tamanio_maximo: int = 1000):
+        self.tamanio_maximo = tamanio_maximo
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()
+        self._contadores: dict = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, vence = entrada
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor, ttl):
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamanio_maximo:
+                self._datos.popitem(last=False)
+
+    def borrar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def version(self, clave):
+        return self._contadores.get(clave, 0)
+
+    def incrementar(self, clave):
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+            return self._contadores[clave]
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class BackendRedis(BackendCache):
+    """Backend compartido. Los valores se guardan como JSON bajo un prefijo propio."""
+
+    def __init__(self, url: str, prefijo: str):
+        import redis  # dependencia opcional: solo hace falta si se usa CACHE_URL
+
+        self._cliente = redis.Redis.from_url(url)
+        self._prefijo = f"agrotech:{prefijo}:"
+
+    def obtener(self, clave):
+        crudo = self._cliente.get(self._prefijo + clave)
+        return json.loads(crudo) if crudo is not None else None
+
+    def guardar(self, clave, valor, ttl):
+        self._cliente.set(self._prefijo + clave, json.dumps(valor), px=int(ttl * 1000))
+
+    def borrar(self, clave):
+        self._cliente.delete(self._prefijo + clave)
+
+    def limpiar(self):
+        claves = list(self._cliente.scan_iter(self._prefijo + "*"))
+        if claves:
+            self._cliente.delete(*claves)
+
+    def version(self, clave):
+        crudo = self._cliente.get(self._prefijo + "v:" + clave)
+        return int(crudo) if crudo is not None else 0
+
+    def incrementar(self, clave):
+        # INCR es atómico: dos workers que invalidan a la vez no se pisan
+        return self._cliente.incr(self._prefijo + "v:" + clave)
+
+
+def crear_backend(nombre: str, tamanio_maximo: int) -> BackendCache:
+    """Redis si hay CACHE_URL configurada, si no un LRU en memoria."""
+    if CACHE_URL:
+        return BackendRedis(CACHE_URL, nombre)
+    return BackendMemoria(tamanio_maximo)
+
+
+class Cache:
+    """Caché con TTL fijo y contadores de aciertos/fallos."""
+
+    def __init__(self, nombre: str, backend: BackendCache, ttl: float):
+        self.nombre = nombre
+        self.backend = backend
+        self.ttl = ttl
+        # Se consulta desde los threads del threadpool: += no es atómico
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        valor = self.backend.obtener(clave)
+        with self._lock:
+            if valor is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+        return valor
+
+    def guardar(self, clave: str, valor: Any) -> None:
+        self.backend.guardar(clave, valor, self.ttl)
+
+    def invalidar(self, clave: str) -> None:
+        self.backend.borrar(clave)
+
+    def limpiar(self) -> None:
+        self.backend.limpiar()
+        with self._lock:
+            self.aciertos = 0
+            self.fallos = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            aciertos, fallos = self.aciertos, self.fallos
+        total = aciertos + fallos
+        return {
+            "backend": type(self.backend).__name__,
+            "aciertos": aciertos,
+            "fallos": fallos,
+            "tasa_aciertos": round(aciertos / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,218 @@
+# backend/crud.py
+# Acceso a datos compartido entre routers: consultas y escrituras "pesadas"
+# que no conviene repetir endpoint por endpoint.
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Row, and_, func, insert, select, true, tuple_
+from sqlalchemy.orm import Session
+
+from .models_db import SectorDB, SensorDB, LecturaDB
+from .logic import AgregadoSensor
+from . import rollups
+
+
+def de_la_finca(columna, finca_id: Optional[int]):
+    """Filtro de tenant sobre una columna finca_id (NULL es el tenant de los datos sin finca)."""
+    return columna.is_(None) if finca_id is None else columna == finca_id
+
+
+def ubicaciones_de_sensores(db: Session, ids_sensores: Iterable[int]) -> Dict[int, Tuple[int, Optional[int]]]:
+    """{sensor_id: (sector_id, finca_id)} de los IDs pedidos que existen, en una sola consulta."""
+    ids = set(ids_sensores)
+    if not ids:
+        return {}
+    filas = db.execute(
+        select(SensorDB.id, SensorDB.sector_id, SectorDB.finca_id)
+        .outerjoin(SectorDB, SensorDB.sector_id == SectorDB.id)
+        .where(SensorDB.id.in_(ids))
+    )
+    return {sensor_id: (sector_id, finca_id) for sensor_id, sector_id, finca_id in filas}
+
+
+def sensor_en_finca(sensor_id: int, finca_id: Optional[int]):
+    """EXISTS para agregar a una consulta: no devuelve nada si el sensor no es de la finca."""
+    return (
+        select(SensorDB.id)
+        .outerjoin(SectorDB, SensorDB.sector_id == SectorDB.id)
+        .where(SensorDB.id == sensor_id, de_la_finca(SectorDB.finca_id, finca_id))
+        .exists()
+    )
+
+
+def sectores_en_finca(ubicaciones: Dict[int, Tuple[int, Optional[int]]], finca_id: Optional[int]) -> Dict[int, int]:
+    """{sensor_id: sector_id} solo de los sensores de la finca: los de otras se tratan como inexistentes."""
+    return {sensor_id: sector_id for sensor_id, (sector_id, finca) in ubicaciones.items() if finca == finca_id}
+
+
+def insertar_lecturas(db: Session, filas: List[Dict]) -> None:
+    """
+    Inserta muchas lecturas con un único INSERT multi-fila (executemany)
+    y las suma a los rollups. Cada fila necesita sensor_id, valor y fecha.
+    No hace commit: la transacción la cierra quien llama.
+    """
+    if not filas:
+        return
+    db.execute(insert(LecturaDB), filas)
+    rollups.acumular(db, ((f["sensor_id"], f["valor"], f["fecha"]) for f in filas))
+
+
+def ultimas_lecturas(db: Session, ids_sensores: Iterable[int], desde: datetime = None) -> Dict[int, Row]:
+    """
+    Última lectura de cada sensor resuelta en la DB (una fila por sensor).
+    Devuelve {sensor_id: fila(id, sensor_id, valor, fecha)}.
+    """
+    ids = list(ids_sensores)
+    if not ids:
+        return {}
+
+    filtros = [LecturaDB.sensor_id.in_(ids)]
+    if desde is not None:
+        filtros.append(LecturaDB.fecha >= desde)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # DISTINCT ON recorre el índice (sensor_id, fecha DESC) y corta en la primera
+        consulta = (
+            select(LecturaDB.id, LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha)
+            .where(*filtros)
+            .order_by(LecturaDB.sensor_id, LecturaDB.fecha.desc(), LecturaDB.id.desc())
+            .distinct(LecturaDB.sensor_id)
+        )
+    else:
+        # Equivalente portable: MAX(fecha) por sensor y join contra esa fecha
+        maximas = (
+            select(LecturaDB.sensor_id, func.max(LecturaDB.fecha).label("fecha"))
+            .where(*filtros)
+            .group_by(LecturaDB.sensor_id)
+            .subquery()
+        )
+        consulta = (
+            select(LecturaDB.id, LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha)
+            .join(maximas, and_(
+                LecturaDB.sensor_id == maximas.c.sensor_id,
+                LecturaDB.fecha == maximas.c.fecha
+            ))
+            .order_by(LecturaDB.id)
+        )
+
+    # Si hay empate de fecha gana el id más alto (el último insertado)
+    return {fila.sensor_id: fila for fila in db.execute(consulta)}
+
+
+
+def lecturas_recientes(db: Session, ids_sensores: Iterable[int], limite: int) -> Dict[int, List[Row]]:
+    """
+    Las `limite` lecturas más nuevas de cada sensor, en una sola consulta.
+    Devuelve {sensor_id: [filas, de nueva a vieja]}.
+    """
+    ids = list(ids_sensores)
+    if not ids:
+        return {}
+
+    if db.get_bind().dialect.name == "postgresql":
+        # LATERAL con LIMIT por sensor: cada uno lee solo `limite` entradas del
+        # índice (sensor_id, fecha DESC) en vez de numerar todo su historial
+        ultimas = (
+            select(LecturaDB.id, LecturaDB.valor, LecturaDB.fecha, LecturaDB.sensor_id)
+            .where(LecturaDB.sensor_id == SensorDB.id)
+            .order_by(LecturaDB.fecha.desc(), LecturaDB.id.desc())
+            .limit(limite)
+            .lateral("ultimas")
+        )
+        consulta = (
+            select(ultimas.c.id, ultimas.c.valor, ultimas.c.fecha, ultimas.c.sensor_id)
+            .select_from(SensorDB)
+            .join(ultimas, true())
+            .where(SensorDB.id.in_(ids))
+            .order_by(ultimas.c.sensor_id, ultimas.c.fecha.desc(), ultimas.c.id.desc())
+        )
+    else:
+        # Equivalente portable (SQLite no tiene LATERAL): ROW_NUMBER particionado por sensor
+        numeradas = (
+            select(
+                LecturaDB.id, LecturaDB.valor, LecturaDB.fecha, LecturaDB.sensor_id,
+                func.row_number().over(
+                    partition_by=LecturaDB.sensor_id,
+                    order_by=(LecturaDB.fecha.desc(), LecturaDB.id.desc())
+                ).label("n"),
+            )
+            .where(LecturaDB.sensor_id.in_(ids))
+            .subquery()
+        )
+        consulta = (
+            select(numeradas.c.id, numeradas.c.valor, numeradas.c.fecha, numeradas.c.sensor_id)
+            .where(numeradas.c.n <= limite)
+            .order_by(numeradas.c.sensor_id, numeradas.c.n)
+        )
+    por_sensor: Dict[int, List[Row]] = {}
+    for fila in db.execute(consulta):
+        por_sensor.setdefault(fila.sensor_id, []).append(fila)
+    return por_sensor
+
+def agregados_por_sensor(db: Session, ids_sensores: Iterable[int], desde: datetime, hasta: datetime = None) -> Dict[int, AgregadoSensor]:
+    """
+    AVG/COUNT/MIN/MAX por sensor en la ventana [desde, hasta), calculados en la DB.
+    Solo viaja una fila por sensor con lecturas en la ventana.
+    Con rollups habilitados se resuelve desde las tablas pre-agregadas.
+    """
+    ids = list(ids_sensores)
+    if not ids:
+        return {}
+    if rollups.ROLLUPS_HABILITADOS:
+        return rollups.agregados_ventana(db, ids, desde, hasta)
+
+    filtros = [LecturaDB.sensor_id.in_(ids), LecturaDB.fecha >= desde]
+    if hasta is not None:
+        filtros.append(LecturaDB.fecha < hasta)
+    consulta = (
+        select(
+            LecturaDB.sensor_id,
+            func.avg(LecturaDB.valor),
+            func.count(LecturaDB.id),
+            func.min(LecturaDB.valor),
+            func.max(LecturaDB.valor),
+        )
+        .where(*filtros)
+        .group_by(LecturaDB.sensor_id)
+    )
+    return {
+        sensor_id: AgregadoSensor(float(promedio), cantidad, minimo, maximo)
+        for sensor_id, promedio, cantidad, minimo, maximo in db.execute(consulta)
+    }
+
+
+def consulta_historial(
+    sensor_id: int,
+    desde: datetime = None,
+    hasta: datetime = None,
+    despues_de: Tuple[datetime, int] = None,
+    cada: int = None,
+):
+    """
+    SELECT (Core, sin ORM) del historial de un sensor ordenado por (fecha, id).
+    - `despues_de`: clave (fecha, id) de la última fila ya entregada (keyset).
+    - `cada`: submuestreo en la DB, devuelve 1 de cada N lecturas.
+    """
+    filtros = [LecturaDB.sensor_id == sensor_id]
+    if desde is not None:
+        filtros.append(LecturaDB.fecha >= rollups.a_utc(desde))
+    if hasta is not None:
+        filtros.append(LecturaDB.fecha < rollups.a_utc(hasta))
+    if despues_de is not None:
+        filtros.append(tuple_(LecturaDB.fecha, LecturaDB.id) > tuple_(*despues_de))
+
+    columnas = (LecturaDB.id, LecturaDB.valor, LecturaDB.fecha, LecturaDB.sensor_id)
+    if not cada or cada <= 1:
+        return select(*columnas).where(*filtros).order_by(LecturaDB.fecha, LecturaDB.id)
+
+    numeradas = (
+        select(*columnas, func.row_number().over(order_by=(LecturaDB.fecha, LecturaDB.id)).label("n"))
+        .where(*filtros)
+        .subquery()
+    )
+    # Se toma la N-ésima de cada grupo para que el paso se mantenga entre páginas
+    return (
+        select(numeradas.c.id, numeradas.c.valor, numeradas.c.fecha, numeradas.c.sensor_id)
+        .where(numeradas.c.n % cada == 0)
+        .order_by(numeradas.c.fecha, numeradas.c.id)
+    )
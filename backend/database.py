@@ -1,7 +1,15 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from . import metricas, perfilado
 
 # 1. Cargar las variables del archivo .env
 load_dotenv()
@@ -13,14 +21,196 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("No se encontró la variable DATABASE_URL en el archivo .env")
 
+# Modo async: AsyncEngine + AsyncSession (asyncpg en Postgres, aiosqlite en SQLite).
+# El motor sync se crea siempre: lo usan create_all, los scripts y las migraciones.
+DB_MODO_ASYNC = os.getenv("DB_MODO_ASYNC", "0") == "1"
+
+# Réplica de solo lectura (opcional): monitoreo, listado de sectores e historial
+DATABASE_URL_LECTURA = os.getenv("DATABASE_URL_LECTURA")
+
+# Pool de conexiones, POR PROCESO: con N workers de uvicorn la DB ve hasta
+# N × (DB_POOL_TAMANIO + DB_POOL_DESBORDE) conexiones por cada engine.
+DB_POOL_TAMANIO = int(os.getenv("DB_POOL_TAMANIO", "5"))
+DB_POOL_DESBORDE = int(os.getenv("DB_POOL_DESBORDE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECICLAR = int(os.getenv("DB_POOL_RECICLAR", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Sin pool propio: para cuando hay un PgBouncer adelante que ya agrupa conexiones
+DB_POOL_NULO = os.getenv("DB_POOL_NULO", "0") == "1"
+# Corta consultas colgadas del lado de Postgres (0 = sin límite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Drivers async para cada dialecto
+_DRIVERS_ASYNC = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+def url_async(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://..., sqlite://... -> sqlite+aiosqlite://..."""
+    url = make_url(url)
+    return url.set(drivername=f"{url.get_backend_name()}+{_DRIVERS_ASYNC[url.get_backend_name()]}").render_as_string(hide_password=False)
+
+
+class _PoolMedido:
+    """Cuenta checkouts, timeouts y cuánto espera cada checkout (incluye abrir conexiones nuevas)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Checkouts concurrentes desde los hilos del threadpool: += no es atómico
+        self._lock_contadores = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._lock_contadores:
+                self.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._lock_contadores:
+                self.checkouts += 1
+                self.espera_total += espera
+                self.espera_maxima = max(self.espera_maxima, espera)
+
+    def estadisticas(self) -> dict:
+        capacidad = self.size() + self._max_overflow
+        with self._lock_contadores:
+            checkouts, timeouts = self.checkouts, self.timeouts
+            espera_total, espera_maxima = self.espera_total, self.espera_maxima
+        return {
+            "tamanio": self.size(),
+            "en_uso": self.checkedout(),
+            "desborde": max(self.overflow(), 0),
+            "utilizacion": round(self.checkedout() / capacidad, 4) if capacidad else 0.0,
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "espera_promedio_ms": round(espera_total / checkouts * 1000, 3) if checkouts else 0.0,
+            "espera_maxima_ms": round(espera_maxima * 1000, 3),
+        }
+
+
+class QueuePoolMedido(_PoolMedido, QueuePool):
+    pass
+
+
+class AsyncPoolMedido(_PoolMedido, AsyncAdaptedQueuePool):
+    pass
+
+
+def _opciones_engine(url: str, asincrono: bool) -> dict:
+    """kwargs de create_engine/create_async_engine según las variables DB_POOL_*."""
+    url = make_url(url)
+    dialecto = url.get_backend_name()
+    opciones = {"pool_pre_ping": DB_POOL_PRE_PING}
+
+    if dialecto == "sqlite" and url.database in (None, "", ":memory:"):
+        # La DB en memoria vive en una sola conexión: se queda con el pool de SQLAlchemy
+        return opciones
+
+    if DB_POOL_NULO:
+        opciones["poolclass"] = NullPool
+    else:
+        opciones.update(
+            poolclass=AsyncPoolMedido if asincrono else QueuePoolMedido,
+            pool_size=DB_POOL_TAMANIO,
+            max_overflow=DB_POOL_DESBORDE,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECICLAR,
+        )
+
+    if dialecto == "postgresql" and DB_STATEMENT_TIMEOUT_MS:
+        if asincrono:
+            opciones["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            opciones["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return opciones
+
+def crear_engine(url: str):
+    return create_engine(url, **_opciones_engine(url, asincrono=False))
+
+def crear_engine_async(url: str):
+    return create_async_engine(url_async(url), **_opciones_engine(url, asincrono=True))
+
 # 3. Configuración estándar de SQLAlchemy
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = crear_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+engine_lectura = crear_engine(DATABASE_URL_LECTURA) if DATABASE_URL_LECTURA else engine
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura)
+
+async_engine = crear_engine_async(SQLALCHEMY_DATABASE_URL) if DB_MODO_ASYNC else None
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False) if DB_MODO_ASYNC else None
+
+async_engine_lectura = None
+AsyncSessionLectura = None
+if DB_MODO_ASYNC:
+    async_engine_lectura = crear_engine_async(DATABASE_URL_LECTURA) if DATABASE_URL_LECTURA else async_engine
+    AsyncSessionLectura = async_sessionmaker(async_engine_lectura, autoflush=False)
+
+def _dependencia_sesion(fabrica, fabrica_async):
+    """
+    Dependencia de FastAPI que abre una sesión por request. La sesión no toma
+    una conexión del pool hasta la primera consulta y la devuelve al terminar
+    cada llamada a `ejecutar`.
+    """
+    if DB_MODO_ASYNC:
+        async def dependencia():
+            async with fabrica_async() as db:
+                yield db
+    else:
+        def dependencia():
+            db = fabrica()
+            try:
+                yield db
+            finally:
+                db.close()
+    return dependencia
+
+get_db = _dependencia_sesion(SessionLocal, AsyncSessionLocal)
+# Sin réplica es la misma dependencia: FastAPI reutiliza la sesión dentro del
+# request y los overrides de get_db (tests) también aplican a las lecturas.
+get_db_lectura = _dependencia_sesion(SessionLectura, AsyncSessionLectura) if DATABASE_URL_LECTURA else get_db
+
+
+def _estadisticas_pools() -> dict:
+    engines = {"principal": engine, "lectura": engine_lectura}
+    if DB_MODO_ASYNC:
+        engines = {"principal": async_engine.sync_engine, "lectura": async_engine_lectura.sync_engine}
+    resultado = {}
+    for nombre, eng in engines.items():
+        if nombre == "lectura" and eng is engines["principal"]:
+            continue
+        pool = eng.pool
+        resultado[nombre] = pool.estadisticas() if isinstance(pool, _PoolMedido) else {"pool": type(pool).__name__}
+    return resultado
+
+metricas.registrar("pool_db", _estadisticas_pools)
+
+def _unidad_de_trabajo(db, funcion, *args, **kwargs):
     try:
-        yield db
+        return perfilado.en_hilo(funcion, db, *args, **kwargs)
     finally:
-        db.close()
\ No newline at end of file
+        # Cerramos la transacción y la conexión vuelve al pool: un request que
+        # espera su próximo turno en el threadpool no se queda con una conexión
+        # tomada (con muchos requests en vuelo eso agota el pool y se traba todo).
+        if db.in_transaction():
+            db.rollback()
+
+async def ejecutar(db, funcion, *args, **kwargs):
+    """
+    Corre una función de acceso a datos escrita con la API sync de Session
+    contra cualquiera de las dos sesiones:
+    - AsyncSession: run_sync (I/O async real por debajo, sin threads).
+    - Session: threadpool de Starlette, como un endpoint `def` común.
+    La función recibe la Session como primer argumento, tiene que hacer commit
+    de lo que quiera guardar y devolver datos ya cargados (nada de lazy loads
+    después de salir).
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(_unidad_de_trabajo, funcion, *args, **kwargs)
+    return await run_in_threadpool(_unidad_de_trabajo, db, funcion, *args, **kwargs)
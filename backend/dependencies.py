@@ -4,12 +4,15 @@ from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 
 # Importamos tus configuraciones de DB y Modelos
-from .database import get_db
+from .database import get_db, ejecutar
 from .models_db import UserDB
 from .models import TokenData
+from .cache import Cache, crear_backend
+from . import metricas
 
 load_dotenv()
 
@@ -17,10 +20,51 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
+# Caché de usuarios autenticados: evita un SELECT a usuarios en cada request
+CACHE_USUARIOS_TAMANIO = int(os.getenv("CACHE_USUARIOS_TAMANIO", "1000"))
+CACHE_USUARIOS_TTL = float(os.getenv("CACHE_USUARIOS_TTL", "60"))
+
+cache_usuarios = Cache("usuarios", crear_backend("usuarios", CACHE_USUARIOS_TAMANIO), CACHE_USUARIOS_TTL)
+metricas.registrar("cache_usuarios", cache_usuarios.estadisticas)
+
+# Usuarios con acceso a los endpoints de administración (perfiles), separados por coma
+ADMIN_USUARIOS = {u.strip() for u in os.getenv("ADMIN_USUARIOS", "").split(",") if u.strip()}
+
 # Esto le dice a FastAPI dónde buscar el token (en la URL /token)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def invalidar_usuario(username: str) -> None:
+    """Saca al usuario de la caché (p. ej. al desactivarlo o cambiarle datos)."""
+    cache_usuarios.invalidar(username)
+
+_USUARIOS_MODIFICADOS = "usuarios_modificados"
+
+@event.listens_for(UserDB, "after_update")
+@event.listens_for(UserDB, "after_delete")
+def _anotar_usuario_modificado(mapper, connection, usuario):
+    # En el flush solo se anota: un request que relea la fila antes del commit
+    # volvería a cachear la versión vieja (finca, is_active) por CACHE_USUARIOS_TTL
+    usernames = object_session(usuario).info.setdefault(_USUARIOS_MODIFICADOS, set())
+    usernames.add(usuario.username)
+    # Si cambió el username, también hay que sacar la entrada vieja
+    usernames.update(inspect(usuario).attrs.username.history.deleted or ())
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_usuarios_modificados(sesion):
+    for username in sesion.info.pop(_USUARIOS_MODIFICADOS, ()):
+        invalidar_usuario(username)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_usuarios_modificados(sesion):
+    sesion.info.pop(_USUARIOS_MODIFICADOS, None)
+
+def _buscar_usuario(db: Session, username: str):
+    usuario = db.query(UserDB).filter(UserDB.username == username).first()
+    if usuario is None:
+        return None
+    return {"id": usuario.id, "username": usuario.username, "is_active": usuario.is_active, "finca_id": usuario.finca_id}
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar la credencial",
@@ -36,9 +80,27 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
 
-    # 2. Validar contra la base de datos
-    usuario = db.query(UserDB).filter(UserDB.username == token_data.username).first()
-    if usuario is None:
+    # 2. Validar contra la caché y, si no está, contra la base de datos
+    datos = cache_usuarios.obtener(token_data.username)
+    if datos is None:
+        datos = await ejecutar(db, _buscar_usuario, token_data.username)
+        if datos is None:
+            raise credentials_exception
+        cache_usuarios.guardar(token_data.username, datos)
+
+    if not datos["is_active"]:
         raise credentials_exception
-        
-    return usuario
\ No newline at end of file
+
+    # Los datos sin finca (NULL) son un tenant propio: solo los administradores lo
+    # ven. Un usuario recién registrado espera a que lo asignen a una finca.
+    if datos["finca_id"] is None and token_data.username not in ADMIN_USUARIOS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuario sin finca asignada")
+
+    # Copia desligada de la sesión: se puede compartir entre requests sin riesgo
+    return UserDB(**datos)
+
+async def get_admin_user(current_user: UserDB = Depends(get_current_user)):
+    """Como get_current_user, pero solo para los usuarios de ADMIN_USUARIOS."""
+    if current_user.username not in ADMIN_USUARIOS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo para administradores")
+    return current_user
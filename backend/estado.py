@@ -0,0 +1,509 @@
+# backend/estado.py
+# Estado actual en memoria del proceso: por sensor, la última lectura y un
+# agregado de las últimas 24h en buckets de 1 minuto. Con él, las alertas y el
+# estado de los sectores se evalúan sin consultar la tabla lecturas.
+#
+# - Se hidrata desde la DB al arrancar (y cada ESTADO_RESINCRONIZAR_SEGUNDOS,
+#   contra la primaria: una réplica atrasada perdería lecturas recientes).
+# - Se actualiza en cada escritura, recién después del commit (evento de Session).
+# - Mientras se lee la foto de la DB, los commits con lecturas de este proceso
+#   esperan (_Compuerta): así cada lectura queda o en la foto o se suma después
+#   del reemplazo, nunca en las dos ni en ninguna. Con DB_MODO_ASYNC los hooks
+#   corren en el thread del loop (AsyncSession.run_sync): ahí las esperas se
+#   hacen en un thread aparte y el loop sigue, también con el commit esperado.
+# - Cada worker de uvicorn tiene su propia copia: las lecturas que entran por
+#   otro worker se ven en la próxima resincronización.
+# - ESTADO_VERIFICAR=1 compara cada respuesta contra la DB y falla si difieren
+#   (pensado para tests, duplica el trabajo).
+# - Los sectores se indexan por finca: cada request recorre solo los de su tenant.
+import asyncio
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload, object_session
+from sqlalchemy.util import await_only
+from sqlalchemy.util.concurrency import in_greenlet
+
+from .logic import AgregadoSensor
+from .models_db import LecturaDB, LecturaMinutoDB, SectorDB, SensorDB
+from . import crud, metricas, rollups, series
+
+logger = logging.getLogger(__name__)
+
+ESTADO_EN_MEMORIA = os.getenv("ESTADO_EN_MEMORIA", "0") == "1"
+ESTADO_VERIFICAR = os.getenv("ESTADO_VERIFICAR", "0") == "1"
+ESTADO_RESINCRONIZAR_SEGUNDOS = float(os.getenv("ESTADO_RESINCRONIZAR_SEGUNDOS", "60"))
+
+VENTANA = timedelta(hours=24)
+PASO = timedelta(minutes=1)
+
+_PENDIENTES = "estado_lecturas_pendientes"
+_EN_COMPUERTA = "estado_en_compuerta"
+# Tope de espera de la hidratación a los commits en curso (por si uno nunca avisa que terminó)
+_ESPERA_COMMITS = 5.0
+_METADATA_MODIFICADA = "estado_metadata_modificada"
+
+
+class EstadoInconsistente(Exception):
+    """El estado en memoria no coincide con la DB (solo con ESTADO_VERIFICAR)."""
+
+
+class SensorEstado(NamedTuple):
+    id: int
+    nombre: str
+    tipo: str
+    marca: str
+    modelo: str
+    sector_id: int
+
+
+class SectorEstado(NamedTuple):
+    """Mismos atributos que SectorDB: la lógica de evaluación sirve para los dos."""
+    id: int
+    nombre: str
+    descripcion: Optional[str]
+    humedad_minima: float
+    temp_maxima: float
+    cultivo: Optional[str]
+    sensores: Tuple[SensorEstado, ...]
+    finca_id: Optional[int] = None
+
+
+class UltimaLectura(NamedTuple):
+    valor: float
+    fecha: datetime
+
+
+def inicio_ventana(ahora: datetime = None) -> datetime:
+    """Comienzo de la ventana de 24h, alineado al minuto (igual en memoria y en la DB)."""
+    return rollups.truncar((ahora or datetime.now(timezone.utc)) - VENTANA, PASO)
+
+
+class _VentanaSensor:
+    """Última lectura de un sensor y sus buckets de 1 minuto dentro de la ventana."""
+
+    __slots__ = ("ultima", "inicios", "buckets", "cantidad", "suma", "minimo", "maximo")
+
+    def __init__(self):
+        self.ultima: Optional[UltimaLectura] = None
+        self.inicios: List[datetime] = []  # ordenados
+        self.buckets: Dict[datetime, list] = {}  # inicio -> [cantidad, suma, minimo, maximo]
+        self.cantidad = 0
+        self.suma = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def agregar(self, valor: float, fecha: datetime, desde: datetime) -> None:
+        fecha = rollups.a_utc(fecha)
+        if self.ultima is None or fecha >= self.ultima.fecha:
+            self.ultima = UltimaLectura(valor, fecha)
+        self.sumar_bucket(rollups.truncar(fecha, PASO), 1, valor, valor, valor, desde)
+
+    def sumar_bucket(self, inicio: datetime, cantidad: int, suma: float, minimo: float, maximo: float, desde: datetime) -> None:
+        if inicio < desde:
+            return
+        bucket = self.buckets.get(inicio)
+        if bucket is None:
+            self.buckets[inicio] = [cantidad, suma, minimo, maximo]
+            if not self.inicios or inicio > self.inicios[-1]:
+                self.inicios.append(inicio)
+            else:
+                bisect.insort(self.inicios, inicio)
+        else:
+            bucket[0] += cantidad
+            bucket[1] += suma
+            bucket[2] = min(bucket[2], minimo)
+            bucket[3] = max(bucket[3], maximo)
+        self.cantidad += cantidad
+        self.suma += suma
+        self.minimo = min(self.minimo, minimo)
+        self.maximo = max(self.maximo, maximo)
+
+    def expirar(self, desde: datetime) -> None:
+        """Descarta los buckets viejos y recalcula los totales (a lo sumo una vez por minuto)."""
+        corte = bisect.bisect_left(self.inicios, desde)
+        if not corte:
+            return
+        for inicio in self.inicios[:corte]:
+            del self.buckets[inicio]
+        del self.inicios[:corte]
+
+        self.cantidad, self.suma, self.minimo, self.maximo = 0, 0.0, math.inf, -math.inf
+        for cantidad, suma, minimo, maximo in self.buckets.values():
+            self.cantidad += cantidad
+            self.suma += suma
+            self.minimo = min(self.minimo, minimo)
+            self.maximo = max(self.maximo, maximo)
+
+    def agregado(self, desde: datetime) -> Optional[AgregadoSensor]:
+        self.expirar(desde)
+        if not self.cantidad:
+            return None
+        return AgregadoSensor(self.suma / self.cantidad, self.cantidad, self.minimo, self.maximo)
+
+
+def _cargar_sectores(db: Session, *filtros) -> List[SectorEstado]:
+    sectores = db.query(SectorDB).options(joinedload(SectorDB.sensores)).filter(*filtros).order_by(SectorDB.id).all()
+    return [
+        SectorEstado(
+            sector.id, sector.nombre, sector.descripcion, sector.humedad_minima, sector.temp_maxima, sector.cultivo,
+            tuple(
+                SensorEstado(s.id, s.nombre, s.tipo, s.marca, s.modelo, s.sector_id)
+                for s in sorted(sector.sensores, key=lambda s: s.id)
+            ),
+            sector.finca_id,
+        )
+        for sector in sectores
+    ]
+
+
+def _leer(db: Session) -> Tuple[List[SectorEstado], Dict[int, _VentanaSensor]]:
+    """Foto de la DB: metadata, última lectura y buckets de 24h de cada sensor."""
+    sectores = _cargar_sectores(db)
+    ids = [s.id for sector in sectores for s in sector.sensores]
+    desde = inicio_ventana()
+    ventanas = {sensor_id: _VentanaSensor() for sensor_id in ids}
+
+    for sensor_id, fila in crud.ultimas_lecturas(db, ids).items():
+        ventanas[sensor_id].ultima = UltimaLectura(fila.valor, rollups.a_utc(fila.fecha))
+
+    if rollups.ROLLUPS_HABILITADOS:
+        # Los buckets ya están en lecturas_1m: una fila por sensor y minuto
+        filas = db.execute(
+            select(LecturaMinutoDB.sensor_id, LecturaMinutoDB.inicio, LecturaMinutoDB.cantidad,
+                   LecturaMinutoDB.suma, LecturaMinutoDB.minimo, LecturaMinutoDB.maximo)
+            .where(LecturaMinutoDB.inicio >= desde)
+        )
+        for sensor_id, inicio, cantidad, suma, minimo, maximo in filas:
+            if sensor_id in ventanas:
+                ventanas[sensor_id].sumar_bucket(rollups.a_utc(inicio), cantidad, suma, minimo, maximo, desde)
+    else:
+        # Sin rollups: lecturas crudas a series compactas y buckets de 1 minuto vectorizados
+        crudas = series.cargar(db, select(LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha).where(LecturaDB.fecha >= desde))
+        for sensor_id, serie in crudas.items():
+            if sensor_id in ventanas:
+                ventana = ventanas[sensor_id]
+                for inicio, cantidad, suma, minimo, maximo in zip(*serie.buckets(PASO.total_seconds())):
+                    ventana.sumar_bucket(series.fecha_de(inicio), int(cantidad), float(suma), float(minimo), float(maximo), desde)
+    return sectores, ventanas
+
+
+def _esperar(funcion, deshacer) -> None:
+    """
+    Corre una espera bloqueante. Dentro de AsyncSession.run_sync estamos en el
+    thread del loop: se espera en otro thread y el loop sigue atendiendo, entre
+    otros al commit por el que se espera (si no, se esperaría a sí mismo).
+    Si cancelan al que espera, `deshacer` revierte lo que el thread termine haciendo.
+    """
+    if not in_greenlet():
+        funcion()
+        return
+    espera = asyncio.ensure_future(asyncio.to_thread(funcion))
+    try:
+        await_only(asyncio.shield(espera))
+    except BaseException:
+        espera.add_done_callback(lambda t: t.cancelled() or t.exception() or deshacer())
+        raise
+
+
+class _Compuerta:
+    """
+    Lock lectores/escritor entre los commits con lecturas (entran de a muchos) y la
+    foto de la hidratación (exclusiva, con prioridad para no quedar esperando siempre).
+    Solo se espera fuera del loop (_esperar); sin foto en curso entrar no espera.
+    """
+
+    def __init__(self):
+        self._cambio = threading.Condition()
+        self._commits = 0
+        self._foto = False
+
+    def entrar_commit(self) -> None:
+        with self._cambio:
+            if not self._foto:
+                self._commits += 1
+                return
+        _esperar(self._entrar_commit, self.salir_commit)
+
+    def _entrar_commit(self) -> None:
+        with self._cambio:
+            while self._foto:
+                self._cambio.wait()
+            self._commits += 1
+
+    def salir_commit(self) -> None:
+        with self._cambio:
+            self._commits -= 1
+            self._cambio.notify_all()
+
+    def _cerrar(self) -> None:
+        with self._cambio:
+            while self._foto:
+                self._cambio.wait()
+            self._foto = True
+            if not self._cambio.wait_for(lambda: self._commits <= 0, _ESPERA_COMMITS):
+                logger.warning("Hidratación: %s commits con lecturas no terminaron; se sigue igual", self._commits)
+
+    def _abrir(self) -> None:
+        with self._cambio:
+            self._foto = False
+            self._cambio.notify_all()
+
+    @contextmanager
+    def foto(self):
+        _esperar(self._cerrar, self._abrir)
+        try:
+            yield
+        finally:
+            self._abrir()
+
+
+class EstadoActual:
+    """Estado de todos los sensores del proceso. Seguro para usar desde varios threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compuerta = _Compuerta()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        """Olvida todo: la próxima consulta vuelve a hidratar desde la DB."""
+        with self._lock:
+            self._sectores: Optional[Dict[int, SectorEstado]] = None
+            self._por_finca: Dict[Optional[int], List[SectorEstado]] = {}
+            self._ventanas: Dict[int, _VentanaSensor] = {}
+            self._metadata_vigente = False
+            self._hidratado_en = None
+            self.lecturas_registradas = 0
+            self.verificaciones = 0
+
+    # --- ESCRITURA ---
+
+    def hidratar(self, db: Session) -> None:
+        """Reconstruye el estado desde la DB: metadata, última lectura y buckets de 24h."""
+        # Con la compuerta cerrada ningún commit local cae entre la foto y el reemplazo:
+        # los que terminaron antes están en la foto, los que esperan se suman después
+        with self.compuerta.foto():
+            sectores, ventanas = _leer(db)
+            with self._lock:
+                self._indexar(sectores)
+                self._ventanas = ventanas
+                self._metadata_vigente = True
+                self._hidratado_en = time.monotonic()
+
+    def recargar_metadata(self, db: Session) -> None:
+        """Sectores/sensores cambiaron: se recargan sin tocar las lecturas."""
+        sectores = _cargar_sectores(db)
+        with self._lock:
+            self._indexar(sectores)
+            ids = {s.id for sector in sectores for s in sector.sensores}
+            self._ventanas = {sensor_id: self._ventanas.get(sensor_id) or _VentanaSensor() for sensor_id in ids}
+            self._metadata_vigente = True
+
+    def _indexar(self, sectores: List[SectorEstado]) -> None:
+        """Con el lock tomado."""
+        self._sectores = {sector.id: sector for sector in sectores}
+        self._por_finca = {}
+        for sector in sectores:
+            self._por_finca.setdefault(sector.finca_id, []).append(sector)
+
+    def invalidar_metadata(self) -> None:
+        self._metadata_vigente = False
+
+    def registrar(self, lecturas: Iterable[Tuple[int, float, datetime]]) -> None:
+        """Suma lecturas ya confirmadas en la DB (sensor_id, valor, fecha)."""
+        desde = inicio_ventana()
+        with self._lock:
+            if self._sectores is None:
+                return  # sin hidratar todavía: la hidratación las va a leer de la DB
+            for sensor_id, valor, fecha in lecturas:
+                self._ventanas.setdefault(sensor_id, _VentanaSensor()).agregar(valor, fecha, desde)
+                self.lecturas_registradas += 1
+
+    # --- LECTURA ---
+
+    def asegurar(self, db: Session) -> None:
+        """Hidrata la primera vez y recarga la metadata si alguien la modificó."""
+        if self._sectores is None:
+            self.hidratar(db)
+        elif not self._metadata_vigente:
+            self.recargar_metadata(db)
+
+    def sectores(self, db: Session, finca_id: Optional[int]) -> List[SectorEstado]:
+        self.asegurar(db)
+        return list(self._por_finca.get(finca_id, ()))
+
+    def sector(self, db: Session, sector_id: int, finca_id: Optional[int]) -> Optional[SectorEstado]:
+        self.asegurar(db)
+        sector = self._sectores.get(sector_id)
+        return sector if sector is not None and sector.finca_id == finca_id else None
+
+    def ultimas_lecturas(self, db: Session, ids_sensores: Iterable[int], desde: datetime) -> Dict[int, UltimaLectura]:
+        self.asegurar(db)
+        desde = rollups.a_utc(desde)
+        with self._lock:
+            resultado = {}
+            for sensor_id in ids_sensores:
+                ventana = self._ventanas.get(sensor_id)
+                if ventana is not None and ventana.ultima is not None and ventana.ultima.fecha >= desde:
+                    resultado[sensor_id] = ventana.ultima
+            return resultado
+
+    def agregados(self, db: Session, ids_sensores: Iterable[int], desde: datetime) -> Dict[int, AgregadoSensor]:
+        self.asegurar(db)
+        with self._lock:
+            resultado = {}
+            for sensor_id in ids_sensores:
+                ventana = self._ventanas.get(sensor_id)
+                agregado = ventana.agregado(desde) if ventana is not None else None
+                if agregado is not None:
+                    resultado[sensor_id] = agregado
+            return resultado
+
+    def estadisticas(self) -> dict:
+        return {
+            "habilitado": ESTADO_EN_MEMORIA,
+            "hidratado": self._sectores is not None,
+            "sensores": len(self._ventanas),
+            "lecturas_registradas": self.lecturas_registradas,
+            "verificaciones": self.verificaciones,
+            "segundos_desde_hidratacion": round(time.monotonic() - self._hidratado_en, 1) if self._hidratado_en else None,
+        }
+
+
+estado_actual = EstadoActual()
+metricas.registrar("estado", estado_actual.estadisticas)
+
+
+# --- VERIFICACIÓN CONTRA LA DB ---
+
+def _parecidos(a: float, b: float) -> bool:
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+def _verificar(nombre: str, en_memoria: dict, en_db: dict, iguales) -> None:
+    estado_actual.verificaciones += 1
+    if en_memoria.keys() != en_db.keys():
+        raise EstadoInconsistente(f"{nombre}: sensores {sorted(en_memoria)} en memoria vs {sorted(en_db)} en la DB")
+    for clave, valor in en_memoria.items():
+        if not iguales(valor, en_db[clave]):
+            raise EstadoInconsistente(f"{nombre} del sensor {clave}: {valor} en memoria vs {en_db[clave]} en la DB")
+
+
+# --- API PARA LOS ROUTERS ---
+# Con ESTADO_EN_MEMORIA apagado van directo a la DB, como siempre.
+
+def sectores(db: Session, finca_id: Optional[int]) -> list:
+    """Sectores de la finca con sus sensores (SectorEstado en memoria o SectorDB)."""
+    if not ESTADO_EN_MEMORIA:
+        # Por el índice de sectores.finca_id: no se cargan los sensores de otras fincas
+        return db.query(SectorDB).options(joinedload(SectorDB.sensores)).filter(crud.de_la_finca(SectorDB.finca_id, finca_id)).all()
+    en_memoria = estado_actual.sectores(db, finca_id)
+    if ESTADO_VERIFICAR:
+        en_db = _cargar_sectores(db, crud.de_la_finca(SectorDB.finca_id, finca_id))
+        _verificar("sectores", {s.id: s for s in en_memoria}, {s.id: s for s in en_db}, lambda a, b: a == b)
+    return en_memoria
+
+def sector(db: Session, sector_id: int, finca_id: Optional[int]):
+    """El sector si existe y es de la finca; si no, None."""
+    if not ESTADO_EN_MEMORIA:
+        # Con los sensores en el mismo SELECT: el endpoint los recorre siempre
+        return (
+            db.query(SectorDB).options(joinedload(SectorDB.sensores))
+            .filter(SectorDB.id == sector_id, crud.de_la_finca(SectorDB.finca_id, finca_id)).first()
+        )
+    return estado_actual.sector(db, sector_id, finca_id)
+
+def ultimas_lecturas(db: Session, ids_sensores: List[int], desde: datetime) -> dict:
+    """Última lectura de cada sensor desde `desde` (objetos con .valor y .fecha)."""
+    if not ESTADO_EN_MEMORIA:
+        return crud.ultimas_lecturas(db, ids_sensores, desde=desde)
+    en_memoria = estado_actual.ultimas_lecturas(db, ids_sensores, desde)
+    if ESTADO_VERIFICAR:
+        _verificar(
+            "última lectura", en_memoria, crud.ultimas_lecturas(db, ids_sensores, desde=desde),
+            lambda a, b: _parecidos(a.valor, b.valor) and a.fecha == rollups.a_utc(b.fecha)
+        )
+    return en_memoria
+
+def agregados(db: Session, ids_sensores: List[int], desde: datetime) -> Dict[int, AgregadoSensor]:
+    if not ESTADO_EN_MEMORIA:
+        return crud.agregados_por_sensor(db, ids_sensores, desde=desde)
+    en_memoria = estado_actual.agregados(db, ids_sensores, desde)
+    if ESTADO_VERIFICAR:
+        _verificar(
+            "agregado 24h", en_memoria, crud.agregados_por_sensor(db, ids_sensores, desde=desde),
+            lambda a, b: a.cantidad == b.cantidad and all(_parecidos(x, y) for x, y in zip(a, b))
+        )
+    return en_memoria
+
+
+# --- ESCRITURAS: se aplican recién cuando la transacción se confirma ---
+
+def anotar(db: Session, lecturas: Iterable[Tuple[int, float, datetime]]) -> None:
+    """Deja las lecturas pendientes en la sesión; se suman al estado en el commit."""
+    if ESTADO_EN_MEMORIA:
+        db.info.setdefault(_PENDIENTES, []).extend(lecturas)
+
+@event.listens_for(SectorDB, "after_insert")
+@event.listens_for(SectorDB, "after_update")
+@event.listens_for(SectorDB, "after_delete")
+@event.listens_for(SensorDB, "after_insert")
+@event.listens_for(SensorDB, "after_update")
+@event.listens_for(SensorDB, "after_delete")
+def _marcar_metadata(mapper, connection, objetivo):
+    sesion = object_session(objetivo)
+    if sesion is not None:
+        sesion.info[_METADATA_MODIFICADA] = True
+
+@event.listens_for(Session, "before_commit")
+def _entrar_compuerta(sesion):
+    if sesion.info.get(_PENDIENTES) and not sesion.info.get(_EN_COMPUERTA):
+        estado_actual.compuerta.entrar_commit()
+        sesion.info[_EN_COMPUERTA] = True
+
+def _salir_compuerta(sesion) -> None:
+    if sesion.info.pop(_EN_COMPUERTA, False):
+        estado_actual.compuerta.salir_commit()
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_pendientes(sesion):
+    try:
+        pendientes = sesion.info.pop(_PENDIENTES, None)
+        if pendientes:
+            estado_actual.registrar(pendientes)
+    finally:
+        _salir_compuerta(sesion)
+    if sesion.info.pop(_METADATA_MODIFICADA, False):
+        estado_actual.invalidar_metadata()
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendientes(sesion):
+    _salir_compuerta(sesion)
+    sesion.info.pop(_PENDIENTES, None)
+    sesion.info.pop(_METADATA_MODIFICADA, None)
+
+
+def iniciar_resincronizacion_periodica(fabrica_sesion) -> threading.Event:
+    """Hidrata ya y después cada ESTADO_RESINCRONIZAR_SEGUNDOS (0 = solo al arrancar)."""
+    detener = threading.Event()
+
+    def _bucle():
+        while True:
+            try:
+                with fabrica_sesion() as db:
+                    estado_actual.hidratar(db)
+            except Exception:
+                logger.exception("Falló la hidratación del estado en memoria")
+            if not ESTADO_RESINCRONIZAR_SEGUNDOS or detener.wait(ESTADO_RESINCRONIZAR_SEGUNDOS):
+                return
+
+    threading.Thread(target=_bucle, name="estado-en-memoria", daemon=True).start()
+    return detener
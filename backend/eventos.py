@@ -0,0 +1,305 @@
+# backend/eventos.py
+# Alertas empujadas por el servidor (Server-Sent Events) en lugar de sondear
+# GET /monitoreo/alertas.
+#
+# - Al guardar lecturas se evalúa solo la última de cada sensor del lote con el
+#   motor de reglas y, en el commit, se publican las transiciones (la alerta
+#   se activa, cambia o se resuelve). Sin suscriptores solo se evalúa si la
+#   finca tiene reglas con histéresis o duración mínima: su memoria por sensor
+#   tiene que avanzar con cada lectura, la consulte alguien o no. Si ninguna
+#   finca tiene reglas así, escribir lecturas no consulta nada.
+# - Fan-out: los suscriptores se indexan por loop y por sector, así un evento
+#   solo toca a quien lo filtró (o a quien escucha toda su finca). Se hace un
+#   solo call_soon_threadsafe por loop y por commit, no uno por conexión.
+# - Cada suscripción es de una finca: nunca recibe eventos de otra, aunque
+#   pida sus sectores.
+# - Cada conexión inactiva es una deque acotada y un asyncio.Event: no tiene
+#   sesión ni conexión a la DB (get_current_user devuelve la suya al pool).
+# - Contrapresión: si un cliente lento llena su cola se descarta el evento más
+#   viejo (se cuenta en /metricas/). El estado completo está en GET /monitoreo/alertas.
+# - Las transiciones son por proceso: con varios workers cada uno publica las
+#   de las lecturas que recibió.
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .logic import codigo_tipo
+from .models_db import SectorDB, SensorDB
+from .rollups import a_utc
+from . import metricas, reglas
+
+# Eventos pendientes por conexión antes de empezar a descartar los más viejos
+EVENTOS_COLA_TAMANIO = int(os.getenv("EVENTOS_COLA_TAMANIO", "100"))
+# Comentario SSE cada tantos segundos sin eventos (mantiene vivos proxies y detecta desconexiones)
+EVENTOS_KEEPALIVE_SEGUNDOS = float(os.getenv("EVENTOS_KEEPALIVE_SEGUNDOS", "15"))
+
+_PENDIENTES = "eventos_pendientes"
+
+
+class Evento(NamedTuple):
+    id: int
+    finca_id: Optional[int]
+    sector_id: Optional[int]
+    datos: dict
+    publicado: float  # time.perf_counter() al publicar, para medir latencia
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: alerta\ndata: {json.dumps(self.datos, ensure_ascii=False)}\n\n"
+
+
+class Suscripcion:
+    """Una conexión: cola acotada que descarta lo más viejo. Se usa solo desde su loop."""
+
+    def __init__(self, sectores: Optional[Set[int]], tamanio: int, finca_id: Optional[int] = None):
+        self.sectores = sectores  # None = todos los sectores de la finca
+        self.finca_id = finca_id
+        self.loop = asyncio.get_running_loop()
+        self.pendientes: deque = deque(maxlen=tamanio)
+        self.descartados = 0
+        self._hay_eventos = asyncio.Event()
+
+    def entregar(self, evento: Evento) -> bool:
+        """Encola el evento; devuelve True si tuvo que descartar uno viejo."""
+        lleno = len(self.pendientes) == self.pendientes.maxlen
+        if lleno:
+            self.descartados += 1
+        self.pendientes.append(evento)
+        self._hay_eventos.set()
+        return lleno
+
+    async def siguientes(self, timeout: float) -> List[Evento]:
+        """Todos los eventos pendientes; lista vacía si pasó `timeout` sin ninguno."""
+        if not self.pendientes:
+            self._hay_eventos.clear()
+            try:
+                await asyncio.wait_for(self._hay_eventos.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        eventos = list(self.pendientes)
+        self.pendientes.clear()
+        return eventos
+
+
+class CentralEventos:
+    """Registro de suscriptores y reparto de eventos. publicar() se puede llamar desde cualquier hilo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # loop -> sector_id o _toda(finca_id) (sin filtro) -> suscripciones
+        self._indices: Dict[asyncio.AbstractEventLoop, Dict[object, Set[Suscripcion]]] = {}
+        self._secuencia = itertools.count(1)
+        # Alerta vigente por sensor, para publicar solo transiciones
+        self._vigentes: Dict[int, reglas.ReglaCompilada] = {}
+        self.suscriptores = 0
+        self.publicados = 0
+        self.entregados = 0
+        self.descartados = 0
+
+    def suscribir(self, sectores: Optional[Iterable[int]] = None, tamanio: int = None,
+                  finca_id: Optional[int] = None) -> Suscripcion:
+        """Se llama desde el loop de la conexión."""
+        suscripcion = Suscripcion(set(sectores) if sectores else None, tamanio or EVENTOS_COLA_TAMANIO, finca_id)
+        with self._lock:
+            por_sector = self._indices.setdefault(suscripcion.loop, {})
+            for clave in _claves(suscripcion):
+                por_sector.setdefault(clave, set()).add(suscripcion)
+            self.suscriptores += 1
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion) -> None:
+        with self._lock:
+            por_sector = self._indices.get(suscripcion.loop, {})
+            for clave in _claves(suscripcion):
+                grupo = por_sector.get(clave)
+                if grupo is not None:
+                    grupo.discard(suscripcion)
+                    if not grupo:
+                        del por_sector[clave]
+            if not por_sector:
+                self._indices.pop(suscripcion.loop, None)
+            self.suscriptores -= 1
+            if not self.suscriptores:
+                # Nadie escucha: las transiciones se dejan de seguir y se arranca de cero
+                self._vigentes.clear()
+
+    def publicar(self, eventos: Iterable[Tuple[Optional[int], Optional[int], dict]]) -> None:
+        """Reparte (finca_id, sector_id, datos) a los suscriptores de ese sector y a los que escuchan toda la finca."""
+        ahora = time.perf_counter()
+        eventos = [Evento(next(self._secuencia), finca_id, sector_id, datos, ahora) for finca_id, sector_id, datos in eventos]
+        if not eventos:
+            return
+        with self._lock:
+            self.publicados += len(eventos)
+            repartos = []
+            for loop, por_sector in self._indices.items():
+                entregas = [
+                    (e, tuple(por_sector.get(_toda(e.finca_id), ()))
+                     + tuple(s for s in por_sector.get(e.sector_id, ()) if s.finca_id == e.finca_id))
+                    for e in eventos
+                ]
+                repartos.append((loop, entregas))
+        for loop, entregas in repartos:
+            try:
+                loop.call_soon_threadsafe(self._repartir, entregas)
+            except RuntimeError:
+                pass  # loop cerrado: sus conexiones ya no existen
+
+    def _repartir(self, entregas) -> None:
+        for evento, destinatarios in entregas:
+            for suscripcion in destinatarios:
+                self.descartados += suscripcion.entregar(evento)
+            self.entregados += len(destinatarios)
+
+    def transiciones(self, candidatos: List[tuple]) -> None:
+        """
+        candidatos: (sensor, regla o None, valor, fecha) evaluados en la escritura.
+        Publica los que cambian la alerta vigente del sensor.
+        """
+        eventos = []
+        with self._lock:
+            if not self.suscriptores:
+                return
+            for sensor, regla, valor, fecha in candidatos:
+                anterior = self._vigentes.get(sensor.id)
+                if regla == anterior:
+                    continue
+                if anterior is not None:
+                    eventos.append((sensor.finca_id, sensor.sector_id, _datos("resuelta", sensor, anterior, valor, fecha)))
+                if regla is not None:
+                    self._vigentes[sensor.id] = regla
+                    eventos.append((sensor.finca_id, sensor.sector_id, _datos("activa", sensor, regla, valor, fecha)))
+                else:
+                    del self._vigentes[sensor.id]
+        self.publicar(eventos)
+
+    def estadisticas(self) -> dict:
+        return {
+            "suscriptores": self.suscriptores,
+            "publicados": self.publicados,
+            "entregados": self.entregados,
+            "descartados": self.descartados,
+            "alertas_vigentes": len(self._vigentes),
+        }
+
+
+def _toda(finca_id: Optional[int]) -> tuple:
+    """Clave del índice para los que escuchan todos los sectores de la finca."""
+    return ("finca", finca_id)
+
+
+def _claves(suscripcion: Suscripcion) -> Iterable:
+    return suscripcion.sectores or (_toda(suscripcion.finca_id),)
+
+
+def _datos(estado: str, sensor, regla: reglas.ReglaCompilada, valor: float, fecha: datetime) -> dict:
+    # Mismos campos que los detalles de GET /monitoreo/alertas
+    unidad = regla.unidad
+    verbo = "marca" if estado == "activa" else "se normalizó en"
+    return {
+        "estado": estado,
+        "sector_id": sensor.sector_id,
+        "ubicacion": sensor.sector,
+        "sensor_id": sensor.id,
+        "sensor": sensor.nombre,
+        "tipo_alerta": regla.alerta,
+        "severidad": regla.severidad,
+        "valor_actual": f"{valor}{unidad}",
+        "fecha": fecha.isoformat(),
+        "mensaje": f"{'⚠️' if estado == 'activa' else '✅'} {regla.alerta}: {sensor.nombre} {verbo} {valor}{unidad}.",
+    }
+
+
+central = CentralEventos()
+metricas.registrar("eventos", central.estadisticas)
+
+
+async def flujo_sse(request: Request, suscripcion: Suscripcion) -> AsyncIterator[str]:
+    """Cuerpo de la respuesta text/event-stream de una suscripción."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            eventos = await suscripcion.siguientes(EVENTOS_KEEPALIVE_SEGUNDOS)
+            if not eventos:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            yield "".join(evento.sse() for evento in eventos)
+    finally:
+        central.desuscribir(suscripcion)
+
+
+# --- EVALUACIÓN EN LA ESCRITURA ---
+
+def anotar(db: Session, lecturas: Iterable[Tuple[int, float, datetime]],
+           ubicaciones: Dict[int, Tuple[Optional[int], Optional[int]]] = None) -> None:
+    """
+    Evalúa la última lectura de cada sensor; las transiciones se publican en el commit.
+    ubicaciones: {sensor_id: (sector_id, finca_id)} si quien llama ya lo tiene; sin
+    suscriptores sirve para descartar, antes de consultar, los sensores de fincas
+    cuyas reglas no tienen memoria.
+    """
+    publicar = central.suscriptores > 0
+    # El camino de siempre (nadie escucha, solo reglas por defecto) no toca la DB
+    if not (publicar or reglas.hay_reglas_con_memoria(db)):
+        return
+
+    ultimas: Dict[int, Tuple[float, datetime]] = {}
+    for sensor_id, valor, fecha in lecturas:
+        fecha = a_utc(fecha)
+        previa = ultimas.get(sensor_id)
+        if previa is None or fecha >= previa[1]:
+            ultimas[sensor_id] = (valor, fecha)
+    if ubicaciones is not None and not publicar:
+        fincas = {ubicaciones[s][1] for s in ultimas if s in ubicaciones}
+        con_memoria = {f for f in fincas if reglas.obtener_motor(db, f).con_memoria}
+        ultimas = {s: lectura for s, lectura in ultimas.items() if s in ubicaciones and ubicaciones[s][1] in con_memoria}
+    if not ultimas:
+        return
+
+    sensores = db.execute(
+        select(SensorDB.id, SensorDB.nombre, SensorDB.tipo, SensorDB.sector_id, SectorDB.nombre.label("sector"),
+               SectorDB.finca_id)
+        .outerjoin(SectorDB, SensorDB.sector_id == SectorDB.id)
+        .where(SensorDB.id.in_(ultimas))
+    ).all()
+    # El lote puede mezclar fincas (ingesta asíncrona): cada una con su motor
+    por_finca: Dict[Optional[int], list] = {}
+    for sensor in sensores:
+        por_finca.setdefault(sensor.finca_id, []).append(sensor)
+    for finca_id, de_la_finca in por_finca.items():
+        motor = reglas.obtener_motor(db, finca_id)
+        if not (publicar or motor.con_memoria):
+            continue
+        # Con sensor_ids y fechas avanza la histéresis y la duración de cada sensor
+        codigos = motor.evaluar(
+            [s.sector_id for s in de_la_finca],
+            [codigo_tipo(s.tipo) for s in de_la_finca],
+            [ultimas[s.id][0] for s in de_la_finca],
+            [s.id for s in de_la_finca],
+            [ultimas[s.id][1] for s in de_la_finca],
+        )
+        if publicar:
+            db.info.setdefault(_PENDIENTES, []).extend(
+                (s, motor.regla(codigo) if codigo else None, *ultimas[s.id]) for s, codigo in zip(de_la_finca, codigos)
+            )
+
+@event.listens_for(Session, "after_commit")
+def _publicar_pendientes(sesion):
+    pendientes = sesion.info.pop(_PENDIENTES, None)
+    if pendientes:
+        central.transiciones(pendientes)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendientes(sesion):
+    sesion.info.pop(_PENDIENTES, None)
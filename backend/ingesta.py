@@ -0,0 +1,371 @@
+# backend/ingesta.py
+# Ingesta asíncrona de lecturas (INGESTA_ASINCRONA=1).
+#
+# - POST /lecturas/ y /lecturas/batch validan, escriben las lecturas en un log
+#   local append-only, las encolan en memoria y responden 202 sin esperar a la
+#   DB. Un hilo escritor las guarda en lotes de INGESTA_LOTE o cada
+#   INGESTA_INTERVALO_MS, lo que llegue primero.
+# - El log se parte en segmentos; un segmento se borra cuando todas sus
+#   lecturas ya están en la DB. La garantía es "al menos una vez": si el
+#   proceso muere entre el commit y el borrado del segmento, esas lecturas se
+#   vuelven a insertar.
+# - Cada proceso (worker de uvicorn) escribe en su propia carpeta
+#   <INGESTA_DIRECTORIO>/proceso-<pid>-<uuid> y la tiene tomada con un flock
+#   mientras vive. Al arrancar, con el lock de recuperación tomado, adopta las
+#   carpetas cuyo dueño ya no existe (su flock está libre) y reencola sus
+#   segmentos: cada lectura la reproduce un solo proceso.
+# - La cola es acotada (INGESTA_COLA_MAXIMA): si la DB no da abasto se responde
+#   503 en lugar de crecer sin límite.
+# - La validación de sensores usa un mapa sensor -> (sector, finca) en memoria;
+#   solo los IDs que no conoce van a la DB. Los de otra finca se rechazan.
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models_db import SensorDB
+from . import crud, estado, eventos, metricas, respuestas
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, cada proceso solo reproduce lo suyo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INGESTA_ASINCRONA = os.getenv("INGESTA_ASINCRONA", "0") == "1"
+INGESTA_DIRECTORIO = os.getenv("INGESTA_DIRECTORIO", "ingesta")
+INGESTA_COLA_MAXIMA = int(os.getenv("INGESTA_COLA_MAXIMA", "100000"))
+INGESTA_LOTE = int(os.getenv("INGESTA_LOTE", "1000"))
+INGESTA_INTERVALO_MS = float(os.getenv("INGESTA_INTERVALO_MS", "200"))
+# Lecturas por segmento del log antes de abrir uno nuevo
+INGESTA_SEGMENTO = int(os.getenv("INGESTA_SEGMENTO", "50000"))
+# fsync en cada escritura al log: sobrevive a un corte de luz, no solo a la caída del proceso
+INGESTA_FSYNC = os.getenv("INGESTA_FSYNC", "0") == "1"
+# Al apagar, cuánto se espera al escritor; lo que no llegue queda en el log para el próximo arranque
+INGESTA_ESPERA_CIERRE = float(os.getenv("INGESTA_ESPERA_CIERRE", "10"))
+
+
+class ColaLlena(Exception):
+    """La cola de ingesta llegó a INGESTA_COLA_MAXIMA."""
+
+
+def persistir(db: Session, filas: List[Dict], ubicaciones: Dict[int, Tuple[int, Optional[int]]]) -> None:
+    """
+    INSERT multi-fila (+ rollups) y avisos a estado, eventos y caché de respuestas.
+    Cada fila necesita sensor_id, valor y fecha (UTC); ubicaciones es
+    {sensor_id: (sector_id, finca_id)} de sus sensores. No hace commit.
+    """
+    crud.insertar_lecturas(db, filas)
+    estado.anotar(db, ((f["sensor_id"], f["valor"], f["fecha"]) for f in filas))
+    eventos.anotar(db, ((f["sensor_id"], f["valor"], f["fecha"]) for f in filas), ubicaciones)
+    respuestas.invalidar(db, {ubicaciones[f["sensor_id"]][0] for f in filas})
+
+
+# --- SENSORES CONOCIDOS ---
+
+_ubicacion_de_sensor: Dict[int, Tuple[int, Optional[int]]] = {}
+
+
+def desconocidos(ids_sensores: Iterable[int]) -> Set[int]:
+    """IDs que todavía no están en el mapa (hay que buscarlos con conocer_sensores)."""
+    return set(ids_sensores) - _ubicacion_de_sensor.keys()
+
+
+def conocer_sensores(db: Session, ids_sensores: Iterable[int]) -> None:
+    """Suma al mapa los sensores desconocidos que existen, en una sola consulta."""
+    faltan = desconocidos(ids_sensores)
+    if faltan:
+        _ubicacion_de_sensor.update(crud.ubicaciones_de_sensores(db, faltan))
+
+
+def sectores_conocidos(ids_sensores: Iterable[int], finca_id: Optional[int]) -> Dict[int, int]:
+    """{sensor_id: sector_id} de los IDs que están en el mapa y son de la finca."""
+    ubicaciones = {i: _ubicacion_de_sensor[i] for i in set(ids_sensores) if i in _ubicacion_de_sensor}
+    return crud.sectores_en_finca(ubicaciones, finca_id)
+
+
+def olvidar_sensores() -> None:
+    """Vacía el mapa de sensores (tests)."""
+    _ubicacion_de_sensor.clear()
+
+
+@event.listens_for(SensorDB, "after_update")
+@event.listens_for(SensorDB, "after_delete")
+def _olvidar_sensor(mapper, connection, sensor):
+    _ubicacion_de_sensor.pop(sensor.id, None)
+
+
+# --- COLA + LOG ---
+
+def _tomar(archivo, esperar: bool) -> bool:
+    """flock exclusivo sobre el archivo abierto. False si otro proceso lo tiene (o no hay flock)."""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+class ColaIngesta:
+    def __init__(self, directorio: str, maximo: int, lote: int, intervalo_ms: float, segmento: int, fsync: bool):
+        # `directorio` es compartido entre procesos; el log de este va en self.propio,
+        # que se nombra al primer uso (después de un fork el pid ya es el del worker)
+        self.directorio = directorio
+        self.propio: Optional[str] = None
+        self._candado = None  # flock de self.propio mientras el proceso vive
+        self._hilo: Optional[threading.Thread] = None
+        self.maximo = maximo
+        self.lote = lote
+        self.intervalo = intervalo_ms / 1000
+        self.segmento = segmento
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._hay_lote = threading.Condition(self._lock)
+        # (segmento, sensor_id, valor, fecha), en orden de llegada
+        self._pendientes: deque = deque()
+        self._archivo = None
+        self._segmento_actual = 0
+        self._lineas_segmento = 0
+        self.encoladas = 0
+        self.escritas = 0
+        self.descartadas = 0  # el sensor se borró antes de escribirlas
+        self.rechazadas = 0  # por cola llena
+        self.reproducidas = 0
+        self.lotes = 0
+        self.errores = 0
+        self.ultimo_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def _ruta(self, numero: int, carpeta: str = None) -> str:
+        return os.path.join(carpeta or self.propio, f"segmento-{numero:08d}.jsonl")
+
+    def _segmentos(self, carpeta: str = None) -> List[int]:
+        carpeta = carpeta or self.propio
+        if carpeta is None:
+            return []
+        rutas = glob.glob(os.path.join(carpeta, "segmento-*.jsonl"))
+        return sorted(int(os.path.basename(r)[9:17]) for r in rutas)
+
+    def _recuperacion(self):
+        """Lock entre procesos para crear la carpeta propia y adoptar huérfanas (bloqueante)."""
+        os.makedirs(self.directorio, exist_ok=True)
+        candado = open(os.path.join(self.directorio, ".recuperacion.lock"), "a")
+        _tomar(candado, esperar=True)
+        return candado  # cerrarlo suelta el flock
+
+    def _crear_propio(self) -> None:
+        """Crea y toma la carpeta propia. Con el lock tomado."""
+        if self._candado is not None:
+            return
+        self.propio = os.path.join(self.directorio, f"proceso-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        with self._recuperacion():
+            # Bajo el lock de recuperación: nadie la adopta entre el makedirs y el flock
+            os.makedirs(self.propio)
+            self._candado = open(os.path.join(self.propio, ".lock"), "a")
+            _tomar(self._candado, esperar=False)
+
+    def _adoptar_huerfanas(self) -> None:
+        """
+        Mueve a la carpeta propia los segmentos de procesos que ya no existen (y los
+        sueltos en `directorio`, de versiones anteriores). Con el lock tomado.
+        """
+        with self._recuperacion():
+            huerfanas = [self.directorio]
+            for entrada in os.scandir(self.directorio):
+                if not entrada.is_dir() or not entrada.name.startswith("proceso-") or entrada.path == self.propio:
+                    continue
+                with open(os.path.join(entrada.path, ".lock"), "a") as candado:
+                    if _tomar(candado, esperar=False):
+                        huerfanas.append(entrada.path)
+            for carpeta in huerfanas:
+                for numero in self._segmentos(carpeta):
+                    self._segmento_actual += 1
+                    os.replace(self._ruta(numero, carpeta), self._ruta(self._segmento_actual))
+                if carpeta != self.directorio:
+                    os.remove(os.path.join(carpeta, ".lock"))
+                    os.rmdir(carpeta)
+
+    def _rotar(self) -> None:
+        """Cierra el segmento actual y abre el siguiente. Con el lock tomado."""
+        if self._archivo is not None:
+            self._archivo.close()
+        self._crear_propio()
+        self._segmento_actual += 1
+        self._archivo = open(self._ruta(self._segmento_actual), "a", encoding="utf-8")
+        self._lineas_segmento = 0
+
+    def encolar(self, lecturas: List[Tuple[int, float, datetime]]) -> None:
+        """Escribe las lecturas en el log y las encola. Al volver, ya son durables."""
+        with self._lock:
+            if len(self._pendientes) + len(lecturas) > self.maximo:
+                self.rechazadas += len(lecturas)
+                raise ColaLlena()
+            if self._archivo is None or self._lineas_segmento >= self.segmento:
+                self._rotar()
+            self._archivo.write("".join(
+                json.dumps([sensor_id, valor, fecha.isoformat()]) + "\n" for sensor_id, valor, fecha in lecturas
+            ))
+            self._archivo.flush()
+            if self.fsync:
+                os.fsync(self._archivo.fileno())
+            self._lineas_segmento += len(lecturas)
+            self._pendientes.extend((self._segmento_actual, *lectura) for lectura in lecturas)
+            self.encoladas += len(lecturas)
+            if len(self._pendientes) >= self.lote:
+                self._hay_lote.notify()
+
+    def reproducir(self) -> int:
+        """Adopta y reencola lo que quedó en el log de procesos que ya no existen. Llamar antes de encolar."""
+        cantidad = 0
+        with self._lock:
+            self._crear_propio()
+            if fcntl is not None:
+                self._adoptar_huerfanas()
+            for numero in self._segmentos():
+                with open(self._ruta(numero), encoding="utf-8") as archivo:
+                    for linea in archivo:
+                        if not linea.endswith("\n"):
+                            break  # última línea cortada por la caída: nunca se confirmó
+                        sensor_id, valor, fecha = json.loads(linea)
+                        self._pendientes.append((numero, sensor_id, valor, datetime.fromisoformat(fecha)))
+                        cantidad += 1
+                self._segmento_actual = max(self._segmento_actual, numero)
+            self.reproducidas += cantidad
+        return cantidad
+
+    def escribir_lote(self, fabrica_sesion) -> int:
+        """Guarda hasta `lote` lecturas de la cabeza de la cola. Si falla quedan encoladas."""
+        with self._lock:
+            lote = list(itertools.islice(self._pendientes, self.lote))
+        if not lote:
+            return 0
+
+        inicio = time.perf_counter()
+        with fabrica_sesion() as db:
+            ubicaciones = crud.ubicaciones_de_sensores(db, (l[1] for l in lote))
+            filas = [{"sensor_id": s, "valor": v, "fecha": f} for _, s, v, f in lote if s in ubicaciones]
+            persistir(db, filas, ubicaciones)
+            db.commit()
+        duracion = (time.perf_counter() - inicio) * 1000
+
+        with self._lock:
+            for _ in lote:
+                self._pendientes.popleft()
+            self.escritas += len(filas)
+            self.descartadas += len(lote) - len(filas)
+            self.lotes += 1
+            self.ultimo_flush_ms = duracion
+            self._total_flush_ms += duracion
+            self._borrar_segmentos_confirmados()
+        return len(lote)
+
+    def _borrar_segmentos_confirmados(self) -> None:
+        """Borra los segmentos sin lecturas pendientes. Con el lock tomado."""
+        primero_pendiente = self._pendientes[0][0] if self._pendientes else None
+        if primero_pendiente is None and self._archivo is not None:
+            # Todo escrito: el segmento actual se vacía y se sigue usando
+            self._archivo.truncate(0)
+            self._lineas_segmento = 0
+            primero_pendiente = self._segmento_actual
+        for numero in self._segmentos():
+            if primero_pendiente is not None and numero >= primero_pendiente:
+                break
+            os.remove(self._ruta(numero))
+
+    def vaciar(self, fabrica_sesion) -> None:
+        """Escribe todo lo encolado (al apagar y en tests)."""
+        while self.escribir_lote(fabrica_sesion):
+            pass
+
+    def cerrar(self) -> None:
+        """Cierra el log y suelta la carpeta propia (la borra si no queda nada pendiente)."""
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+            if self._candado is None:
+                return
+            if not self._pendientes:
+                for numero in self._segmentos():
+                    os.remove(self._ruta(numero))
+                os.remove(os.path.join(self.propio, ".lock"))
+                os.rmdir(self.propio)
+            self._candado.close()
+            self._candado = None
+            self.propio = None
+
+    def esperar(self, timeout: float) -> bool:
+        """Espera a que el hilo escritor termine (después de setear el evento de iniciar)."""
+        if self._hilo is None:
+            return True
+        self._hilo.join(timeout)
+        if self._hilo.is_alive():
+            logger.warning("Ingesta: el escritor no terminó en %ss; %s lecturas quedan en el log", timeout, len(self._pendientes))
+            return False
+        return True
+
+    def iniciar(self, fabrica_sesion) -> threading.Event:
+        """
+        Reproduce el log y arranca el hilo escritor. Al setear el evento escribe lo
+        que quede, cierra el log y termina (esperarlo con esperar()).
+        """
+        reproducidas = self.reproducir()
+        if reproducidas:
+            logger.info("Ingesta: %s lecturas reencoladas desde %s", reproducidas, self.directorio)
+        detener = threading.Event()
+
+        def _bucle():
+            while True:
+                with self._lock:
+                    if len(self._pendientes) < self.lote and not detener.is_set():
+                        self._hay_lote.wait(self.intervalo)
+                try:
+                    escritas = self.escribir_lote(fabrica_sesion)
+                except Exception:
+                    self.errores += 1
+                    logger.exception("Falló la escritura de un lote de ingesta; se reintenta")
+                    detener.wait(min(5.0, self.intervalo * 10))
+                    continue
+                if detener.is_set() and not escritas:
+                    self.cerrar()
+                    return
+
+        self._hilo = threading.Thread(target=_bucle, name="ingesta", daemon=True)
+        self._hilo.start()
+        return detener
+
+    def estadisticas(self) -> dict:
+        return {
+            "activa": INGESTA_ASINCRONA,
+            "profundidad": len(self._pendientes),
+            "maximo": self.maximo,
+            "encoladas": self.encoladas,
+            "escritas": self.escritas,
+            "descartadas": self.descartadas,
+            "rechazadas": self.rechazadas,
+            "reproducidas": self.reproducidas,
+            "lotes": self.lotes,
+            "errores": self.errores,
+            "ultimo_flush_ms": round(self.ultimo_flush_ms, 2),
+            "flush_promedio_ms": round(self._total_flush_ms / self.lotes, 2) if self.lotes else 0.0,
+            "segmentos": len(self._segmentos()),
+        }
+
+
+cola = ColaIngesta(
+    INGESTA_DIRECTORIO, INGESTA_COLA_MAXIMA, INGESTA_LOTE, INGESTA_INTERVALO_MS, INGESTA_SEGMENTO, INGESTA_FSYNC
+)
+metricas.registrar("ingesta", lambda: cola.estadisticas())
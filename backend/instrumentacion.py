@@ -0,0 +1,245 @@
+# backend/instrumentacion.py
+# Instrumentación de acceso a datos por request.
+#
+# - Eventos del Engine (todos los engines, sync y async): cada statement suma
+#   al request en curso su tiempo en la DB y las filas que se leyeron del cursor.
+#   El evento "load" del ORM cuenta los objetos materializados.
+# - El request en curso viaja en un ContextVar que pone el middleware; los hilos
+#   del threadpool (ejecutar, StreamingResponse) heredan una copia del contexto,
+#   así que ven el mismo objeto.
+# - Con AGROTECH_DEBUG=1 cada respuesta lleva X-DB-Consultas, X-DB-Tiempo-Ms,
+#   X-DB-Filas y X-ORM-Objetos. Los acumulados por ruta salen en formato
+#   Prometheus en GET /metricas/prometheus.
+# - Las consultas de más de CONSULTA_LENTA_MS se loguean con su ruta.
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database import Base
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+AGROTECH_DEBUG = os.getenv("AGROTECH_DEBUG", "0") == "1"
+CONSULTA_LENTA_MS = float(os.getenv("CONSULTA_LENTA_MS", "500"))
+
+
+class EstadisticasRequest:
+    __slots__ = ("scope", "consultas", "tiempo_db", "filas", "objetos")
+
+    def __init__(self, scope: dict = None):
+        self.scope = scope
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.filas = 0
+        self.objetos = 0
+
+    @property
+    def ruta(self) -> str:
+        """Plantilla de la ruta (/sensores/{sensor_id}) una vez que el router la resolvió."""
+        if self.scope is None:
+            return "-"
+        ruta = self.scope.get("route")
+        return getattr(ruta, "path", None) or "sin_ruta"
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"x-db-consultas", str(self.consultas).encode()),
+            (b"x-db-tiempo-ms", f"{self.tiempo_db * 1000:.2f}".encode()),
+            (b"x-db-filas", str(self.filas).encode()),
+            (b"x-orm-objetos", str(self.objetos).encode()),
+        ]
+
+
+_actual: ContextVar[Optional[EstadisticasRequest]] = ContextVar("estadisticas_request", default=None)
+
+
+# --- EVENTOS DE SQLALCHEMY ---
+
+class _CursorContado:
+    """Cursor DBAPI que suma al request las filas que se leen de él."""
+
+    def __init__(self, cursor, estadisticas: EstadisticasRequest):
+        self._cursor = cursor
+        self._estadisticas = estadisticas
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            self._estadisticas.filas += 1
+        return fila
+
+    def fetchmany(self, *args):
+        filas = self._cursor.fetchmany(*args)
+        self._estadisticas.filas += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        self._estadisticas.filas += len(filas)
+        return filas
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+# El inicio va en el contexto de ejecución del statement: si falla, se descarta
+# con él. Sin contexto (llamadas internas del dialecto) va en un único lugar de
+# la conexión que el próximo statement pisa, así nunca se acumula.
+_INICIO = "inicio_consulta"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.inicio_consulta = time.perf_counter()
+    else:
+        conn.info[_INICIO] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    inicio = context.inicio_consulta if context is not None else conn.info.pop(_INICIO)
+    duracion = time.perf_counter() - inicio
+    estadisticas = _actual.get()
+    if estadisticas is not None:
+        estadisticas.consultas += 1
+        estadisticas.tiempo_db += duracion
+        if context is not None and cursor.description is not None:
+            # El resultado se arma después de este evento, sobre context.cursor
+            context.cursor = _CursorContado(cursor, estadisticas)
+    if duracion * 1000 >= CONSULTA_LENTA_MS:
+        registro.consultas_lentas += 1
+        ruta = estadisticas.ruta if estadisticas is not None else "-"
+        logger.warning("Consulta lenta (%.0f ms) en %s: %s", duracion * 1000, ruta, " ".join(statement.split())[:500])
+
+
+@event.listens_for(Base, "load", propagate=True)
+def _objeto_cargado(objeto, contexto):
+    estadisticas = _actual.get()
+    if estadisticas is not None:
+        estadisticas.objetos += 1
+
+
+# --- ACUMULADOS POR RUTA ---
+
+class RegistroRutas:
+    """Totales por (método, ruta, status). anotar() se llama al terminar cada request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas: Dict[Tuple[str, str, int], List[float]] = {}
+        self._max_consultas: Dict[Tuple[str, str], int] = {}
+        self.consultas_lentas = 0
+
+    def anotar(self, metodo: str, ruta: str, status: int, segundos: float, estadisticas: EstadisticasRequest) -> None:
+        with self._lock:
+            totales = self._rutas.setdefault((metodo, ruta, status), [0, 0.0, 0, 0.0, 0, 0])
+            for i, valor in enumerate((1, segundos, estadisticas.consultas, estadisticas.tiempo_db,
+                                       estadisticas.filas, estadisticas.objetos)):
+                totales[i] += valor
+            clave = (metodo, ruta)
+            self._max_consultas[clave] = max(self._max_consultas.get(clave, 0), estadisticas.consultas)
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._rutas.clear()
+            self._max_consultas.clear()
+            self.consultas_lentas = 0
+
+    def prometheus(self) -> str:
+        """Contadores por ruta en el formato de texto de Prometheus."""
+        with self._lock:
+            rutas = {clave: list(valores) for clave, valores in self._rutas.items()}
+            maximos = dict(self._max_consultas)
+        lineas = []
+        metricas_ruta = (
+            ("agrotech_http_requests_total", "counter", "Requests atendidos", 0),
+            ("agrotech_http_segundos_total", "counter", "Tiempo total de respuesta", 1),
+            ("agrotech_db_consultas_total", "counter", "Statements SQL ejecutados", 2),
+            ("agrotech_db_segundos_total", "counter", "Tiempo total en la DB", 3),
+            ("agrotech_db_filas_total", "counter", "Filas leídas de la DB", 4),
+            ("agrotech_orm_objetos_total", "counter", "Objetos ORM materializados", 5),
+        )
+        for nombre, tipo, ayuda, indice in metricas_ruta:
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for (metodo, ruta, status), valores in sorted(rutas.items()):
+                etiquetas = f'metodo="{metodo}",ruta="{ruta}",status="{status}"'
+                lineas.append(f"{nombre}{{{etiquetas}}} {_numero(valores[indice])}")
+        lineas += ["# HELP agrotech_db_consultas_max Máximo de statements en un request", "# TYPE agrotech_db_consultas_max gauge"]
+        for (metodo, ruta), maximo in sorted(maximos.items()):
+            lineas.append(f'agrotech_db_consultas_max{{metodo="{metodo}",ruta="{ruta}"}} {maximo}')
+        lineas += ["# HELP agrotech_db_consultas_lentas_total Consultas sobre CONSULTA_LENTA_MS",
+                   "# TYPE agrotech_db_consultas_lentas_total counter",
+                   f"agrotech_db_consultas_lentas_total {self.consultas_lentas}"]
+        # El resto de GET /metricas/ como gauges: agrotech_<colector>_<clave>
+        for nombre, valor in _aplanar(metricas.recolectar()):
+            lineas.append(f"agrotech_{nombre} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "rutas": len(self._max_consultas),
+                "requests": sum(v[0] for v in self._rutas.values()),
+                "consultas_lentas": self.consultas_lentas,
+            }
+
+
+def _numero(valor) -> str:
+    return str(int(valor)) if isinstance(valor, bool) or float(valor).is_integer() else f"{valor:.6f}"
+
+
+def _aplanar(datos: dict, prefijo: str = ""):
+    """(nombre, valor) de todas las hojas numéricas de un dict anidado."""
+    for clave, valor in datos.items():
+        nombre = f"{prefijo}_{clave}" if prefijo else str(clave)
+        if isinstance(valor, dict):
+            yield from _aplanar(valor, nombre)
+        elif isinstance(valor, (int, float)):
+            yield "".join(c if c.isalnum() else "_" for c in nombre).lower(), valor
+
+
+registro = RegistroRutas()
+metricas.registrar("instrumentacion", lambda: registro.estadisticas())
+
+
+# --- MIDDLEWARE ---
+
+class MiddlewareInstrumentacion:
+    """ASGI puro (no BaseHTTPMiddleware): no bufferea respuestas en streaming ni SSE."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        estadisticas = EstadisticasRequest(scope)
+        # También en request.state: lo leen el perfilado y los handlers que quieran
+        scope.setdefault("state", {})["instrumentacion"] = estadisticas
+        token = _actual.set(estadisticas)
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(mensaje):
+            nonlocal status
+            if mensaje["type"] == "http.response.start":
+                status = mensaje["status"]
+                if AGROTECH_DEBUG:
+                    # En streaming cuentan solo las consultas previas al primer byte
+                    mensaje["headers"] = [*mensaje.get("headers", []), *estadisticas.headers()]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _actual.reset(token)
+            registro.anotar(scope["method"], estadisticas.ruta, status, time.perf_counter() - inicio, estadisticas)
@@ -1,34 +1,36 @@
-from typing import List, Dict, Optional
+# backend/logic.py
+# Piezas de dominio puras que comparten los routers y el motor de reglas.
+# Las alertas se evalúan en reglas.MotorReglas (las de siempre son sus reglas
+# por defecto); acá solo quedan los códigos de tipo y el resumen de estado.
+from typing import List, Dict, NamedTuple
 
-def evaluar_sensor(tipo: str, valor: float, humedad_min: float, temp_max: float) -> Optional[str]:
-    """
-    Devuelve el tipo de alerta si el valor viola los umbrales.
-    Si está todo OK, devuelve None.
-    """
-    tipo_normalizado = tipo.lower()
-    
-    if tipo_normalizado == "humedad" and valor < humedad_min:
-        return "Baja Humedad (Sequía)"
-    
-    if tipo_normalizado == "temperatura":
-        if valor > temp_max:
-            return "Alta Temperatura"
-        if valor < 2.0: 
-            return "Peligro de Helada"
-        
-    return None
+class AgregadoSensor(NamedTuple):
+    """Resumen de las lecturas de un sensor en una ventana (una fila por sensor)."""
+    promedio: float
+    cantidad: int
+    minimo: float
+    maximo: float
+
+# Códigos de tipo de sensor (columna `tipos` de reglas.MotorReglas.evaluar)
+TIPO_OTRO, TIPO_HUMEDAD, TIPO_TEMPERATURA = 0, 1, 2
+_CODIGOS_TIPO = {"humedad": TIPO_HUMEDAD, "temperatura": TIPO_TEMPERATURA}
+
+def codigo_tipo(tipo: str) -> int:
+    """'Humedad' / 'humedad' -> TIPO_HUMEDAD, etc. Los tipos desconocidos no alertan."""
+    return _CODIGOS_TIPO.get(tipo.lower(), TIPO_OTRO)
 
-def generar_resumen_estado(alertas: Dict[str, List[float]]) -> str:
+def generar_resumen_estado(alertas: Dict["ReglaCompilada", List[AgregadoSensor]]) -> str:
     """
-    Toma un diccionario de alertas y construye el string final.
+    Toma un diccionario {regla que disparó: agregados} y construye el string final.
+    El prefijo sale de la severidad más alta entre las reglas (ver reglas.py).
     """
     if not alertas:
         return "OK"
         
     resumen_alertas = []
-    for tipo, valores in alertas.items():
-        promedio_final = sum(valores) / len(valores)
-        unidad = "%" if "Humedad" in tipo else "°C"
-        resumen_alertas.append(f"{tipo} ({promedio_final:.1f}{unidad})")
+    for regla, agregados in alertas.items():
+        promedio_final = sum(a.promedio for a in agregados) / len(agregados)
+        resumen_alertas.append(f"{regla.alerta} ({promedio_final:.1f}{regla.unidad})")
     
-    return f"CRÍTICO - {', '.join(resumen_alertas)}"
\ No newline at end of file
+    critico = any(regla.severidad == "critica" for regla in alertas)
+    return f"{'CRÍTICO' if critico else 'ADVERTENCIA'} - {', '.join(resumen_alertas)}"
@@ -1,12 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
+from .database import engine, Base, SessionLocal
+from . import archivo, estado, ingesta, particiones
+from .instrumentacion import MiddlewareInstrumentacion
+from .perfilado import MiddlewarePerfilado
 
-from .routers import sectores, sensores, monitoreo, usuarios
+from .routers import sectores, sensores, monitoreo, usuarios, metricas, reglas, fincas
 
+particiones.preparar_esquema(engine)
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="AgroTech San Juan")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tareas de fondo que viven lo mismo que el proceso
+    detener_particiones = particiones.iniciar_mantenimiento_periodico(engine) if particiones.PARTICIONADO else None
+    # Contra la primaria: una réplica atrasada dejaría afuera lecturas que este proceso ya no va a volver a sumar
+    detener_estado = estado.iniciar_resincronizacion_periodica(SessionLocal) if estado.ESTADO_EN_MEMORIA else None
+    # Al detenerse, el escritor guarda lo que quede; lo que no llegue sigue en el log para el próximo arranque
+    detener_ingesta = ingesta.cola.iniciar(SessionLocal) if ingesta.INGESTA_ASINCRONA else None
+    detener_archivo = archivo.iniciar_archivado_periodico(SessionLocal) if archivo.ARCHIVO_DIRECTORIO else None
+    yield
+    for detener in (detener_particiones, detener_estado, detener_ingesta, detener_archivo):
+        if detener:
+            detener.set()
+    if detener_ingesta:
+        # Sin esperar, el último lote moría con el proceso (y se reinsertaba al reproducir el log)
+        await run_in_threadpool(ingesta.cola.esperar, ingesta.INGESTA_ESPERA_CIERRE)
+
+
+app = FastAPI(title="AgroTech San Juan", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,11 +40,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Perfil por fases de una fracción de los requests (PERFIL_MUESTREO); va adentro de la instrumentación
+app.add_middleware(MiddlewarePerfilado)
+# Consultas, tiempo en DB, filas y objetos ORM por request (headers con AGROTECH_DEBUG=1)
+app.add_middleware(MiddlewareInstrumentacion)
 
 app.include_router(usuarios.router)   
 app.include_router(sectores.router)   
 app.include_router(sensores.router)   
 app.include_router(monitoreo.router)  
+app.include_router(reglas.router)
+app.include_router(metricas.router)
+app.include_router(fincas.router)
 
 @app.get("/")
 def root():
@@ -27,4 +59,4 @@ def root():
         "sistema": "AgroTech San Juan API",
         "estado": "En línea 🚀",
         "documentacion": "/docs"
-    }
\ No newline at end of file
+    }
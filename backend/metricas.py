@@ -0,0 +1,14 @@
+# backend/metricas.py
+# Registro central de métricas internas. Cada módulo registra una función
+# que devuelve un dict con sus números y GET /metricas/ las junta todas.
+from typing import Callable, Dict
+
+_colectores: Dict[str, Callable[[], dict]] = {}
+
+
+def registrar(nombre: str, colector: Callable[[], dict]) -> None:
+    _colectores[nombre] = colector
+
+
+def recolectar() -> Dict[str, dict]:
+    return {nombre: colector() for nombre, colector in _colectores.items()}
@@ -18,6 +18,60 @@ class LecturaResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class LecturaEncolada(BaseModel):
+    """Respuesta 202 con INGESTA_ASINCRONA: la lectura todavía no tiene id"""
+    valor: float
+    fecha: datetime
+    sensor_id: int
+
+class FormatoHistorial(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class LecturaLoteItem(LecturaCreate):
+    """Lectura dentro de un lote: el gateway puede mandar su propia marca de tiempo"""
+    fecha: Optional[datetime] = None
+
+class LecturaLoteResultado(BaseModel):
+    """Resultado de cada ítem del lote, en el mismo orden en que llegó"""
+    indice: int
+    sensor_id: int
+    aceptada: bool
+    error: Optional[str] = None
+
+class LecturaLoteResponse(BaseModel):
+    aceptadas: int
+    rechazadas: int
+    resultados: List[LecturaLoteResultado]
+
+class MetodoRemuestreo(str, Enum):
+    PROMEDIO = "promedio"
+    MINMAX = "minmax"
+    LTTB = "lttb"
+
+class PuntoSerie(BaseModel):
+    """Un punto del gráfico. valor null = el sensor estuvo en silencio (cortar la línea)"""
+    fecha: datetime
+    valor: Optional[float] = None
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    cantidad: Optional[int] = None
+
+class BrechaSerie(BaseModel):
+    desde: datetime
+    hasta: datetime
+
+class SerieResponse(BaseModel):
+    sensor_id: int
+    metodo: MetodoRemuestreo
+    desde: datetime
+    hasta: datetime
+    paso_segundos: float
+    muestras: int
+    puntos: List[PuntoSerie]
+    brechas: List[BrechaSerie]
+
 # ==========================================
 # MODELOS PARA SENSORES
 # ==========================================
@@ -51,6 +105,21 @@ class SensorUpdate(BaseModel):
     modelo: Optional[str] = None
     sector_id: Optional[int] = None
 
+class IncludeSensores(str, Enum):
+    LECTURAS = "lecturas"
+
+class SensorListado(BaseModel):
+    """Versión liviana para GET /sensores/: metadata, última lectura y conteo de 24h"""
+    id: int
+    nombre: str
+    tipo: str
+    # Nullable en la tabla: un sensor puede quedar sin sector
+    sector_id: Optional[int] = None
+    ultima_lectura: Optional[LecturaResponse] = None
+    lecturas_24h: int = 0
+    # Solo con include=lecturas (y acotado por limite_lecturas)
+    lecturas: Optional[List[LecturaResponse]] = None
+
 class SensorResponse(BaseModel):
     id: int
     nombre: str
@@ -71,6 +140,7 @@ class SectorBase(BaseModel):
     # Validación técnica: la humedad no puede ser negativa ni mayor a 100
     humedad_minima: int = Field(ge=0, le=100, description="Humedad entre 0 y 100%")
     temp_maxima: float = 40.0
+    cultivo: Optional[str] = Field(None, description="Vid, Olivo, etc.: habilita reglas de alerta por cultivo")
 class SectorCreate(SectorBase):
     """Se usa en el POST"""
     pass
@@ -80,6 +150,7 @@ class SectorUpdate(BaseModel):
     nombre: Optional[str] = None
     descripcion: Optional[str] = None
     humedad_minima: Optional[int] = Field(None, ge=0, le=100)
+    cultivo: Optional[str] = None
 
 class SectorResponse(BaseModel):
     """Respuesta detallada de un sector con sus sensores"""
@@ -87,6 +158,7 @@ class SectorResponse(BaseModel):
     nombre: str
     descripcion: Optional[str]
     humedad_minima: float
+    cultivo: Optional[str] = None
     estado: str = "OK" 
     sensores: List[SensorResponse] = []
 
@@ -106,6 +178,37 @@ class SectorListResponse(SectorResponse):
     """Versión modificada para usar el sensor liviano"""
     sensores: List[SensorSummary] = []   
     
+# ==========================================
+# MODELOS PARA REGLAS DE ALERTA
+# ==========================================
+
+class OperadorRegla(str, Enum):
+    MENOR = "<"
+    MAYOR = ">"
+
+class SeveridadRegla(str, Enum):
+    CRITICA = "critica"
+    ADVERTENCIA = "advertencia"
+
+class ReglaAlertaCreate(BaseModel):
+    """Sin sector_id ni cultivo la regla es global. Reemplaza a la de igual (tipo_sensor, alerta)"""
+    sector_id: Optional[int] = None
+    cultivo: Optional[str] = None
+    tipo_sensor: TipoSensorEnum
+    alerta: str = Field(description="Nombre de la alerta, p. ej. 'Peligro de Helada'")
+    operador: OperadorRegla
+    umbral: float
+    histeresis: float = Field(0.0, ge=0, description="Margen para soltar una alerta activa")
+    duracion_minima_segundos: int = Field(0, ge=0, description="Tiempo que la condición tiene que sostenerse")
+    severidad: SeveridadRegla = SeveridadRegla.CRITICA
+    prioridad: int = 0
+    activa: bool = Field(True, description="False apaga la regla heredada con la misma alerta")
+
+class ReglaAlertaResponse(ReglaAlertaCreate):
+    id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
 # ==========================================
 # MODELOS PARA USUARIOS
 # ==========================================
@@ -119,6 +222,20 @@ class UserCreate(UserBase):
 class UserResponse(UserBase):
     id: int
     is_active: bool
+    finca_id: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+# ==========================================
+# MODELOS PARA FINCAS (tenants)
+# ==========================================
+
+class FincaCreate(BaseModel):
+    nombre: str
+
+class FincaResponse(BaseModel):
+    id: int
+    nombre: str
 
     model_config = ConfigDict(from_attributes=True)
 
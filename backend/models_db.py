@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship, declared_attr
 from sqlalchemy.sql import func
 from .database import Base
 
+# 0. FINCAS (Tenants: cooperativa u organización)
+# Usuarios, sectores y reglas con finca_id NULL forman su propio tenant (el
+# de antes de que existieran las fincas): se ven entre ellos y con nadie más.
+class FincaDB(Base):
+    __tablename__ = "fincas"
+    id = Column(Integer, primary_key=True, index=True)
+    nombre = Column(String, unique=True, index=True, nullable=False)
+
 # 1. USUARIOS (Seguridad)
 class UserDB(Base):
     __tablename__ = "usuarios"
@@ -10,16 +18,21 @@ class UserDB(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    finca_id = Column(Integer, ForeignKey("fincas.id"), nullable=True, index=True)
 
 # 2. SECTORES (La Finca)
 class SectorDB(Base):
     __tablename__ = "sectores"
     id = Column(Integer, primary_key=True, index=True)
+    # Toda consulta de sectores filtra por acá (ix_sectores_finca_id)
+    finca_id = Column(Integer, ForeignKey("fincas.id"), nullable=True, index=True)
     nombre = Column(String, index=True)
     descripcion = Column(String)
     humedad_minima = Column(Float, default=20.0) 
     temp_maxima = Column(Float, default=40.0)
+    cultivo = Column(String, nullable=True, index=True)  # Vid, Olivo, etc. (para reglas por cultivo)
     sensores = relationship("SensorDB", back_populates="sector", cascade="all, delete-orphan")
+    reglas = relationship("ReglaAlertaDB", cascade="all, delete-orphan")
 
 # 3. SENSORES (Dispositivos)
 class SensorDB(Base):
@@ -44,4 +57,50 @@ class LecturaDB(Base):
     sensor_id = Column(Integer, ForeignKey("sensores.id"))
     
     # Relación: Una lectura pertenece a un solo sensor
-    sensor = relationship("SensorDB", back_populates="lecturas")
\ No newline at end of file
+    sensor = relationship("SensorDB", back_populates="lecturas")
+
+# 5. ROLLUPS (Lecturas pre-agregadas por sensor)
+# Se guarda la suma (no el promedio) para poder acumular de forma incremental
+class RollupMixin:
+    @declared_attr
+    def sensor_id(cls):
+        return Column(Integer, ForeignKey("sensores.id", ondelete="CASCADE"), primary_key=True)
+
+    inicio = Column(DateTime(timezone=True), primary_key=True)  # comienzo del bucket (UTC)
+    cantidad = Column(Integer, nullable=False)
+    suma = Column(Float, nullable=False)
+    minimo = Column(Float, nullable=False)
+    maximo = Column(Float, nullable=False)
+
+class LecturaMinutoDB(RollupMixin, Base):
+    __tablename__ = "lecturas_1m"
+
+class LecturaHoraDB(RollupMixin, Base):
+    __tablename__ = "lecturas_1h"
+
+class LecturaDiaDB(RollupMixin, Base):
+    __tablename__ = "lecturas_1d"
+
+# Índice compuesto para el patrón caliente "lecturas de estos sensores desde X":
+# sensor_id IN (...) AND fecha >= ahora - 24h
+Index("ix_lecturas_sensor_fecha", LecturaDB.sensor_id, LecturaDB.fecha.desc())
+
+# 6. REGLAS DE ALERTA
+# Alcance: sector_id (un sector) > cultivo (todos los sectores de ese cultivo) > global (ambos NULL),
+# siempre dentro de la finca de la regla.
+# Una regla más específica reemplaza a la de igual (tipo_sensor, alerta); activa=False la apaga.
+class ReglaAlertaDB(Base):
+    __tablename__ = "reglas_alerta"
+    id = Column(Integer, primary_key=True, index=True)
+    finca_id = Column(Integer, ForeignKey("fincas.id"), nullable=True, index=True)
+    sector_id = Column(Integer, ForeignKey("sectores.id", ondelete="CASCADE"), nullable=True, index=True)
+    cultivo = Column(String, nullable=True)
+    tipo_sensor = Column(String, nullable=False)  # Humedad, Temperatura
+    alerta = Column(String, nullable=False)  # Nombre que se muestra, p. ej. "Peligro de Helada"
+    operador = Column(String, nullable=False)  # "<" o ">"
+    umbral = Column(Float, nullable=False)
+    histeresis = Column(Float, nullable=False, default=0.0)
+    duracion_minima_segundos = Column(Integer, nullable=False, default=0)
+    severidad = Column(String, nullable=False, default="critica")  # critica, advertencia
+    prioridad = Column(Integer, nullable=False, default=0)  # si dos reglas disparan, gana la mayor
+    activa = Column(Boolean, nullable=False, default=True)
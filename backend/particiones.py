@@ -0,0 +1,197 @@
+# backend/particiones.py
+# Particionado mensual (opcional) de la tabla lecturas.
+#
+# - PostgreSQL: lecturas es una tabla particionada por RANGE(fecha) con una
+#   partición por mes. Las particiones futuras se crean solas y las viejas se
+#   desprenden (DETACH) quedando como tablas sueltas para archivar.
+# - lecturas_default recibe lo que no tiene partición (mantenimiento atrasado,
+#   fechas muy futuras). Postgres no deja crear la partición de un mes si la
+#   default tiene filas de ese mes: antes de crearla se desprende la default,
+#   se mueven esas filas a la partición nueva y se vuelve a enganchar. Todo en
+#   la misma transacción; mientras tanto los INSERT a lecturas esperan el lock.
+# - Los meses son de calendario UTC.
+# - SQLite: no hay particiones nativas; como fallback los meses viejos se
+#   mueven a tablas lecturas_AAAA_MM para que la tabla caliente no crezca.
+import logging
+import os
+import threading
+from datetime import date, datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+PARTICIONADO = os.getenv("LECTURAS_PARTICIONADAS", "0") == "1"
+# Cuántos meses hacia adelante se crean por anticipado
+MESES_ADELANTE = int(os.getenv("LECTURAS_MESES_ADELANTE", "2"))
+# Meses que quedan en la tabla caliente; 0 = nunca desprender
+MESES_RETENCION = int(os.getenv("LECTURAS_MESES_RETENCION", "0"))
+# Cada cuánto corre el mantenimiento en segundo plano
+INTERVALO_MANTENIMIENTO_HORAS = float(os.getenv("LECTURAS_MANTENIMIENTO_HORAS", "24"))
+
+DDL_LECTURAS_PARTICIONADA = """
+CREATE TABLE lecturas (
+    id SERIAL,
+    valor DOUBLE PRECISION NOT NULL,
+    fecha TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    sensor_id INTEGER REFERENCES sensores (id),
+    PRIMARY KEY (id, fecha)
+) PARTITION BY RANGE (fecha)
+"""
+
+DDL_INDICES = [
+    "CREATE INDEX IF NOT EXISTS ix_lecturas_id ON lecturas (id)",
+    "CREATE INDEX IF NOT EXISTS ix_lecturas_sensor_fecha ON lecturas (sensor_id, fecha DESC)",
+    # Red de seguridad: si el mantenimiento se atrasa, los INSERT no fallan
+    "CREATE TABLE IF NOT EXISTS lecturas_default PARTITION OF lecturas DEFAULT",
+]
+
+
+def _sumar_meses(dia: date, meses: int) -> date:
+    total = dia.year * 12 + (dia.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(mes: date) -> str:
+    return f"lecturas_{mes.year:04d}_{mes.month:02d}"
+
+
+def _es_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def preparar_esquema(engine: Engine) -> None:
+    """
+    Crea lecturas como tabla particionada si todavía no existe (solo Postgres).
+    Se llama antes de Base.metadata.create_all, que después la respeta.
+    """
+    if not PARTICIONADO or engine.dialect.name != "postgresql":
+        return
+    if inspect(engine).has_table("lecturas"):
+        return
+
+    otras_tablas = [t for t in Base.metadata.sorted_tables if t.name != "lecturas"]
+    Base.metadata.create_all(bind=engine, tables=otras_tablas)
+    with engine.begin() as conn:
+        conn.execute(text(DDL_LECTURAS_PARTICIONADA))
+        for ddl in DDL_INDICES:
+            conn.execute(text(ddl))
+        crear_particiones(conn, datetime.now(timezone.utc).date(), MESES_ADELANTE)
+
+
+def crear_particiones(conn: Connection, desde: date, meses_adelante: int) -> None:
+    """Asegura las particiones del mes de `desde` y de los siguientes `meses_adelante`."""
+    if not _es_postgres(conn):
+        return
+    inicio = date(desde.year, desde.month, 1)
+    hay_default = conn.execute(text("SELECT to_regclass('lecturas_default') IS NOT NULL")).scalar()
+    for i in range(meses_adelante + 1):
+        mes = _sumar_meses(inicio, i)
+        nombre = nombre_particion(mes)
+        if conn.execute(text("SELECT to_regclass(:nombre) IS NOT NULL"), {"nombre": nombre}).scalar():
+            continue
+        rango = {"desde": mes.isoformat(), "hasta": _sumar_meses(mes, 1).isoformat()}
+        crear = (
+            f"CREATE TABLE {nombre} PARTITION OF lecturas "
+            f"FOR VALUES FROM ('{rango['desde']}') TO ('{rango['hasta']}')"
+        )
+        atrapadas = hay_default and conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM lecturas_default WHERE fecha >= :desde AND fecha < :hasta)"
+        ), rango).scalar()
+        if not atrapadas:
+            conn.execute(text(crear))
+            continue
+        # La default tiene filas del mes: desprender, mover y volver a enganchar
+        conn.execute(text("ALTER TABLE lecturas DETACH PARTITION lecturas_default"))
+        conn.execute(text(crear))
+        movidas = conn.execute(text(
+            f"INSERT INTO {nombre} SELECT * FROM lecturas_default WHERE fecha >= :desde AND fecha < :hasta"
+        ), rango).rowcount
+        conn.execute(text("DELETE FROM lecturas_default WHERE fecha >= :desde AND fecha < :hasta"), rango)
+        conn.execute(text("ALTER TABLE lecturas ATTACH PARTITION lecturas_default DEFAULT"))
+        logger.info("Se movieron %s lecturas de lecturas_default a %s", movidas, nombre)
+
+
+def _particiones_postgres(conn: Connection):
+    filas = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'lecturas'"
+    ))
+    meses = []
+    for (nombre,) in filas:
+        try:
+            _, anio, mes = nombre.split("_")
+            meses.append((date(int(anio), int(mes), 1), nombre))
+        except ValueError:
+            continue  # lecturas_default u otras que no siguen el patrón
+    return sorted(meses)
+
+
+def desprender_particiones(conn: Connection, antes_de: date) -> list:
+    """
+    Saca de la tabla caliente los meses que terminan antes de `antes_de`.
+    Devuelve los nombres de las tablas que quedaron fuera.
+    """
+    corte = date(antes_de.year, antes_de.month, 1)
+    desprendidas = []
+
+    if _es_postgres(conn):
+        for mes, nombre in _particiones_postgres(conn):
+            if mes < corte:
+                conn.execute(text(f"ALTER TABLE lecturas DETACH PARTITION {nombre}"))
+                desprendidas.append(nombre)
+        return desprendidas
+
+    # Fallback SQLite: movemos los meses viejos a tablas lecturas_AAAA_MM
+    minima = conn.execute(text("SELECT MIN(fecha) FROM lecturas")).scalar()
+    if minima is None:
+        return desprendidas
+    if isinstance(minima, str):
+        minima = datetime.fromisoformat(minima)
+    mes = date(minima.year, minima.month, 1)
+    while mes < corte:
+        siguiente = _sumar_meses(mes, 1)
+        nombre = nombre_particion(mes)
+        rango = {"desde": str(mes), "hasta": str(siguiente)}
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {nombre} AS SELECT * FROM lecturas WHERE 0"))
+        movidas = conn.execute(text(
+            f"INSERT INTO {nombre} SELECT * FROM lecturas WHERE fecha >= :desde AND fecha < :hasta"
+        ), rango).rowcount
+        conn.execute(text("DELETE FROM lecturas WHERE fecha >= :desde AND fecha < :hasta"), rango)
+        if movidas:
+            desprendidas.append(nombre)
+        mes = siguiente
+    return desprendidas
+
+
+def mantener_particiones(engine: Engine, hoy: date = None) -> None:
+    """Crea las particiones que faltan y desprende las que superan la retención."""
+    hoy = hoy or datetime.now(timezone.utc).date()
+    with engine.begin() as conn:
+        crear_particiones(conn, hoy, MESES_ADELANTE)
+        if MESES_RETENCION > 0:
+            desprendidas = desprender_particiones(conn, _sumar_meses(date(hoy.year, hoy.month, 1), -MESES_RETENCION))
+            if desprendidas:
+                logger.info("Particiones desprendidas de lecturas: %s", ", ".join(desprendidas))
+
+
+def iniciar_mantenimiento_periodico(engine: Engine) -> threading.Event:
+    """Corre mantener_particiones ya y después cada INTERVALO_MANTENIMIENTO_HORAS."""
+    detener = threading.Event()
+
+    def _bucle():
+        while True:
+            try:
+                mantener_particiones(engine)
+            except Exception:
+                logger.exception("Falló el mantenimiento de particiones de lecturas")
+            if detener.wait(INTERVALO_MANTENIMIENTO_HORAS * 3600):
+                return
+
+    threading.Thread(target=_bucle, name="particiones-lecturas", daemon=True).start()
+    return detener
@@ -0,0 +1,290 @@
+# backend/perfilado.py
+# Perfilado por muestreo de requests (PERFIL_MUESTREO=0.01 = 1%).
+#
+# - A los requests sorteados se les mide en qué se fue el tiempo:
+#   db (instrumentacion), computo (handler y dependencias sin la DB),
+#   serializacion (response_model + JSON) y otros (middlewares, envío).
+#   RutaPerfilada (route_class de los routers) marca dónde termina el endpoint
+#   y las fases explícitas se marcan con `with perfilado.fase(...)`.
+# - Con PERFIL_CPROFILE=1 además se corre cProfile: en el hilo del event loop y
+#   en los hilos donde `ejecutar` corre las funciones de acceso a datos. Un solo
+#   request a la vez (el perfilador es global por hilo); el del loop también ve
+#   lo que corran en paralelo otros requests. Desde Python 3.12 cProfile usa
+#   sys.monitoring: un solo perfilador por intérprete, que ya ve todos los
+#   hilos, así que no se anida otro en el threadpool.
+# - Los últimos PERFIL_BUFFER perfiles viven en un ring buffer en memoria y se
+#   leen en GET /metricas/perfiles (solo ADMIN_USUARIOS).
+# - Sin sortear, el costo es un random() y un ContextVar.get() por request.
+import cProfile
+import functools
+import inspect
+import itertools
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+from . import metricas
+
+PERFIL_MUESTREO = float(os.getenv("PERFIL_MUESTREO", "0"))
+PERFIL_CPROFILE = os.getenv("PERFIL_CPROFILE", "0") == "1"
+PERFIL_BUFFER = int(os.getenv("PERFIL_BUFFER", "500"))
+# Funciones que se guardan de cada cProfile, por tiempo acumulado
+PERFIL_FUNCIONES = 25
+
+
+class Perfil:
+    """Marcas de tiempo de un request sorteado."""
+
+    __slots__ = ("inicio", "ruta_inicio", "endpoint_fin", "ruta_fin", "fases", "cprofile", "cprofiles_hilos")
+
+    def __init__(self, cprofile: Optional[cProfile.Profile] = None):
+        self.inicio = time.perf_counter()
+        self.ruta_inicio = self.endpoint_fin = self.ruta_fin = None
+        self.fases: Dict[str, float] = {}
+        self.cprofile = cprofile
+        self.cprofiles_hilos: List[cProfile.Profile] = []
+
+    def sumar(self, fase: str, segundos: float) -> None:
+        self.fases[fase] = self.fases.get(fase, 0.0) + segundos
+
+    def fases_ms(self, total: float, tiempo_db: float) -> Dict[str, float]:
+        """db + computo + serializacion + otros = total."""
+        ruta = (self.ruta_fin - self.ruta_inicio) if self.ruta_fin is not None else 0.0
+        serializacion = self.fases.get("serializacion", 0.0)
+        if self.endpoint_fin is not None and self.ruta_fin is not None:
+            serializacion += self.ruta_fin - self.endpoint_fin
+        fases = {
+            "db": tiempo_db,
+            "computo": max(0.0, ruta - serializacion - tiempo_db),
+            "serializacion": serializacion,
+            "otros": max(0.0, total - ruta),
+        }
+        fases.update((nombre, s) for nombre, s in self.fases.items() if nombre not in fases)
+        return {nombre: round(s * 1000, 3) for nombre, s in fases.items()}
+
+
+_actual: ContextVar[Optional[Perfil]] = ContextVar("perfil_request", default=None)
+# cProfile engancha el hilo entero: un request perfilado a la vez
+_cprofile_libre = threading.Lock()
+# Antes de 3.12 cada hilo necesita su propio perfilador
+_CPROFILE_POR_HILO = sys.version_info < (3, 12)
+
+
+@contextmanager
+def fase(nombre: str):
+    """Suma el tiempo del bloque a la fase `nombre` del request (si está sorteado)."""
+    perfil = _actual.get()
+    if perfil is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        perfil.sumar(nombre, time.perf_counter() - inicio)
+
+
+def en_hilo(funcion, *args, **kwargs):
+    """Corre `funcion` con cProfile si el request lo pide (para los hilos del threadpool)."""
+    perfil = _actual.get()
+    if perfil is None or perfil.cprofile is None or not _CPROFILE_POR_HILO:
+        return funcion(*args, **kwargs)
+    perfilador = cProfile.Profile()
+    if not _activar(perfilador):
+        return funcion(*args, **kwargs)
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        perfilador.disable()
+        perfil.cprofiles_hilos.append(perfilador)
+
+
+def _activar(perfilador: cProfile.Profile) -> bool:
+    """False si ya hay otra herramienta de perfilado activa (sys.monitoring, 3.12+)."""
+    try:
+        perfilador.enable()
+    except ValueError:
+        return False
+    return True
+
+
+def _funciones(perfil: Perfil) -> List[dict]:
+    import pstats  # solo con PERFIL_CPROFILE
+
+    estadisticas = pstats.Stats(perfil.cprofile)
+    for perfilador in perfil.cprofiles_hilos:
+        estadisticas.add(perfilador)
+    filas = sorted(estadisticas.stats.items(), key=lambda item: item[1][3], reverse=True)[:PERFIL_FUNCIONES]
+    return [
+        {
+            "funcion": f"{os.path.basename(archivo)}:{linea}({nombre})",
+            "llamadas": llamadas,
+            "propio_ms": round(propio * 1000, 3),
+            "acumulado_ms": round(acumulado * 1000, 3),
+        }
+        for (archivo, linea, nombre), (_, llamadas, propio, acumulado, _) in filas
+    ]
+
+
+# --- RUTAS ---
+
+def _cronometrar(endpoint):
+    """Marca el fin del endpoint: lo que sigue hasta el fin de la ruta es serialización."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def envoltorio(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                perfil = _actual.get()
+                if perfil is not None:
+                    perfil.endpoint_fin = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def envoltorio(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                perfil = _actual.get()
+                if perfil is not None:
+                    perfil.endpoint_fin = time.perf_counter()
+    return envoltorio
+
+
+class RutaPerfilada(APIRoute):
+    """APIRoute que marca inicio y fin de la ruta y del endpoint en los requests sorteados."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _cronometrar(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        original = super().get_route_handler()
+
+        async def manejar(request):
+            perfil = _actual.get()
+            if perfil is None:
+                return await original(request)
+            perfil.ruta_inicio = time.perf_counter()
+            try:
+                return await original(request)
+            finally:
+                perfil.ruta_fin = time.perf_counter()
+
+        return manejar
+
+
+# --- RING BUFFER ---
+
+class RegistroPerfiles:
+    def __init__(self, tamanio: int):
+        self._perfiles: deque = deque(maxlen=tamanio)
+        self._secuencia = itertools.count(1)
+        self.muestreados = 0
+
+    def guardar(self, entrada: dict) -> None:
+        entrada["id"] = next(self._secuencia)
+        self._perfiles.append(entrada)  # deque.append es atómico: sin lock
+        self.muestreados += 1
+
+    def ultimos(self, ruta: Optional[str] = None, limite: int = 50) -> List[dict]:
+        perfiles = [p for p in list(self._perfiles) if ruta is None or p["ruta"] == ruta]
+        return perfiles[-limite:][::-1]
+
+    def resumen(self) -> Dict[str, dict]:
+        """Por ruta: muestras, p50/p95 del total y promedio de cada fase."""
+        por_ruta: Dict[str, List[dict]] = {}
+        for perfil in list(self._perfiles):
+            por_ruta.setdefault(f"{perfil['metodo']} {perfil['ruta']}", []).append(perfil)
+        resumen = {}
+        for ruta, perfiles in sorted(por_ruta.items()):
+            totales = sorted(p["total_ms"] for p in perfiles)
+            fases = {}
+            for perfil in perfiles:
+                for nombre, ms in perfil["fases_ms"].items():
+                    fases[nombre] = fases.get(nombre, 0.0) + ms
+            resumen[ruta] = {
+                "muestras": len(perfiles),
+                "p50_ms": round(statistics.median(totales), 3),
+                "p95_ms": totales[min(len(totales) - 1, int(len(totales) * 0.95))],
+                "fases_promedio_ms": {nombre: round(ms / len(perfiles), 3) for nombre, ms in fases.items()},
+            }
+        return resumen
+
+    def limpiar(self) -> None:
+        self._perfiles.clear()
+        self.muestreados = 0
+
+    def estadisticas(self) -> dict:
+        return {
+            "muestreo": PERFIL_MUESTREO,
+            "cprofile": PERFIL_CPROFILE,
+            "muestreados": self.muestreados,
+            "en_buffer": len(self._perfiles),
+        }
+
+
+registro = RegistroPerfiles(PERFIL_BUFFER)
+metricas.registrar("perfilado", lambda: registro.estadisticas())
+
+
+# --- MIDDLEWARE ---
+
+class MiddlewarePerfilado:
+    """ASGI puro. Va dentro de MiddlewareInstrumentacion: lee de ahí el tiempo en la DB."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or PERFIL_MUESTREO <= 0 or random.random() >= PERFIL_MUESTREO:
+            return await self.app(scope, receive, send)
+
+        perfilador = None
+        if PERFIL_CPROFILE and _cprofile_libre.acquire(blocking=False):
+            perfilador = cProfile.Profile()
+        perfil = Perfil(perfilador)
+        token = _actual.set(perfil)
+        status = 500
+
+        async def enviar(mensaje):
+            nonlocal status
+            if mensaje["type"] == "http.response.start":
+                status = mensaje["status"]
+            await send(mensaje)
+
+        if perfilador is not None and not _activar(perfilador):
+            # Otro perfilador (coverage, un debugger) ocupa sys.monitoring: solo fases
+            perfil.cprofile = perfilador = None
+            _cprofile_libre.release()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            total = time.perf_counter() - perfil.inicio
+            if perfilador is not None:
+                perfilador.disable()
+                _cprofile_libre.release()
+            _actual.reset(token)
+            instrumentacion = scope.get("state", {}).get("instrumentacion")
+            ruta = scope.get("route")
+            entrada = {
+                "fecha": datetime.now(timezone.utc).isoformat(),
+                "metodo": scope["method"],
+                "ruta": getattr(ruta, "path", None) or "sin_ruta",
+                "status": status,
+                "total_ms": round(total * 1000, 3),
+                "fases_ms": perfil.fases_ms(total, instrumentacion.tiempo_db if instrumentacion else 0.0),
+                "consultas": instrumentacion.consultas if instrumentacion else None,
+            }
+            if perfilador is not None:
+                entrada["funciones"] = _funciones(perfil)
+            registro.guardar(entrada)
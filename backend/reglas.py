@@ -0,0 +1,363 @@
+# backend/reglas.py
+# Motor de reglas de alerta.
+#
+# - Las reglas (umbral, histéresis, duración mínima, severidad, prioridad) se
+#   definen globales, por cultivo o por sector en la tabla reglas_alerta. Las
+#   de siempre (sequía contra humedad_minima, calor contra temp_maxima y
+#   helada < 2 °C) vienen por defecto y se pueden reemplazar o apagar.
+# - Se compilan una sola vez a una tabla de despacho por tipo de sensor, con
+#   el umbral de cada sector en una columna de NumPy. Evaluar es comparar
+#   arrays: no se interpreta ninguna regla por request.
+# - Se recompila solo cuando cambia un sector o una regla (eventos de ORM) o
+#   cada REGLAS_RECOMPILAR_SEGUNDOS, para ver cambios hechos por otros workers.
+# - Un motor por finca, con sus sectores y sus reglas: un cambio en una finca
+#   no recompila las demás.
+# - Histéresis y duración mínima necesitan memoria por sensor: solo se aplican
+#   a valores instantáneos (alertas con la última lectura), no a promedios. La
+#   memoria avanza con cada lectura que se registra (eventos.anotar), no solo
+#   cuando alguien consulta las alertas; una lectura más vieja que la última
+#   vista no la hace retroceder.
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session, object_session
+
+from .logic import TIPO_HUMEDAD, TIPO_TEMPERATURA, AgregadoSensor, codigo_tipo, generar_resumen_estado
+from .models_db import ReglaAlertaDB, SectorDB
+from .rollups import a_utc
+from . import crud, metricas
+
+REGLAS_RECOMPILAR_SEGUNDOS = float(os.getenv("REGLAS_RECOMPILAR_SEGUNDOS", "60"))
+
+_COMPARAR = {"<": np.less, ">": np.greater}
+_ORDEN_SEVERIDAD = {"advertencia": 0, "critica": 1}
+_MODIFICADAS = "reglas_modificadas"
+
+# Umbral fijo de helada (°C) para sensores de temperatura
+UMBRAL_HELADA = 2.0
+ALERTA_SEQUIA, ALERTA_CALOR, ALERTA_HELADA = "Baja Humedad (Sequía)", "Alta Temperatura", "Peligro de Helada"
+
+
+class ReglaCompilada(NamedTuple):
+    """Forma de una regla. El umbral depende del sector: vive en MotorReglas.umbrales."""
+    tipo: int  # logic.TIPO_*
+    alerta: str
+    operador: str  # "<" o ">"
+    histeresis: float
+    duracion_minima: float  # segundos
+    severidad: str
+    prioridad: int
+
+    @property
+    def unidad(self) -> str:
+        return "%" if self.tipo == TIPO_HUMEDAD else "°C"
+
+
+class _Definicion(NamedTuple):
+    """Regla sin compilar: umbral fijo o tomado de una columna del sector."""
+    tipo: int
+    alerta: str
+    operador: str
+    umbral: Optional[float] = None
+    columna_sector: Optional[str] = None
+    histeresis: float = 0.0
+    duracion_minima: float = 0.0
+    severidad: str = "critica"
+    prioridad: int = 0
+    activa: bool = True
+
+    def compilada(self) -> ReglaCompilada:
+        return ReglaCompilada(
+            self.tipo, self.alerta, self.operador, self.histeresis, self.duracion_minima, self.severidad, self.prioridad
+        )
+
+    def umbral_para(self, sector) -> float:
+        umbral = self.umbral if self.columna_sector is None else getattr(sector, self.columna_sector)
+        return np.nan if umbral is None else umbral
+
+
+# El comportamiento histórico: la alta temperatura gana a la helada si las dos disparan
+REGLAS_POR_DEFECTO = (
+    _Definicion(TIPO_HUMEDAD, ALERTA_SEQUIA, "<", columna_sector="humedad_minima"),
+    _Definicion(TIPO_TEMPERATURA, ALERTA_HELADA, "<", umbral=UMBRAL_HELADA),
+    _Definicion(TIPO_TEMPERATURA, ALERTA_CALOR, ">", columna_sector="temp_maxima", prioridad=1),
+)
+
+
+class _EstadoReglas:
+    """Qué sensores tienen cada regla activa y desde cuándo se cumple su condición."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._activas: Dict[ReglaCompilada, set] = {}
+        self._inicios: Dict[ReglaCompilada, Dict[int, datetime]] = {}
+        self._vistas: Dict[ReglaCompilada, Dict[int, datetime]] = {}  # última fecha evaluada
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._activas.clear()
+            self._inicios.clear()
+            self._vistas.clear()
+
+    def aplicar(self, regla: ReglaCompilada, umbrales: np.ndarray, filas: np.ndarray, valores: np.ndarray,
+                sensor_ids: Sequence[int], fechas: Sequence[datetime]) -> np.ndarray:
+        dispara = np.zeros(len(valores), dtype=bool)
+        comparar = _COMPARAR[regla.operador]
+        # Mientras está activa, la regla se suelta recién al pasar el umbral ± histéresis
+        margen = regla.histeresis if regla.operador == "<" else -regla.histeresis
+        with self._lock:
+            activas = self._activas.setdefault(regla, set())
+            inicios = self._inicios.setdefault(regla, {})
+            vistas = self._vistas.setdefault(regla, {})
+            for i in np.flatnonzero(filas):
+                sensor_id = sensor_ids[i]
+                fecha = a_utc(fechas[i])
+                vista = vistas.get(sensor_id)
+                if vista is not None and fecha < vista:
+                    # Llegó tarde: no cambia la memoria, vale lo que ya se decidió
+                    dispara[i] = sensor_id in activas
+                    continue
+                vistas[sensor_id] = fecha
+                umbral = umbrales[i] + margen if sensor_id in activas else umbrales[i]
+                if not comparar(valores[i], umbral):
+                    activas.discard(sensor_id)
+                    inicios.pop(sensor_id, None)
+                    continue
+                inicio = inicios.setdefault(sensor_id, fecha)
+                if (fecha - inicio).total_seconds() >= regla.duracion_minima:
+                    dispara[i] = True
+                    activas.add(sensor_id)
+        return dispara
+
+
+_estado_reglas = _EstadoReglas()
+
+
+class MotorReglas:
+    """Reglas compiladas: tabla de despacho por tipo de sensor + matriz de umbrales (regla × sector)."""
+
+    def __init__(self, reglas: List[ReglaCompilada], umbrales: np.ndarray, indice_sector: Dict[int, int], version: int):
+        self.reglas = reglas
+        self.umbrales = umbrales  # la última columna es la de un sector desconocido
+        self.indice_sector = indice_sector
+        self.version = version
+        self.compilado_en = time.monotonic()
+        # tipo de sensor -> índices de reglas, de menor a mayor prioridad (la última que dispara gana)
+        self.despacho: Dict[int, List[int]] = {}
+        for indice, regla in enumerate(reglas):
+            self.despacho.setdefault(regla.tipo, []).append(indice)
+        # Alguna regla con memoria por sensor: hay que evaluar cada lectura que llega
+        self.con_memoria = any(r.histeresis or r.duracion_minima for r in reglas)
+
+    def evaluar(self, sector_ids: Sequence[int], tipos, valores, sensor_ids: Sequence[int] = None,
+                fechas: Sequence[datetime] = None) -> np.ndarray:
+        """
+        Devuelve un código por fila: 0 = sin alerta, j + 1 = disparó self.reglas[j].
+        Con sensor_ids y fechas (valores instantáneos) aplica histéresis y duración mínima.
+        """
+        columnas = np.fromiter((self.indice_sector.get(s, -1) for s in sector_ids), dtype=np.intp, count=len(sector_ids))
+        tipos = np.asarray(tipos, dtype=np.int8)
+        valores = np.asarray(valores, dtype=np.float64)
+        codigos = np.zeros(len(valores), dtype=np.int16)
+
+        for tipo, indices in self.despacho.items():
+            del_tipo = tipos == tipo
+            if not del_tipo.any():
+                continue
+            for j in indices:
+                regla = self.reglas[j]
+                umbrales = self.umbrales[j, columnas]
+                if sensor_ids is not None and (regla.histeresis or regla.duracion_minima):
+                    dispara = _estado_reglas.aplicar(regla, umbrales, del_tipo, valores, sensor_ids, fechas)
+                else:
+                    dispara = del_tipo & _COMPARAR[regla.operador](valores, umbrales)
+                codigos[dispara] = j + 1
+        return codigos
+
+    def regla(self, codigo: int) -> ReglaCompilada:
+        return self.reglas[codigo - 1]
+
+    def estados_sectores(self, sectores, agregados: Dict[int, AgregadoSensor]) -> Dict[int, str]:
+        """Estado de cada sector evaluando el promedio de 24h de sus sensores. Devuelve {sector_id: estado}."""
+        evaluados, filas = [], []
+        for sector in sectores:
+            for sensor in sector.sensores:
+                agregado = agregados.get(sensor.id)
+                if agregado:
+                    evaluados.append((sector.id, agregado))
+                    filas.append((sector.id, codigo_tipo(sensor.tipo), agregado.promedio))
+
+        alertas_por_sector: Dict[int, Dict[ReglaCompilada, List[AgregadoSensor]]] = {sector.id: {} for sector in sectores}
+        if filas:
+            codigos = self.evaluar(*zip(*filas))
+            for indice in np.flatnonzero(codigos):
+                sector_id, agregado = evaluados[indice]
+                alertas_por_sector[sector_id].setdefault(self.regla(codigos[indice]), []).append(agregado)
+
+        return {sector_id: generar_resumen_estado(alertas) for sector_id, alertas in alertas_por_sector.items()}
+
+
+def compilar(sectores, reglas, version: int = 0) -> MotorReglas:
+    """
+    sectores: filas con id, humedad_minima, temp_maxima y cultivo.
+    reglas: filas de reglas_alerta. Para cada sector gana la regla más específica
+    (sector > cultivo > global > por defecto) de cada (tipo de sensor, alerta).
+    """
+    globales, por_cultivo, por_sector = {}, {}, {}
+    for r in reglas:
+        definicion = _Definicion(
+            codigo_tipo(r.tipo_sensor), r.alerta, r.operador, umbral=r.umbral, histeresis=r.histeresis,
+            duracion_minima=r.duracion_minima_segundos, severidad=r.severidad, prioridad=r.prioridad, activa=r.activa
+        )
+        clave = (definicion.tipo, definicion.alerta)
+        if r.sector_id is not None:
+            por_sector.setdefault(r.sector_id, {})[clave] = definicion
+        elif r.cultivo:
+            por_cultivo.setdefault(r.cultivo.lower(), {})[clave] = definicion
+        else:
+            globales[clave] = definicion
+
+    base = {(d.tipo, d.alerta): d for d in REGLAS_POR_DEFECTO}
+    base.update(globales)
+
+    # Umbral de cada regla compilada en cada sector
+    columnas = []
+    for sector in sectores:
+        efectivas = dict(base)
+        efectivas.update(por_cultivo.get((sector.cultivo or "").lower(), {}))
+        efectivas.update(por_sector.get(sector.id, {}))
+        columnas.append({d.compilada(): d.umbral_para(sector) for d in efectivas.values() if d.activa})
+    # Sector desconocido (creado en otro worker): solo las reglas con umbral fijo
+    columnas.append({d.compilada(): d.umbral for d in base.values() if d.activa and d.columna_sector is None})
+
+    compiladas = sorted(
+        {regla for columna in columnas for regla in columna},
+        key=lambda r: (r.prioridad, _ORDEN_SEVERIDAD.get(r.severidad, 0), r.alerta, r)
+    )
+    umbrales = np.full((len(compiladas), len(columnas)), np.nan)
+    for j, regla in enumerate(compiladas):
+        for i, columna in enumerate(columnas):
+            if regla in columna:
+                umbrales[j, i] = columna[regla]
+
+    return MotorReglas(compiladas, umbrales, {sector.id: i for i, sector in enumerate(sectores)}, version)
+
+
+# --- MOTORES VIGENTES (uno por finca) ---
+
+_version = 0  # invalida todas las fincas
+_versiones: Dict[Optional[int], int] = {}  # invalida una finca
+_motores: Dict[Optional[int], MotorReglas] = {}
+_modificaciones = 0  # crece con cualquier invalidación, de todas o de una finca
+_con_memoria: Optional[tuple] = None  # (modificaciones, monotonic, hay reglas con memoria)
+_compilaciones = 0
+# Las versiones se incrementan desde los commits de cualquier hilo y los motores se
+# arman en el threadpool. Locks separados: un commit no espera a una recompilación
+# (que va a la DB); si la versión cambia en el medio, el motor nace viejo y se rearma.
+_lock_versiones = threading.Lock()
+_lock_motores = threading.Lock()
+
+
+def _vigente(motor: Optional[MotorReglas], version: int) -> bool:
+    if motor is None or motor.version != version:
+        return False
+    return not (REGLAS_RECOMPILAR_SEGUNDOS and time.monotonic() - motor.compilado_en > REGLAS_RECOMPILAR_SEGUNDOS)
+
+
+def obtener_motor(db: Session, finca_id: Optional[int]) -> MotorReglas:
+    """El motor de la finca; se recompila si cambiaron sus sectores/reglas o venció REGLAS_RECOMPILAR_SEGUNDOS."""
+    global _compilaciones
+    # Las dos versiones solo crecen: su suma cambia si cambia cualquiera de ellas
+    motor = _motores.get(finca_id)
+    if _vigente(motor, _version + _versiones.get(finca_id, 0)):
+        return motor
+    with _lock_motores:
+        # Otro hilo pudo haberlo recompilado mientras esperábamos
+        version = _version + _versiones.get(finca_id, 0)
+        motor = _motores.get(finca_id)
+        if not _vigente(motor, version):
+            sectores = db.execute(
+                select(SectorDB.id, SectorDB.humedad_minima, SectorDB.temp_maxima, SectorDB.cultivo)
+                .where(crud.de_la_finca(SectorDB.finca_id, finca_id))
+            ).all()
+            reglas = db.execute(select(ReglaAlertaDB).where(crud.de_la_finca(ReglaAlertaDB.finca_id, finca_id))).scalars().all()
+            motor = _motores[finca_id] = compilar(sectores, reglas, version)
+            _compilaciones += 1
+    return motor
+
+
+def hay_reglas_con_memoria(db: Session) -> bool:
+    """
+    Si alguna finca tiene reglas activas con histéresis o duración mínima. Las de
+    por defecto no tienen: sin reglas propias así, escribir lecturas no necesita
+    ningún motor. Se vuelve a consultar con las mismas invalidaciones que los motores.
+    """
+    global _con_memoria
+    modificaciones = _modificaciones
+    cache = _con_memoria
+    if (cache is None or cache[0] != modificaciones
+            or (REGLAS_RECOMPILAR_SEGUNDOS and time.monotonic() - cache[1] > REGLAS_RECOMPILAR_SEGUNDOS)):
+        hay = db.scalar(select(
+            select(ReglaAlertaDB.id)
+            .where(ReglaAlertaDB.activa, or_(ReglaAlertaDB.histeresis > 0, ReglaAlertaDB.duracion_minima_segundos > 0))
+            .exists()
+        ))
+        # Con las modificaciones de antes de consultar: si cambió algo en el medio, se repite
+        cache = _con_memoria = (modificaciones, time.monotonic(), bool(hay))
+    return cache[2]
+
+
+def invalidar() -> None:
+    """Fuerza la recompilación de todas las fincas en la próxima evaluación."""
+    global _version, _modificaciones
+    with _lock_versiones:
+        _version += 1
+        _modificaciones += 1
+
+
+def invalidar_finca(finca_id: Optional[int]) -> None:
+    """Fuerza la recompilación del motor de una sola finca."""
+    global _modificaciones
+    with _lock_versiones:
+        _versiones[finca_id] = _versiones.get(finca_id, 0) + 1
+        _modificaciones += 1
+
+
+def reiniciar() -> None:
+    """Recompila y olvida la histéresis/duración acumulada (tests)."""
+    invalidar()
+    _estado_reglas.limpiar()
+
+
+metricas.registrar("reglas", lambda: {
+    "compilaciones": _compilaciones,
+    "motores": len(_motores),
+    "reglas_compiladas": sum(len(motor.reglas) for motor in list(_motores.values())),
+    "version": _version,
+})
+
+
+@event.listens_for(SectorDB, "after_insert")
+@event.listens_for(SectorDB, "after_update")
+@event.listens_for(SectorDB, "after_delete")
+@event.listens_for(ReglaAlertaDB, "after_insert")
+@event.listens_for(ReglaAlertaDB, "after_update")
+@event.listens_for(ReglaAlertaDB, "after_delete")
+def _marcar_modificadas(mapper, connection, objetivo):
+    sesion = object_session(objetivo)
+    if sesion is not None:
+        sesion.info.setdefault(_MODIFICADAS, set()).add(objetivo.finca_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_al_confirmar(sesion):
+    for finca_id in sesion.info.pop(_MODIFICADAS, ()):
+        invalidar_finca(finca_id)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(sesion):
+    sesion.info.pop(_MODIFICADAS, None)
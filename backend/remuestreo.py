@@ -0,0 +1,147 @@
+# backend/remuestreo.py
+# Remuestreo de series para gráficos: N puntos en lugar de todas las muestras.
+#
+# - Buckets de `paso` segundos alineados a `desde`. Métodos:
+#   promedio: un punto por bucket con la media.
+#   minmax:   la envolvente (mínimo y máximo) de cada bucket.
+#   lttb:     Largest-Triangle-Three-Buckets: elige la muestra real de cada
+#             bucket que más área forma con la elegida antes y el promedio del
+#             bucket siguiente. Conserva picos y forma con muestras verdaderas.
+# - Una sola pasada sobre las lecturas ordenadas por fecha: en memoria viven
+#   a lo sumo dos buckets (lttb), nunca la serie completa.
+# - Si entre dos muestras pasan más de `brecha` segundos el sensor estuvo en
+#   silencio: se registra la brecha y se emite un punto con valor null para
+#   que el gráfico corte la línea en lugar de unir los extremos. Con `hasta`
+#   también cuentan el silencio desde `desde` hasta la primera muestra y desde
+#   la última hasta `hasta` (o la ventana entera si no hubo muestras).
+from typing import Iterable, List, Optional, Tuple
+
+from .series import fecha_de
+
+PROMEDIO, MINMAX, LTTB = "promedio", "minmax", "lttb"
+# Brecha mínima por defecto: un hueco de menos de 10 minutos no es silencio
+BRECHA_MINIMA_SEGUNDOS = 600.0
+
+
+def paso_para(desde: float, hasta: float, puntos: int) -> float:
+    """Ancho de bucket para que [desde, hasta) entre en `puntos` buckets."""
+    return max((hasta - desde) / puntos, 1e-6)
+
+
+class Remuestreador:
+    """Se le pasan muestras (epoch, valor) en orden con agregar() y al final resultado()."""
+
+    def __init__(self, desde: float, paso: float, metodo: str = PROMEDIO, brecha: Optional[float] = None,
+                 hasta: Optional[float] = None):
+        self.desde = desde
+        self.hasta = hasta
+        self.paso = paso
+        self.metodo = metodo
+        self.brecha = brecha if brecha is not None else max(2 * paso, BRECHA_MINIMA_SEGUNDOS)
+        self.puntos: List[dict] = []
+        self.brechas: List[Tuple[float, float]] = []
+        self.muestras = 0
+        self._anterior: Optional[float] = None  # tiempo de la muestra anterior
+        # Bucket en curso
+        self._indice: Optional[int] = None
+        self._tiempos: List[float] = []
+        self._valores: List[float] = []
+        # lttb: bucket que espera al siguiente para elegir su punto, y último punto elegido
+        self._pendiente: Optional[Tuple[List[float], List[float]]] = None
+        self._elegido: Optional[Tuple[float, float]] = None
+
+    def agregar(self, tiempo: float, valor: float) -> None:
+        self.muestras += 1
+        if self._anterior is None:
+            if self.hasta is not None:
+                self._brecha(self.desde, tiempo)
+        elif tiempo - self._anterior > self.brecha:
+            self._cerrar_segmento()
+            self._brecha(self._anterior, tiempo)
+        self._anterior = tiempo
+
+        indice = int((tiempo - self.desde) // self.paso)
+        if indice != self._indice and self._tiempos:
+            self._cerrar_bucket()
+        self._indice = indice
+        self._tiempos.append(tiempo)
+        self._valores.append(valor)
+
+    def agregar_todas(self, muestras: Iterable[Tuple[float, float]]) -> "Remuestreador":
+        for tiempo, valor in muestras:
+            self.agregar(tiempo, valor)
+        return self
+
+    def resultado(self) -> Tuple[List[dict], List[Tuple[float, float]]]:
+        self._cerrar_segmento()
+        if self.hasta is not None:
+            self._brecha(self._anterior if self._anterior is not None else self.desde, self.hasta)
+            self.hasta = None  # resultado() se puede llamar de nuevo sin repetir la brecha final
+        return self.puntos, self.brechas
+
+    def _brecha(self, inicio: float, fin: float) -> None:
+        """Registra el silencio [inicio, fin] si supera el umbral y corta la línea en el medio."""
+        if fin - inicio > self.brecha:
+            self.brechas.append((inicio, fin))
+            self.puntos.append({"fecha": fecha_de((inicio + fin) / 2), "valor": None})
+
+    # --- BUCKETS ---
+
+    def _cerrar_bucket(self) -> None:
+        tiempos, valores = self._tiempos, self._valores
+        self._tiempos, self._valores = [], []
+        inicio = fecha_de(self.desde + self._indice * self.paso)
+
+        if self.metodo == PROMEDIO:
+            self.puntos.append({"fecha": inicio, "valor": sum(valores) / len(valores), "cantidad": len(valores)})
+        elif self.metodo == MINMAX:
+            self.puntos.append({
+                "fecha": inicio, "valor": sum(valores) / len(valores), "minimo": min(valores), "maximo": max(valores),
+                "cantidad": len(valores),
+            })
+        else:
+            self._lttb(tiempos, valores)
+
+    def _lttb(self, tiempos: List[float], valores: List[float]) -> None:
+        if self._elegido is None:
+            # Primer bucket del segmento: su primera muestra va siempre
+            self._emitir(tiempos[0], valores[0])
+            tiempos, valores = tiempos[1:], valores[1:]
+            if not tiempos:
+                return
+        if self._pendiente is not None:
+            # El promedio de este bucket decide el punto del pendiente
+            self._elegir(*self._pendiente, sum(tiempos) / len(tiempos), sum(valores) / len(valores))
+        self._pendiente = (tiempos, valores)
+
+    def _elegir(self, tiempos: List[float], valores: List[float], t_siguiente: float, v_siguiente: float) -> None:
+        t_a, v_a = self._elegido
+        mejor, mejor_area = 0, -1.0
+        for i, (t, v) in enumerate(zip(tiempos, valores)):
+            area = abs((t_a - t_siguiente) * (v - v_a) - (t_a - t) * (v_siguiente - v_a))
+            if area > mejor_area:
+                mejor, mejor_area = i, area
+        self._emitir(tiempos[mejor], valores[mejor])
+
+    def _emitir(self, tiempo: float, valor: float) -> None:
+        self._elegido = (tiempo, valor)
+        self.puntos.append({"fecha": fecha_de(tiempo), "valor": valor})
+
+    def _cerrar_segmento(self) -> None:
+        if self._tiempos:
+            self._cerrar_bucket()
+        if self._pendiente is not None:
+            # Último bucket del segmento: se elige contra su última muestra, que también va siempre
+            tiempos, valores = self._pendiente
+            if len(tiempos) > 1:
+                self._elegir(tiempos[:-1], valores[:-1], tiempos[-1], valores[-1])
+            self._emitir(tiempos[-1], valores[-1])
+        self._pendiente = None
+        self._elegido = None
+        self._indice = None
+
+
+def remuestrear(muestras: Iterable[Tuple[float, float]], desde: float, paso: float, metodo: str = PROMEDIO,
+                brecha: Optional[float] = None, hasta: Optional[float] = None) -> Tuple[List[dict], List[Tuple[float, float]]]:
+    """(puntos, brechas) de las muestras (epoch, valor) ordenadas por tiempo."""
+    return Remuestreador(desde, paso, metodo, brecha, hasta).agregar_todas(muestras).resultado()
@@ -0,0 +1,241 @@
+# backend/respuestas.py
+# Caché de respuestas para los endpoints que consultan los dashboards cada
+# pocos segundos (GET /sectores/, /monitoreo/alertas, /monitoreo/{id}).
+#
+# - Clave: finca + ruta + query string + versión de cada etiqueta de la que
+#   depende. Una escritura no borra claves: incrementa la versión de sus
+#   etiquetas ("sector:3", "flota:7", "reglas:7") y las respuestas viejas
+#   quedan huérfanas hasta que vencen. Así se invalida solo lo afectado (y solo
+#   en su finca), sin conocer todas las combinaciones de parámetros cacheadas.
+# - Las versiones se incrementan después del commit (evento de Session): nadie
+#   puede cachear datos viejos bajo la versión nueva.
+# - ETag sobre el cuerpo: si If-None-Match lo lista (o es "*") se responde 304
+#   sin cuerpo.
+# - Mismo backend que las otras cachés: memoria del proceso o Redis (CACHE_URL).
+# - JSON con orjson: los listados grandes arman dicts desde filas Core o
+#   NamedTuples y los devuelven con json_rapido(), sin pasar por el
+#   response_model (que se deja en el decorador solo para el esquema OpenAPI).
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from .cache import Cache, crear_backend
+from .models_db import LecturaDB, ReglaAlertaDB, SectorDB, SensorDB
+from . import metricas, perfilado
+
+CACHE_RESPUESTAS_TAMANIO = int(os.getenv("CACHE_RESPUESTAS_TAMANIO", "1000"))
+# Segundos que vive una respuesta; 0 desactiva la caché (el ETag/304 sigue funcionando)
+CACHE_RESPUESTAS_TTL = float(os.getenv("CACHE_RESPUESTAS_TTL", "5"))
+
+cache_respuestas = Cache("respuestas", crear_backend("respuestas", CACHE_RESPUESTAS_TAMANIO), CACHE_RESPUESTAS_TTL)
+_no_modificadas = 0
+
+metricas.registrar("cache_respuestas", lambda: {**cache_respuestas.estadisticas(), "no_modificadas": _no_modificadas})
+
+_ETIQUETAS = "respuestas_etiquetas"
+_SENSORES_CON_LECTURAS = "respuestas_sensores_con_lecturas"
+
+
+def etiqueta_sector(sector_id: int) -> str:
+    return f"sector:{sector_id}"
+
+
+def etiqueta_flota(finca_id: Optional[int]) -> str:
+    """Cualquier cambio en cualquier sector de la finca."""
+    return f"flota:{finca_id}"
+
+
+def etiqueta_reglas(finca_id: Optional[int]) -> str:
+    return f"reglas:{finca_id}"
+
+
+# Fechas UTC con "Z", igual que el serializador de Pydantic. Los escalares de
+# numpy (agregados, rollups, series) van como números nativos.
+_OPCIONES_JSON = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _por_defecto(valor):
+    if isinstance(valor, BaseModel):
+        return valor.model_dump(mode="json")
+    return jsonable_encoder(valor)
+
+
+def a_json(datos: Any) -> bytes:
+    """JSON compacto en UTF-8. Dicts, listas, fechas y enums van directo; el resto por jsonable_encoder."""
+    return orjson.dumps(datos, default=_por_defecto, option=_OPCIONES_JSON)
+
+
+class RespuestaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with perfilado.fase("serializacion"):
+            return a_json(content)
+
+
+def json_rapido(datos: Any, headers: dict = None) -> Response:
+    """
+    Respuesta ya serializada: FastAPI no la vuelve a validar contra el response_model.
+    `datos` tiene que tener exactamente la forma (y los tipos) del modelo declarado.
+    """
+    return RespuestaJSON(datos, headers=headers)
+
+
+def _etag(cuerpo: bytes) -> str:
+    return '"' + hashlib.blake2b(cuerpo, digest_size=16).hexdigest() + '"'
+
+
+def _coincide(etag: str, if_none_match: str) -> bool:
+    """If-None-Match es "*" o una lista de ETags separados por comas (comparación débil: W/ no cuenta)."""
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _respuesta(cuerpo: bytes, etag: str, request: Request, origen: str) -> Response:
+    global _no_modificadas
+    headers = {"ETag": etag, "X-Cache": origen}
+    if _coincide(etag, request.headers.get("if-none-match", "")):
+        _no_modificadas += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
+
+
+async def cacheada(request: Request, finca_id: Optional[int], etiquetas: List[str],
+                   generar: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Devuelve la respuesta cacheada para (finca, ruta, parámetros, versiones de `etiquetas`)
+    o la genera con `generar()` y la guarda. Responde 304 si el ETag coincide.
+    """
+    backend = cache_respuestas.backend
+    versiones = ",".join(f"{e}={backend.version(e)}" for e in etiquetas)
+    clave = f"{finca_id}|{request.url.path}?{request.url.query}|{versiones}"
+
+    if CACHE_RESPUESTAS_TTL > 0:
+        guardada = cache_respuestas.obtener(clave)
+        if guardada is not None:
+            return _respuesta(guardada["cuerpo"].encode(), guardada["etag"], request, "HIT")
+
+    datos = await generar()
+    with perfilado.fase("serializacion"):
+        cuerpo = a_json(datos)
+    etag = _etag(cuerpo)
+    if CACHE_RESPUESTAS_TTL > 0:
+        cache_respuestas.guardar(clave, {"cuerpo": cuerpo.decode(), "etag": etag})
+    return _respuesta(cuerpo, etag, request, "MISS")
+
+
+# --- INVALIDACIÓN ---
+
+# Mapa sector -> finca de este proceso. Cuando un sector cambia de finca o se
+# borra se incrementa la versión de _MAPA_FINCAS (compartida con CACHE_URL) y
+# cada proceso vacía su mapa la próxima vez que lo usa.
+_MAPA_FINCAS = "mapa:finca_de_sector"
+_finca_de_sector: Dict[int, Optional[int]] = {}
+_version_mapa = 0
+
+
+def _fincas(ejecutor, sector_ids: set) -> set:
+    """Fincas de los sectores; solo va a la DB por los que no conoce."""
+    global _version_mapa
+    version = cache_respuestas.backend.version(_MAPA_FINCAS)
+    if version != _version_mapa:
+        _finca_de_sector.clear()
+        _version_mapa = version
+    faltan = sector_ids - _finca_de_sector.keys()
+    if faltan:
+        _finca_de_sector.update(ejecutor.execute(select(SectorDB.id, SectorDB.finca_id).where(SectorDB.id.in_(faltan))).all())
+    return {_finca_de_sector.get(sector_id) for sector_id in sector_ids}
+
+
+def invalidar(db: Session, sector_ids: Iterable[int], conexion=None) -> None:
+    """
+    Marca los sectores y la flota de su finca como modificados; se invalidan cuando
+    la sesión hace commit. Desde un evento de mapper, pasar la `conexion` del flush.
+    """
+    ids = {sector_id for sector_id in sector_ids if sector_id is not None}
+    if ids:
+        fincas = _fincas(conexion if conexion is not None else db, ids)
+        db.info.setdefault(_ETIQUETAS, set()).update(
+            {etiqueta_sector(sector_id) for sector_id in ids} | {etiqueta_flota(finca_id) for finca_id in fincas}
+        )
+
+
+def olvidar_fincas() -> None:
+    """Vacía el mapa sector -> finca (tests)."""
+    _finca_de_sector.clear()
+
+
+def _sector_cambiado(sector, borrado: bool) -> None:
+    # La finca sale del objeto (y de su historial), no de la DB: borrado ya no está
+    fincas = {sector.finca_id, _finca_de_sector.pop(sector.id, sector.finca_id)}
+    fincas.update(inspect(sector).attrs.finca_id.history.deleted or ())
+    sesion = object_session(sector)
+    if sesion is not None:
+        etiquetas = {etiqueta_sector(sector.id)} | {etiqueta_flota(finca_id) for finca_id in fincas}
+        if borrado or len(fincas) > 1:
+            # Cambió de finca o dejó de existir: todos los procesos rearman su mapa
+            etiquetas.add(_MAPA_FINCAS)
+        sesion.info.setdefault(_ETIQUETAS, set()).update(etiquetas)
+
+@event.listens_for(SectorDB, "after_insert")
+@event.listens_for(SectorDB, "after_update")
+def _sector_modificado(mapper, connection, sector):
+    _sector_cambiado(sector, borrado=False)
+
+@event.listens_for(SectorDB, "after_delete")
+def _sector_borrado(mapper, connection, sector):
+    _sector_cambiado(sector, borrado=True)
+
+@event.listens_for(SensorDB, "after_insert")
+@event.listens_for(SensorDB, "after_update")
+@event.listens_for(SensorDB, "after_delete")
+def _sensor_modificado(mapper, connection, sensor):
+    sesion = object_session(sensor)
+    if sesion is not None:
+        # Si lo movieron de sector, cambian los dos
+        anteriores = inspect(sensor).attrs.sector_id.history.deleted or ()
+        invalidar(sesion, [sensor.sector_id, *anteriores], connection)
+
+@event.listens_for(LecturaDB, "after_insert")
+def _lectura_insertada(mapper, connection, lectura):
+    # Las lecturas por lote se insertan con Core (sin eventos): ese camino llama a invalidar().
+    # Acá solo se junta el sensor; los sectores se resuelven una vez por flush
+    sesion = object_session(lectura)
+    if sesion is not None:
+        sesion.info.setdefault(_SENSORES_CON_LECTURAS, set()).add(lectura.sensor_id)
+
+@event.listens_for(Session, "after_flush")
+def _sectores_con_lecturas(sesion, contexto):
+    sensores = sesion.info.pop(_SENSORES_CON_LECTURAS, None)
+    if sensores:
+        conexion = sesion.connection()
+        sector_ids = conexion.execute(select(SensorDB.sector_id).where(SensorDB.id.in_(sensores))).scalars()
+        invalidar(sesion, sector_ids, conexion)
+
+@event.listens_for(ReglaAlertaDB, "after_insert")
+@event.listens_for(ReglaAlertaDB, "after_update")
+@event.listens_for(ReglaAlertaDB, "after_delete")
+def _regla_modificada(mapper, connection, regla):
+    sesion = object_session(regla)
+    if sesion is not None:
+        sesion.info.setdefault(_ETIQUETAS, set()).add(etiqueta_reglas(regla.finca_id))
+
+@event.listens_for(Session, "after_commit")
+def _incrementar_versiones(sesion):
+    for etiqueta in sesion.info.pop(_ETIQUETAS, ()):
+        cache_respuestas.backend.incrementar(etiqueta)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(sesion):
+    sesion.info.pop(_ETIQUETAS, None)
+    sesion.info.pop(_SENSORES_CON_LECTURAS, None)
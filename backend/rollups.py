@@ -0,0 +1,257 @@
+# backend/rollups.py
+# Rollups de lecturas por sensor a 1 minuto, 1 hora y 1 día (cantidad/suma/min/max).
+#
+# - Se mantienen de forma incremental en la misma transacción que el INSERT
+#   de las lecturas (ver routers/sensores.py).
+# - Las consultas de ventana (p. ej. "últimas 24h") se descomponen en tramos:
+#   días completos salen de lecturas_1d, horas completas de lecturas_1h,
+#   minutos completos de lecturas_1m y solo los bordes de menos de un minuto
+#   se leen de la tabla cruda. El costo deja de depender de cuántas muestras hay.
+# - Al borrar un sensor sus rollups se borran en el mismo flush. El ON DELETE
+#   CASCADE de la FK no alcanza: SQLite no lo aplica sin PRAGMA foreign_keys.
+#
+# Backfill de datos históricos (con la ingesta detenida):
+#   python -m backend.rollups backfill [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .logic import AgregadoSensor
+from .models_db import LecturaDB, LecturaMinutoDB, LecturaHoraDB, LecturaDiaDB, SensorDB
+from . import series
+
+ROLLUPS_HABILITADOS = os.getenv("ROLLUPS_HABILITADOS", "1") == "1"
+
+# De la resolución más gruesa a la más fina
+RESOLUCIONES = (
+    (LecturaDiaDB, timedelta(days=1)),
+    (LecturaHoraDB, timedelta(hours=1)),
+    (LecturaMinutoDB, timedelta(minutes=1)),
+)
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def a_utc(fecha: datetime) -> datetime:
+    """Las fechas sin zona horaria (SQLite) se interpretan como UTC."""
+    if fecha.tzinfo is None:
+        return fecha.replace(tzinfo=timezone.utc)
+    return fecha.astimezone(timezone.utc)
+
+
+def truncar(fecha: datetime, paso: timedelta) -> datetime:
+    """Comienzo del bucket de tamaño `paso` que contiene a `fecha`."""
+    return _EPOCA + ((a_utc(fecha) - _EPOCA) // paso) * paso
+
+
+def _redondear_arriba(fecha: datetime, paso: timedelta) -> datetime:
+    inicio = truncar(fecha, paso)
+    return inicio if inicio == a_utc(fecha) else inicio + paso
+
+
+# --- ESCRITURA ---
+
+def acumular(db: Session, lecturas: Iterable[Tuple[int, float, datetime]]) -> None:
+    """
+    Suma las lecturas (sensor_id, valor, fecha) a los tres niveles de rollup.
+    No hace commit: va en la misma transacción que el INSERT de las lecturas.
+    """
+    if not ROLLUPS_HABILITADOS:
+        return
+
+    buckets: Dict[type, Dict[Tuple[int, datetime], List[float]]] = {tabla: {} for tabla, _ in RESOLUCIONES}
+    for sensor_id, valor, fecha in lecturas:
+        for tabla, paso in RESOLUCIONES:
+            clave = (sensor_id, truncar(fecha, paso))
+            acumulado = buckets[tabla].get(clave)
+            if acumulado is None:
+                buckets[tabla][clave] = [1, valor, valor, valor]
+            else:
+                acumulado[0] += 1
+                acumulado[1] += valor
+                acumulado[2] = min(acumulado[2], valor)
+                acumulado[3] = max(acumulado[3], valor)
+
+    for tabla, acumulados in buckets.items():
+        # Orden fijo de claves: evita deadlocks entre upserts concurrentes en Postgres
+        filas = [
+            {"sensor_id": sensor_id, "inicio": inicio, "cantidad": c, "suma": s, "minimo": mn, "maximo": mx}
+            for (sensor_id, inicio), (c, s, mn, mx) in sorted(acumulados.items())
+        ]
+        _upsert(db, tabla, filas)
+
+
+def _upsert(db: Session, tabla, filas: List[Dict]) -> None:
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        insertar, menor, mayor = pg_insert, func.least, func.greatest
+    elif dialecto == "sqlite":
+        insertar, menor, mayor = sqlite_insert, func.min, func.max
+    else:
+        raise RuntimeError(f"Rollups no soportados para el dialecto {dialecto}")
+
+    if not filas:
+        return
+    t = tabla.__table__
+    stmt = insertar(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.sensor_id, t.c.inicio],
+        set_={
+            "cantidad": t.c.cantidad + stmt.excluded.cantidad,
+            "suma": t.c.suma + stmt.excluded.suma,
+            "minimo": menor(t.c.minimo, stmt.excluded.minimo),
+            "maximo": mayor(t.c.maximo, stmt.excluded.maximo),
+        }
+    )
+    # executemany: SQLAlchemy arma los VALUES multi-fila por lotes (insertmanyvalues) con el
+    # statement compilado una sola vez; .values(filas) recompilaba miles de parámetros por lote
+    db.execute(stmt, filas)
+
+
+# --- LECTURA ---
+
+def tramos(desde: datetime, hasta: datetime, niveles=RESOLUCIONES) -> List[Tuple[Optional[type], datetime, datetime]]:
+    """
+    Descompone [desde, hasta) en tramos alineados usando siempre el rollup más
+    grueso posible. Un tramo con tabla None se resuelve contra lecturas crudas.
+    """
+    if desde >= hasta:
+        return []
+    if not niveles:
+        return [(None, desde, hasta)]
+
+    (tabla, paso), mas_finos = niveles[0], niveles[1:]
+    inicio, fin = _redondear_arriba(desde, paso), truncar(hasta, paso)
+    if inicio >= fin:
+        return tramos(desde, hasta, mas_finos)
+    return tramos(desde, inicio, mas_finos) + [(tabla, inicio, fin)] + tramos(fin, hasta, mas_finos)
+
+
+def agregados_ventana(db: Session, ids_sensores: Iterable[int], desde: datetime, hasta: datetime = None) -> Dict[int, AgregadoSensor]:
+    """AVG/COUNT/MIN/MAX por sensor en [desde, hasta) en un solo viaje a la DB."""
+    ids = list(ids_sensores)
+    hasta = hasta or datetime.now(timezone.utc)
+    partes = tramos(a_utc(desde), a_utc(hasta))
+    if not ids or not partes:
+        return {}
+
+    selects = []
+    for tabla, inicio, fin in partes:
+        if tabla is None:
+            selects.append(
+                select(
+                    LecturaDB.sensor_id.label("sensor_id"),
+                    func.count(LecturaDB.id).label("cantidad"),
+                    func.sum(LecturaDB.valor).label("suma"),
+                    func.min(LecturaDB.valor).label("minimo"),
+                    func.max(LecturaDB.valor).label("maximo"),
+                )
+                .where(LecturaDB.sensor_id.in_(ids), LecturaDB.fecha >= inicio, LecturaDB.fecha < fin)
+                .group_by(LecturaDB.sensor_id)
+            )
+        else:
+            selects.append(
+                select(
+                    tabla.sensor_id.label("sensor_id"),
+                    func.sum(tabla.cantidad).label("cantidad"),
+                    func.sum(tabla.suma).label("suma"),
+                    func.min(tabla.minimo).label("minimo"),
+                    func.max(tabla.maximo).label("maximo"),
+                )
+                .where(tabla.sensor_id.in_(ids), tabla.inicio >= inicio, tabla.inicio < fin)
+                .group_by(tabla.sensor_id)
+            )
+
+    union = union_all(*selects).subquery()
+    consulta = select(
+        union.c.sensor_id,
+        func.sum(union.c.cantidad),
+        func.sum(union.c.suma),
+        func.min(union.c.minimo),
+        func.max(union.c.maximo),
+    ).group_by(union.c.sensor_id)
+
+    return {
+        sensor_id: AgregadoSensor(suma / cantidad, int(cantidad), minimo, maximo)
+        for sensor_id, cantidad, suma, minimo, maximo in db.execute(consulta)
+        if cantidad
+    }
+
+
+# --- BACKFILL ---
+
+def reconstruir(db: Session, desde: datetime, hasta: datetime) -> int:
+    """
+    Recalcula los rollups de [desde, hasta) desde lecturas crudas, día por día.
+    Borra lo que hubiera en esos días, así que es seguro correrlo más de una vez.
+    Devuelve la cantidad de lecturas procesadas.
+    """
+    paso_dia = timedelta(days=1)
+    dia, hasta = truncar(desde, paso_dia), a_utc(hasta)
+    procesadas = 0
+
+    while dia < hasta:
+        fin = dia + paso_dia
+        for tabla, _ in RESOLUCIONES:
+            db.execute(delete(tabla).where(tabla.inicio >= dia, tabla.inicio < fin))
+
+        # El día entero como series compactas: los buckets se calculan vectorizados, no fila por fila
+        crudas = series.cargar(
+            db, select(LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha).where(LecturaDB.fecha >= dia, LecturaDB.fecha < fin)
+        )
+        for tabla, paso in RESOLUCIONES:
+            filas = []
+            for sensor_id in sorted(crudas):
+                inicios, cantidad, suma, minimo, maximo = crudas[sensor_id].buckets(paso.total_seconds())
+                filas.extend(
+                    {"sensor_id": sensor_id, "inicio": series.fecha_de(i), "cantidad": int(c), "suma": float(s),
+                     "minimo": float(mn), "maximo": float(mx)}
+                    for i, c, s, mn, mx in zip(inicios, cantidad, suma, minimo, maximo)
+                )
+            _upsert(db, tabla, filas)
+        db.commit()
+
+        procesadas += sum(len(serie) for serie in crudas.values())
+        dia = fin
+    return procesadas
+
+
+@event.listens_for(SensorDB, "before_delete")
+def _borrar_rollups_del_sensor(mapper, connection, sensor):
+    # Antes que el sensor: con las FK activas el DELETE del sensor no puede dejar huérfanos
+    for tabla, _ in RESOLUCIONES:
+        connection.execute(delete(tabla).where(tabla.sensor_id == sensor.id))
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de rollups de lecturas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    backfill = sub.add_parser("backfill", help="Recalcula rollups desde las lecturas crudas")
+    backfill.add_argument("--desde", type=datetime.fromisoformat, help="AAAA-MM-DD (default: primera lectura)")
+    backfill.add_argument("--hasta", type=datetime.fromisoformat, help="AAAA-MM-DD (default: mañana)")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        desde = args.desde or db.scalar(select(func.min(LecturaDB.fecha)))
+        if desde is None:
+            print("ℹ️ No hay lecturas para procesar.")
+            return
+        hasta = args.hasta or truncar(datetime.now(timezone.utc), timedelta(days=1)) + timedelta(days=1)
+        print(f"🔄 Reconstruyendo rollups desde {desde} hasta {hasta}...")
+        procesadas = reconstruir(db, desde, hasta)
+        print(f"✅ Se procesaron {procesadas} lecturas.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    _main()
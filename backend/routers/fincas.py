@@ -0,0 +1,55 @@
+# backend/routers/fincas.py
+# Alta de fincas (tenants) y asignación de usuarios: solo administradores.
+# Los sectores y reglas que crea un usuario quedan en su finca.
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from ..database import get_db, ejecutar
+from ..models_db import FincaDB, UserDB
+from ..models import FincaCreate, FincaResponse, UserResponse
+from ..dependencies import get_admin_user
+from ..perfilado import RutaPerfilada
+
+router = APIRouter(
+    prefix="/fincas",
+    tags=["Fincas"],
+    route_class=RutaPerfilada
+)
+
+def _crear_finca(db: Session, finca: FincaCreate) -> FincaResponse:
+    if db.query(FincaDB).filter(FincaDB.nombre == finca.nombre).first():
+        raise HTTPException(status_code=400, detail="Finca ya registrada")
+    nueva_finca = FincaDB(nombre=finca.nombre)
+    db.add(nueva_finca)
+    db.commit()
+    db.refresh(nueva_finca)
+    return FincaResponse.model_validate(nueva_finca)
+
+@router.post("/", response_model=FincaResponse, status_code=status.HTTP_201_CREATED)
+async def crear_finca(finca: FincaCreate, db: Session = Depends(get_db), admin: UserDB = Depends(get_admin_user)):
+    return await ejecutar(db, _crear_finca, finca)
+
+def _listar_fincas(db: Session) -> List[FincaResponse]:
+    return [FincaResponse.model_validate(f) for f in db.query(FincaDB).order_by(FincaDB.id).all()]
+
+@router.get("/", response_model=List[FincaResponse])
+async def listar_fincas(db: Session = Depends(get_db), admin: UserDB = Depends(get_admin_user)):
+    return await ejecutar(db, _listar_fincas)
+
+def _asignar_usuario(db: Session, finca_id: int, username: str) -> UserResponse:
+    if not db.get(FincaDB, finca_id):
+        raise HTTPException(status_code=404, detail="Finca no encontrada")
+    usuario = db.query(UserDB).filter(UserDB.username == username).first()
+    if not usuario:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    # El evento after_update de UserDB lo saca de la caché de usuarios
+    usuario.finca_id = finca_id
+    db.commit()
+    db.refresh(usuario)
+    return UserResponse.model_validate(usuario)
+
+@router.put("/{finca_id}/usuarios/{username}", response_model=UserResponse)
+async def asignar_usuario(finca_id: int, username: str, db: Session = Depends(get_db), admin: UserDB = Depends(get_admin_user)):
+    """Pasa al usuario a la finca: desde su próximo request ve solo los datos de ella."""
+    return await ejecutar(db, _asignar_usuario, finca_id, username)
@@ -0,0 +1,43 @@
+# backend/routers/metricas.py
+# Todo es de administración: los contadores son del proceso y mezclan todas las fincas.
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from ..models_db import UserDB
+from ..dependencies import get_admin_user
+from ..perfilado import RutaPerfilada
+from .. import instrumentacion, metricas, perfilado
+
+router = APIRouter(
+    prefix="/metricas",
+    tags=["Métricas"],
+    route_class=RutaPerfilada
+)
+
+
+@router.get("/")
+async def obtener_metricas(current_user: UserDB = Depends(get_admin_user)):
+    """Contadores internos: cachés, colas, pool de conexiones, etc."""
+    return metricas.recolectar()
+
+
+@router.get("/prometheus", response_class=PlainTextResponse)
+async def obtener_metricas_prometheus(current_user: UserDB = Depends(get_admin_user)):
+    """Acumulados por ruta (consultas, tiempo en DB, filas, objetos ORM) y los contadores internos, para Prometheus."""
+    return PlainTextResponse(instrumentacion.registro.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/perfiles")
+async def obtener_perfiles(
+    ruta: Optional[str] = Query(None, description="Plantilla de la ruta, p. ej. /sectores/"),
+    limite: int = Query(50, ge=1, le=1000),
+    current_user: UserDB = Depends(get_admin_user)
+):
+    """Requests muestreados (PERFIL_MUESTREO): tiempo por fase y, con PERFIL_CPROFILE, funciones más costosas."""
+    return {
+        **perfilado.registro.estadisticas(),
+        "resumen": perfilado.registro.resumen(),
+        "perfiles": perfilado.registro.ultimos(ruta, limite),
+    }
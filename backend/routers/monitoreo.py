@@ -1,26 +1,29 @@
 # backend/routers/monitoreo.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from typing import List, Optional
 
-from ..database import get_db
-from ..models_db import SectorDB, LecturaDB, UserDB
-from ..logic import evaluar_sensor, generar_resumen_estado
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..database import get_db_lectura, ejecutar
+from ..models_db import UserDB
+from ..logic import codigo_tipo
 from ..dependencies import get_current_user
+from ..perfilado import RutaPerfilada
+from .. import estado, eventos, reglas, respuestas
 
 router = APIRouter(
     prefix="/monitoreo",
-    tags=["Monitoreo"]
+    tags=["Monitoreo"],
+    route_class=RutaPerfilada
 )
 
 
-@router.get("/alertas")
-def obtener_alertas_globales( 
-    db: Session = Depends(get_db),
-    current_user: UserDB = Depends(get_current_user)
-):
-    sectores = db.query(SectorDB).options(joinedload(SectorDB.sensores)).all()
+def _obtener_alertas_globales(db: Session, finca_id: Optional[int]) -> dict:
+    # En memoria (ESTADO_EN_MEMORIA) o desde la DB: la evaluación es la misma.
+    # Solo la finca del usuario: "globales" es toda su flota, no la de otras fincas
+    sectores = estado.sectores(db, finca_id)
     
     ids_sensores = []
     for sector in sectores:
@@ -30,90 +33,96 @@ def obtener_alertas_globales(
     if not ids_sensores:
         return {"total_alertas": 0, "detalles": []}
 
-    limite_tiempo = datetime.now(timezone.utc) - timedelta(hours=24)
-    lecturas_bulk = db.query(LecturaDB).filter(
-        LecturaDB.sensor_id.in_(ids_sensores),
-        LecturaDB.fecha >= limite_tiempo
-    ).all()
-    
-    ultima_lectura_por_sensor = {}
-    for lectura in lecturas_bulk:
-        sensor_id = lectura.sensor_id
-        if sensor_id not in ultima_lectura_por_sensor:
-            ultima_lectura_por_sensor[sensor_id] = lectura
-        else:
-            if lectura.fecha > ultima_lectura_por_sensor[sensor_id].fecha:
-                ultima_lectura_por_sensor[sensor_id] = lectura
+    limite_tiempo = estado.inicio_ventana()
+    # Solo la última lectura de cada sensor (una fila por sensor)
+    ultima_lectura_por_sensor = estado.ultimas_lecturas(db, ids_sensores, desde=limite_tiempo)
 
-    alertas = []
+    # Columnas para evaluar toda la flota en una sola pasada
+    evaluados, filas = [], []
     for sector in sectores:
         for sensor in sector.sensores:
             lectura = ultima_lectura_por_sensor.get(sensor.id)
-            
             if lectura:
-                tipo_alerta = evaluar_sensor(
-                    sensor.tipo, 
-                    lectura.valor, 
-                    sector.humedad_minima, 
-                    sector.temp_maxima
-                )
-                
-                if tipo_alerta:
-                    unidad = "%" if "Humedad" in sensor.tipo else "°C"
-                    alertas.append({
-                        "ubicacion": f"{sector.nombre}",
-                        "sensor": sensor.nombre,
-                        "tipo_alerta": tipo_alerta, 
-                        "valor_actual": f"{lectura.valor}{unidad}",
-                        "mensaje": f"⚠️ {tipo_alerta}: {sensor.nombre} marca {lectura.valor}{unidad}."
-                    })
+                evaluados.append((sector, sensor, lectura))
+                filas.append((sector.id, codigo_tipo(sensor.tipo), lectura.valor, sensor.id, lectura.fecha))
+
+    alertas = []
+    if filas:
+        motor = reglas.obtener_motor(db, finca_id)
+        codigos = motor.evaluar(*zip(*filas))
+        for indice in np.flatnonzero(codigos):
+            sector, sensor, lectura = evaluados[indice]
+            regla = motor.regla(codigos[indice])
+            tipo_alerta, unidad = regla.alerta, regla.unidad
+            alertas.append({
+                "ubicacion": f"{sector.nombre}",
+                "sensor": sensor.nombre,
+                "tipo_alerta": tipo_alerta, 
+                "severidad": regla.severidad,
+                "valor_actual": f"{lectura.valor}{unidad}",
+                "mensaje": f"⚠️ {tipo_alerta}: {sensor.nombre} marca {lectura.valor}{unidad}."
+            })
     
     return {"total_alertas": len(alertas), "detalles": alertas}
 
-@router.get("/{sector_id}")
-def monitorear_sector(sector_id: int, db: Session = Depends(get_db)):
-    sector = db.query(SectorDB).filter(SectorDB.id == sector_id).first()
+@router.get("/alertas")
+async def obtener_alertas_globales( 
+    request: Request,
+    db: Session = Depends(get_db_lectura),
+    current_user: UserDB = Depends(get_current_user)
+):
+    finca_id = current_user.finca_id
+    return await respuestas.cacheada(
+        request, finca_id, [respuestas.etiqueta_flota(finca_id), respuestas.etiqueta_reglas(finca_id)],
+        lambda: ejecutar(db, _obtener_alertas_globales, finca_id)
+    )
+
+@router.get("/alertas/stream")
+async def suscribirse_a_alertas(
+    request: Request,
+    sector_id: Optional[List[int]] = Query(None, description="Solo estos sectores (se puede repetir)"),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Server-Sent Events con cada transición de alerta (activa / resuelta) a medida
+    que llegan lecturas. Para el estado inicial, consultar GET /monitoreo/alertas.
+    Solo llegan eventos de la finca del usuario.
+    """
+    suscripcion = eventos.central.suscribir(sector_id, finca_id=current_user.finca_id)
+    return StreamingResponse(
+        eventos.flujo_sse(request, suscripcion),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _monitorear_sector(db: Session, sector_id: int, finca_id: Optional[int]) -> dict:
+    sector = estado.sector(db, sector_id, finca_id)
     if not sector:
         raise HTTPException(status_code=404, detail="Sector no encontrado")
     
     ids_sensores = [s.id for s in sector.sensores]
     
-    limite_tiempo = datetime.now(timezone.utc) - timedelta(hours=24)
-    lecturas_bulk = db.query(LecturaDB).filter(
-        LecturaDB.sensor_id.in_(ids_sensores),
-        LecturaDB.fecha >= limite_tiempo
-    ).all()
-    
-    lecturas_por_sensor = defaultdict(list)
-    for lectura in lecturas_bulk:
-        lecturas_por_sensor[lectura.sensor_id].append(lectura.valor)
+    agregados = estado.agregados(db, ids_sensores, desde=estado.inicio_ventana())
 
-    alertas_agrupadas = {}
-    
-    for sensor in sector.sensores:
-        valores = lecturas_por_sensor[sensor.id]
-        if not valores: 
-            continue
-            
-        promedio = sum(valores) / len(valores)
-        
-        tipo_alerta = evaluar_sensor(
-            sensor.tipo, 
-            promedio, 
-            sector.humedad_minima, 
-            sector.temp_maxima
-        )
-        
-        if tipo_alerta:
-            if tipo_alerta not in alertas_agrupadas:
-                alertas_agrupadas[tipo_alerta] = []
-            alertas_agrupadas[tipo_alerta].append(promedio)
-
-    estado_final = generar_resumen_estado(alertas_agrupadas)
+    estado_final = reglas.obtener_motor(db, finca_id).estados_sectores([sector], agregados)[sector.id]
     
     return {
         "sector": sector.nombre,
         "estado": estado_final,    
         "sensores_activos": len(sector.sensores),
-        "total_lecturas_24h": len(lecturas_bulk)
-    }
\ No newline at end of file
+        "total_lecturas_24h": sum(a.cantidad for a in agregados.values())
+    }
+
+@router.get("/{sector_id}")
+async def monitorear_sector(
+    sector_id: int,
+    request: Request,
+    db: Session = Depends(get_db_lectura),
+    current_user: UserDB = Depends(get_current_user)
+):
+    # La finca va en la clave: un sector ajeno nunca sale de la caché (da 404 al generarlo)
+    finca_id = current_user.finca_id
+    return await respuestas.cacheada(
+        request, finca_id, [respuestas.etiqueta_sector(sector_id), respuestas.etiqueta_reglas(finca_id)],
+        lambda: ejecutar(db, _monitorear_sector, sector_id, finca_id)
+    )
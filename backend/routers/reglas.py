@@ -0,0 +1,58 @@
+# backend/routers/reglas.py
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ..database import get_db, ejecutar
+from ..models_db import ReglaAlertaDB, SectorDB, UserDB
+from ..models import ReglaAlertaCreate, ReglaAlertaResponse
+from ..dependencies import get_current_user
+from ..perfilado import RutaPerfilada
+from .. import crud
+
+router = APIRouter(
+    prefix="/reglas",
+    tags=["Reglas de alerta"],
+    route_class=RutaPerfilada
+)
+# Cualquier alta/baja invalida el motor compilado de su finca (ver reglas.py):
+# la próxima evaluación lo recompila una sola vez. Las reglas globales y por
+# cultivo valen solo dentro de la finca del usuario que las crea.
+
+def _crear_regla(db: Session, regla: ReglaAlertaCreate, finca_id: Optional[int]) -> ReglaAlertaResponse:
+    if regla.sector_id is not None and regla.cultivo:
+        raise HTTPException(status_code=400, detail="Una regla es de un sector o de un cultivo, no de ambos")
+    if regla.sector_id is not None:
+        sector = db.get(SectorDB, regla.sector_id)
+        if not sector or sector.finca_id != finca_id:
+            raise HTTPException(status_code=404, detail="Sector no encontrado")
+
+    nueva_regla = ReglaAlertaDB(**regla.model_dump(mode="json"), finca_id=finca_id)
+    db.add(nueva_regla)
+    db.commit()
+    db.refresh(nueva_regla)
+    return ReglaAlertaResponse.model_validate(nueva_regla)
+
+@router.post("/", response_model=ReglaAlertaResponse, status_code=status.HTTP_201_CREATED)
+async def crear_regla(regla: ReglaAlertaCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _crear_regla, regla, current_user.finca_id)
+
+def _listar_reglas(db: Session, finca_id: Optional[int]) -> List[ReglaAlertaResponse]:
+    reglas = db.query(ReglaAlertaDB).filter(crud.de_la_finca(ReglaAlertaDB.finca_id, finca_id)).order_by(ReglaAlertaDB.id).all()
+    return [ReglaAlertaResponse.model_validate(regla) for regla in reglas]
+
+@router.get("/", response_model=List[ReglaAlertaResponse])
+async def listar_reglas(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _listar_reglas, current_user.finca_id)
+
+def _eliminar_regla(db: Session, regla_id: int, finca_id: Optional[int]) -> None:
+    regla = db.get(ReglaAlertaDB, regla_id)
+    if not regla or regla.finca_id != finca_id:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    db.delete(regla)
+    db.commit()
+
+@router.delete("/{regla_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def eliminar_regla(regla_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    await ejecutar(db, _eliminar_regla, regla_id, current_user.finca_id)
+    return None
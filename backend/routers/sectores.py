@@ -1,83 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import Dict, List
-from collections import defaultdict
-from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
 
 # Importamos desde los módulos padres (..)
-from ..database import get_db
-from ..models_db import SectorDB, LecturaDB, UserDB
+from ..database import get_db, get_db_lectura, ejecutar
+from ..models_db import SectorDB, UserDB
 from ..models import SectorCreate, SectorUpdate, SectorResponse, SectorListResponse
-from ..logic import evaluar_sensor, generar_resumen_estado
 from ..dependencies import get_current_user
+from ..perfilado import RutaPerfilada
+from .. import crud, estado, reglas, respuestas
 
 # Creamos el Router
 router = APIRouter(
     prefix="/sectores",    
-    tags=["Sectores"]     
+    tags=["Sectores"],
+    route_class=RutaPerfilada
 )
+# Los handlers son async y delegan el acceso a datos en funciones sync que
+# corren con database.ejecutar (threadpool o AsyncSession.run_sync según el modo).
+# Esas funciones devuelven los modelos de respuesta ya armados.
+# Cada usuario ve y modifica solo los sectores de su finca: los de otra dan 404.
+
+def _sector_de_la_finca(db: Session, sector_id: int, finca_id: Optional[int], detalle: str = "Sector no encontrado") -> SectorDB:
+    sector = db.query(SectorDB).filter(SectorDB.id == sector_id, crud.de_la_finca(SectorDB.finca_id, finca_id)).first()
+    if not sector:
+        raise HTTPException(status_code=404, detail=detalle)
+    return sector
+
 # --- RUTAS DE SECTORES ---
 
-@router.post("/", response_model=SectorResponse, status_code=status.HTTP_201_CREATED)
-def crear_sector(sector: SectorCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    nuevo_sector = SectorDB(**sector.model_dump())
+def _crear_sector(db: Session, sector: SectorCreate, finca_id: Optional[int]) -> SectorResponse:
+    nuevo_sector = SectorDB(**sector.model_dump(), finca_id=finca_id)
     db.add(nuevo_sector)
     db.commit()
     db.refresh(nuevo_sector)
-    return nuevo_sector
+    return SectorResponse.model_validate(nuevo_sector)
 
-@router.get("/", response_model=List[SectorListResponse])
-def listar_sectores(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sectores = db.query(SectorDB).options(joinedload(SectorDB.sensores)).all()
+@router.post("/", response_model=SectorResponse, status_code=status.HTTP_201_CREATED)
+async def crear_sector(sector: SectorCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _crear_sector, sector, current_user.finca_id)
+
+def _listar_sectores(db: Session, finca_id: Optional[int]) -> List[dict]:
+    # En memoria (ESTADO_EN_MEMORIA) o desde la DB: la evaluación es la misma
+    sectores = estado.sectores(db, finca_id)
     
     ids_sensores = [s.id for sector in sectores for s in sector.sensores]
     
-    if not ids_sensores:
-        return sectores
-
-    limite_tiempo = datetime.now(timezone.utc) - timedelta(hours=24)
-    lecturas_bulk = db.query(LecturaDB).filter(
-        LecturaDB.sensor_id.in_(ids_sensores),
-        LecturaDB.fecha >= limite_tiempo
-    ).all()
-    
-    lecturas_por_sensor = defaultdict(list)
-    for lectura in lecturas_bulk:
-        lecturas_por_sensor[lectura.sensor_id].append(lectura.valor)
-    
-    for sector in sectores:
-        alertas_agrupadas: Dict[str, List[float]] = {}
-        
-        for sensor in sector.sensores:
-            valores = lecturas_por_sensor[sensor.id]
-            if not valores:
-                continue
-            
-            promedio = sum(valores) / len(valores)
-            
-            tipo_alerta = evaluar_sensor(
-                sensor.tipo, 
-                promedio, 
-                sector.humedad_minima, 
-                sector.temp_maxima
-            )
-            
-            if tipo_alerta:
-                if tipo_alerta not in alertas_agrupadas:
-                    alertas_agrupadas[tipo_alerta] = []
-                alertas_agrupadas[tipo_alerta].append(promedio)
-
-        
-        sector.estado = generar_resumen_estado(alertas_agrupadas)
+    agregados = {}
+    if ids_sensores:
+        # Una fila por sensor (AVG/COUNT/MIN/MAX) en vez de todas las lecturas del día
+        agregados = estado.agregados(db, ids_sensores, desde=estado.inicio_ventana())
                 
-    return sectores
+    estados = reglas.obtener_motor(db, finca_id).estados_sectores(sectores, agregados)
+    # Dicts con la forma de SectorListResponse armados desde las NamedTuples de
+    # estado: validarlos con Pydantic para después volver a serializarlos era
+    # la mitad del costo del listado
+    return [
+        {
+            "id": sector.id,
+            "nombre": sector.nombre,
+            "descripcion": sector.descripcion,
+            "humedad_minima": float(sector.humedad_minima),
+            "cultivo": sector.cultivo,
+            "estado": estados[sector.id],
+            "sensores": [
+                {"marca": s.marca, "modelo": s.modelo, "sector_id": s.sector_id, "nombre": s.nombre, "tipo": s.tipo, "id": s.id}
+                for s in sector.sensores
+            ],
+        }
+        for sector in sectores
+    ]
 
+@router.get("/", response_model=List[SectorListResponse])
+async def listar_sectores(request: Request, db: Session = Depends(get_db_lectura), current_user: UserDB = Depends(get_current_user)):
+    finca_id = current_user.finca_id
+    return await respuestas.cacheada(
+        request, finca_id, [respuestas.etiqueta_flota(finca_id), respuestas.etiqueta_reglas(finca_id)],
+        lambda: ejecutar(db, _listar_sectores, finca_id)
+    )
 
-@router.patch("/{sector_id}", response_model=SectorResponse)
-def actualizar_parcial_sector(sector_id: int, datos: SectorUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sector_db = db.query(SectorDB).filter(SectorDB.id == sector_id).first()
-    if not sector_db:
-        raise HTTPException(status_code=404, detail="Sector no encontrado")
+def _actualizar_parcial_sector(db: Session, sector_id: int, datos: SectorUpdate, finca_id: Optional[int]) -> SectorResponse:
+    sector_db = _sector_de_la_finca(db, sector_id, finca_id)
     
     datos_dict = datos.model_dump(exclude_unset=True)
     for key, value in datos_dict.items():
@@ -85,26 +88,27 @@ def actualizar_parcial_sector(sector_id: int, datos: SectorUpdate, db: Session =
     
     db.commit()
     db.refresh(sector_db)
-    return sector_db
+    return SectorResponse.model_validate(sector_db)
 
-@router.delete("/{sector_id}", status_code=status.HTTP_204_NO_CONTENT)
-def eliminar_sector(sector_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sector = db.query(SectorDB).filter(SectorDB.id == sector_id).first()
-    if not sector:
-        raise HTTPException(status_code=404, detail="Sector no encontrado")
+@router.patch("/{sector_id}", response_model=SectorResponse)
+async def actualizar_parcial_sector(sector_id: int, datos: SectorUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _actualizar_parcial_sector, sector_id, datos, current_user.finca_id)
+
+def _eliminar_sector(db: Session, sector_id: int, finca_id: Optional[int]) -> None:
+    sector = _sector_de_la_finca(db, sector_id, finca_id)
     db.delete(sector)
     db.commit()
+
+@router.delete("/{sector_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def eliminar_sector(sector_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    await ejecutar(db, _eliminar_sector, sector_id, current_user.finca_id)
     return None
 
-@router.put("/{sector_id}", response_model=SectorResponse)
-def reemplazar_sector_completo(sector_id: int, datos: SectorCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+def _reemplazar_sector_completo(db: Session, sector_id: int, datos: SectorCreate, finca_id: Optional[int]) -> SectorResponse:
     if datos.id != sector_id:
         raise HTTPException(status_code=400, detail="El ID del cuerpo no coincide con el de la URL")
 
-    sector_db = db.query(SectorDB).filter(SectorDB.id == sector_id).first()
-    
-    if not sector_db:
-        raise HTTPException(status_code=404, detail="El sector no existe, no se puede reemplazar.")
+    sector_db = _sector_de_la_finca(db, sector_id, finca_id, "El sector no existe, no se puede reemplazar.")
 
     datos_dict = datos.model_dump()
 
@@ -114,4 +118,8 @@ def reemplazar_sector_completo(sector_id: int, datos: SectorCreate, db: Session
     db.commit()
     db.refresh(sector_db)
     
-    return sector_db
+    return SectorResponse.model_validate(sector_db)
+
+@router.put("/{sector_id}", response_model=SectorResponse)
+async def reemplazar_sector_completo(sector_id: int, datos: SectorCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _reemplazar_sector_completo, sector_id, datos, current_user.finca_id)
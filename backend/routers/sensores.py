@@ -1,45 +1,157 @@
 # backend/routers/sensores.py
-from fastapi import APIRouter, Depends, HTTPException, status
+import base64
+import binascii
+import csv
+import io
+import itertools
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from ..database import get_db
+from ..database import get_db, get_db_lectura, ejecutar
 from ..models_db import SensorDB, LecturaDB, SectorDB, UserDB
-from ..models import SensorCreate, SensorUpdate, SensorResponse, LecturaCreate, LecturaResponse
+from ..models import (
+    SensorCreate, SensorUpdate, SensorResponse, SensorListado, IncludeSensores, LecturaCreate, LecturaResponse,
+    LecturaLoteItem, LecturaLoteResultado, LecturaLoteResponse, LecturaEncolada, FormatoHistorial,
+    MetodoRemuestreo, SerieResponse,
+)
 from ..dependencies import get_current_user
+from ..perfilado import RutaPerfilada
+from .. import archivo, crud, estado, eventos, ingesta, remuestreo, respuestas, rollups, series
+
 router = APIRouter(
-    tags=["Sensores"]
+    tags=["Sensores"],
+    route_class=RutaPerfilada
 )
 
+# Tope de lecturas por lote: protege a la DB y al worker de payloads gigantes
+MAX_LECTURAS_POR_LOTE = int(os.getenv("MAX_LECTURAS_POR_LOTE", "5000"))
+# Tope de filas por página del historial
+MAX_LECTURAS_POR_PAGINA = int(os.getenv("MAX_LECTURAS_POR_PAGINA", "10000"))
+FILAS_POR_BLOQUE_EXPORTACION = 1000
+# Tope de buckets de GET /sensores/{id}/serie
+MAX_PUNTOS_SERIE = int(os.getenv("MAX_PUNTOS_SERIE", "5000"))
+
+# Un sensor es de la finca de su sector: los de otra finca dan 404 (o se
+# rechazan en la ingesta), igual que si no existieran.
+
+def _sensor_de_la_finca(db: Session, sensor_id: int, finca_id: Optional[int], detalle: str = "Sensor no encontrado") -> SensorDB:
+    sensor = (
+        db.query(SensorDB).outerjoin(SensorDB.sector)
+        .filter(SensorDB.id == sensor_id, crud.de_la_finca(SectorDB.finca_id, finca_id)).first()
+    )
+    if not sensor:
+        raise HTTPException(status_code=404, detail=detalle)
+    return sensor
+
+def _verificar_sector(db: Session, sector_id: int, finca_id: Optional[int]) -> None:
+    sector = db.get(SectorDB, sector_id)
+    if not sector or sector.finca_id != finca_id:
+        raise HTTPException(status_code=404, detail="Sector no encontrado")
+
 # --- RUTAS DE SENSORES ---
 
-@router.post("/sensores/", response_model=SensorResponse)
-def crear_sensor(sensor: SensorCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+def _crear_sensor(db: Session, sensor: SensorCreate, finca_id: Optional[int]) -> SensorResponse:
+    _verificar_sector(db, sensor.sector_id, finca_id)
     nuevo_sensor = SensorDB(**sensor.model_dump()) 
     db.add(nuevo_sensor)
     db.commit()
     db.refresh(nuevo_sensor)
-    return nuevo_sensor
+    # Un sensor recién creado no tiene historial: no hace falta ir a buscarlo
+    return SensorResponse(
+        id=nuevo_sensor.id,
+        nombre=nuevo_sensor.nombre,
+        tipo=nuevo_sensor.tipo,
+        sector_id=nuevo_sensor.sector_id,
+        lecturas=[]
+    )
+
+@router.post("/sensores/", response_model=SensorResponse)
+async def crear_sensor(sensor: SensorCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _crear_sensor, sensor, current_user.finca_id)
+
+def _lectura(fila) -> dict:
+    """Una fila con la forma de LecturaResponse (para json_rapido)."""
+    return {"id": fila.id, "valor": float(fila.valor), "fecha": fila.fecha, "sensor_id": fila.sensor_id}
+
+def _lecturas(filas) -> List[dict]:
+    """
+    Filas (id, valor, fecha, sensor_id) de crud o FilaArchivada con la forma de LecturaResponse.
+    Desempaquetar es ~6x más rápido que leer los atributos de cada Row.
+    """
+    return [{"id": i, "valor": float(v), "fecha": f, "sensor_id": s} for i, v, f, s in filas]
+
+def _listar_sensores(db: Session, include: Optional[IncludeSensores], limite_lecturas: int, finca_id: Optional[int]) -> List[dict]:
+    sensores = db.execute(
+        select(SensorDB.id, SensorDB.nombre, SensorDB.tipo, SensorDB.sector_id)
+        .outerjoin(SensorDB.sector)
+        .where(crud.de_la_finca(SectorDB.finca_id, finca_id))
+        .order_by(SensorDB.id)
+    ).all()
+    ids_sensores = [s.id for s in sensores]
+
+    limite_tiempo = datetime.now(timezone.utc) - timedelta(hours=24)
+    # La ventana acota el recorrido; solo los sensores sin lecturas en 24h
+    # buscan su última lectura en todo el historial
+    ultimas = crud.ultimas_lecturas(db, ids_sensores, desde=limite_tiempo)
+    sin_recientes = [i for i in ids_sensores if i not in ultimas]
+    if sin_recientes:
+        ultimas.update(crud.ultimas_lecturas(db, sin_recientes))
+    agregados = crud.agregados_por_sensor(db, ids_sensores, desde=limite_tiempo)
+    recientes = crud.lecturas_recientes(db, ids_sensores, limite_lecturas) if include == IncludeSensores.LECTURAS else None
+
+    # Dicts con la forma de SensorListado: sin validar cada lectura embebida
+    resultado = []
+    for sensor in sensores:
+        agregado = agregados.get(sensor.id)
+        ultima = ultimas.get(sensor.id)
+        resultado.append({
+            "id": sensor.id,
+            "nombre": sensor.nombre,
+            "tipo": sensor.tipo,
+            "sector_id": sensor.sector_id,
+            "ultima_lectura": _lectura(ultima) if ultima is not None else None,
+            "lecturas_24h": agregado.cantidad if agregado else 0,
+            "lecturas": _lecturas(recientes.get(sensor.id, ())) if recientes is not None else None,
+        })
+    return resultado
 
-@router.get("/sensores/", response_model=List[SensorResponse])
-def listar_sensores(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    return db.query(SensorDB).all()
+@router.get("/sensores/", response_model=List[SensorListado])
+async def listar_sensores(
+    include: Optional[IncludeSensores] = Query(None, description="'lecturas' embebe las últimas lecturas de cada sensor"),
+    limite_lecturas: int = Query(100, ge=1, le=MAX_LECTURAS_POR_PAGINA),
+    db: Session = Depends(get_db),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Listado liviano: metadata + última lectura + cantidad de lecturas en 24h.
+    La cantidad de consultas no depende de cuántos sensores haya.
+    """
+    return respuestas.json_rapido(await ejecutar(db, _listar_sensores, include, limite_lecturas, current_user.finca_id))
+
+def _obtener_sensor(db: Session, sensor_id: int, finca_id: Optional[int]) -> SensorResponse:
+    return SensorResponse.model_validate(_sensor_de_la_finca(db, sensor_id, finca_id))
 
 @router.get("/sensores/{sensor_id}", response_model=SensorResponse)
-def obtener_sensor(sensor_id: int, db: Session = Depends(get_db)):
-    sensor = db.query(SensorDB).filter(SensorDB.id == sensor_id).first()
-    if not sensor:
-        raise HTTPException(status_code=404, detail="Sensor no encontrado")
-    return sensor
+async def obtener_sensor(sensor_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _obtener_sensor, sensor_id, current_user.finca_id)
 
-@router.patch("/sensores/{sensor_id}", response_model=SensorResponse)
-def actualizar_parcial_sensor(sensor_id: int, datos: SensorUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sensor_db = db.query(SensorDB).filter(SensorDB.id == sensor_id).first()
-    if not sensor_db:
-        raise HTTPException(status_code=404, detail="Sensor no encontrado")
+def _actualizar_parcial_sensor(db: Session, sensor_id: int, datos: SensorUpdate, finca_id: Optional[int]) -> SensorResponse:
+    sensor_db = _sensor_de_la_finca(db, sensor_id, finca_id)
 
     if datos.sector_id is not None:
-        sector_existe = db.query(SectorDB).filter(SectorDB.id == datos.sector_id).first()
+        # Solo se puede mover a otro sector de la misma finca
+        sector_existe = (
+            db.query(SectorDB).filter(SectorDB.id == datos.sector_id, crud.de_la_finca(SectorDB.finca_id, finca_id)).first()
+        )
         if not sector_existe:
             raise HTTPException(status_code=404, detail="El nuevo sector_id no existe")
 
@@ -49,42 +161,270 @@ def actualizar_parcial_sensor(sensor_id: int, datos: SensorUpdate, db: Session =
 
     db.commit()
     db.refresh(sensor_db)
-    return sensor_db
+    return SensorResponse.model_validate(sensor_db)
 
-@router.delete("/sensores/{sensor_id}")
-def eliminar_sensor(sensor_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sensor = db.query(SensorDB).filter(SensorDB.id == sensor_id).first()
-    if not sensor:
-        raise HTTPException(status_code=404, detail="Sensor no encontrado")
+@router.patch("/sensores/{sensor_id}", response_model=SensorResponse)
+async def actualizar_parcial_sensor(sensor_id: int, datos: SensorUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _actualizar_parcial_sensor, sensor_id, datos, current_user.finca_id)
+
+def _eliminar_sensor(db: Session, sensor_id: int, finca_id: Optional[int]) -> dict:
+    sensor = _sensor_de_la_finca(db, sensor_id, finca_id)
     db.delete(sensor)
     db.commit()
     return {"detail": f"Sensor {sensor_id} eliminado"}
 
+@router.delete("/sensores/{sensor_id}")
+async def eliminar_sensor(sensor_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    return await ejecutar(db, _eliminar_sensor, sensor_id, current_user.finca_id)
+
 @router.get("/sensores/{sensor_id}/lecturas", response_model=List[LecturaResponse])
-def obtener_historial_sensor(sensor_id: int, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    lecturas = db.query(LecturaDB).filter(LecturaDB.sensor_id == sensor_id).all()
-    return lecturas
+async def obtener_historial_sensor(
+    sensor_id: int,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(1000, ge=1, le=MAX_LECTURAS_POR_PAGINA),
+    cada: Optional[int] = Query(None, ge=2, description="Submuestreo en la DB: 1 de cada N lecturas"),
+    formato: FormatoHistorial = FormatoHistorial.JSON,
+    db: Session = Depends(get_db_lectura),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Historial ordenado por (fecha, id) con paginación por cursor.
+    El cursor de la página siguiente viaja en el header X-Siguiente-Cursor.
+    Con formato ndjson/csv se exporta el rango completo en streaming (sin `limite`).
+    Con ARCHIVO_DIRECTORIO, lo anterior a la frontera sale de los archivos Parquet.
+    """
+    despues_de = _decodificar_cursor(cursor) if cursor else None
+    finca_id = current_user.finca_id
+    # La tabla caliente solo responde desde la frontera del archivo frío. El EXISTS
+    # la deja vacía si el sensor es de otra finca (igual que uno inexistente)
+    consulta = (
+        crud.consulta_historial(sensor_id, archivo.inicio_caliente(desde), hasta, despues_de, cada)
+        .where(crud.sensor_en_finca(sensor_id, finca_id))
+    )
+    frias = iter(())
+    if archivo.ARCHIVO_DIRECTORIO and await ejecutar(db, _sensor_visible, sensor_id, finca_id):
+        frias = archivo.leer(sensor_id, desde, hasta, despues_de, cada)
+
+    if formato != FormatoHistorial.JSON:
+        return _exportar_historial(db, consulta, formato, frias)
+
+    # Pedimos una de más para saber si hay página siguiente
+    lecturas = await run_in_threadpool(lambda: list(itertools.islice(itertools.chain.from_iterable(frias), limite + 1)))
+    if len(lecturas) <= limite:
+        faltan = limite + 1 - len(lecturas)
+        lecturas += await ejecutar(db, lambda sesion: sesion.execute(consulta.limit(faltan)).all())
+    headers = {}
+    if len(lecturas) > limite:
+        lecturas = lecturas[:limite]
+        headers["X-Siguiente-Cursor"] = _codificar_cursor(lecturas[-1])
+    return respuestas.json_rapido(_lecturas(lecturas), headers=headers)
+
+def _sensor_visible(db: Session, sensor_id: int, finca_id: Optional[int]) -> bool:
+    return db.scalar(select(crud.sensor_en_finca(sensor_id, finca_id)))
+
+def _codificar_cursor(fila) -> str:
+    return base64.urlsafe_b64encode(f"{fila.fecha.isoformat()}|{fila.id}".encode()).decode()
+
+def _decodificar_cursor(cursor: str):
+    try:
+        fecha, id_lectura = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(fecha), int(id_lectura)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def _bloque_ndjson(bloque) -> str:
+    return "".join(
+        json.dumps({"id": f.id, "valor": f.valor, "fecha": f.fecha.isoformat(), "sensor_id": f.sensor_id}) + "\n"
+        for f in bloque
+    )
+
+def _bloque_csv(bloque) -> str:
+    salida = io.StringIO()
+    csv.writer(salida, lineterminator="\n").writerows(
+        (f.id, f.valor, f.fecha.isoformat(), f.sensor_id) for f in bloque
+    )
+    return salida.getvalue()
+
+def _exportar_historial(db: Session, consulta, formato: FormatoHistorial, frias=None) -> StreamingResponse:
+    """
+    Exporta en bloques de yield_per filas: la memoria no crece con el tamaño del rango.
+    `frias`: bloques del archivo frío que van antes que las filas de la DB.
+    """
+    consulta = consulta.execution_options(yield_per=FILAS_POR_BLOQUE_EXPORTACION)
+    frias = iter(frias or ())
+    if formato == FormatoHistorial.CSV:
+        encabezado, formatear, media_type = "id,valor,fecha,sensor_id\n", _bloque_csv, "text/csv"
+    else:
+        encabezado, formatear, media_type = "", _bloque_ndjson, "application/x-ndjson"
+
+    if isinstance(db, AsyncSession):
+        async def generar():
+            yield encabezado
+            while (bloque := await run_in_threadpool(next, frias, None)) is not None:
+                yield formatear(bloque)
+            resultado = await db.stream(consulta)
+            async for bloque in resultado.partitions():
+                yield formatear(bloque)
+    else:
+        # Generador sync: Starlette lo itera en el threadpool, no bloquea el event loop
+        def generar():
+            yield encabezado
+            for bloque in frias:
+                yield formatear(bloque)
+            for bloque in db.execute(consulta).partitions():
+                yield formatear(bloque)
+
+    return StreamingResponse(generar(), media_type=media_type)
+
+@router.get("/sensores/{sensor_id}/serie", response_model=SerieResponse)
+async def obtener_serie_sensor(
+    sensor_id: int,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    puntos: int = Query(500, ge=2, le=MAX_PUNTOS_SERIE, description="Cantidad de buckets (si no se pasa `paso`)"),
+    paso: Optional[float] = Query(None, gt=0, description="Ancho de bucket en segundos"),
+    metodo: MetodoRemuestreo = MetodoRemuestreo.PROMEDIO,
+    brecha: Optional[float] = Query(None, gt=0, description="Segundos sin lecturas que cuentan como silencio"),
+    db: Session = Depends(get_db_lectura),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Serie remuestreada para gráficos (por defecto las últimas 24 h) en una sola pasada.
+    promedio: media por bucket. minmax: envolvente. lttb: muestras reales que conservan la forma.
+    Los silencios del sensor se listan en `brechas` y cortan la línea con un punto de valor null.
+    """
+    hasta = rollups.a_utc(hasta) if hasta else datetime.now(timezone.utc)
+    desde = rollups.a_utc(desde) if desde else hasta - timedelta(hours=24)
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="`desde` tiene que ser anterior a `hasta`")
+    inicio, fin = series.epoch(desde), series.epoch(hasta)
+    if paso is None:
+        paso = remuestreo.paso_para(inicio, fin, puntos)
+    elif (fin - inicio) / paso > MAX_PUNTOS_SERIE:
+        raise HTTPException(status_code=400, detail=f"`paso` demasiado chico: más de {MAX_PUNTOS_SERIE} buckets")
+
+    if not await ejecutar(db, _sensor_visible, sensor_id, current_user.finca_id):
+        raise HTTPException(status_code=404, detail="Sensor no encontrado")
+
+    remuestreador = remuestreo.Remuestreador(inicio, paso, metodo.value, brecha, hasta=fin)
+    # 1. Lo archivado (si hay) y después la tabla caliente, en orden y sin juntar todo en memoria
+    if archivo.ARCHIVO_DIRECTORIO:
+        frias = archivo.leer(sensor_id, desde, hasta)
+        await run_in_threadpool(lambda: remuestreador.agregar_todas(
+            (series.epoch(f.fecha), f.valor) for bloque in frias for f in bloque
+        ))
+    consulta = crud.consulta_historial(sensor_id, archivo.inicio_caliente(desde), hasta)
+    await ejecutar(db, _remuestrear_caliente, consulta, remuestreador)
+
+    puntos_serie, brechas = remuestreador.resultado()
+    return {
+        "sensor_id": sensor_id,
+        "metodo": metodo,
+        "desde": desde,
+        "hasta": hasta,
+        "paso_segundos": paso,
+        "muestras": remuestreador.muestras,
+        "puntos": puntos_serie,
+        "brechas": [{"desde": series.fecha_de(a), "hasta": series.fecha_de(b)} for a, b in brechas],
+    }
+
+def _remuestrear_caliente(db: Session, consulta, remuestreador: remuestreo.Remuestreador) -> None:
+    resultado = db.execute(consulta.execution_options(yield_per=series.FILAS_POR_BLOQUE))
+    for bloque in resultado.partitions():
+        remuestreador.agregar_todas((series.epoch(f.fecha), f.valor) for f in bloque)
 
 # --- RUTAS DE LECTURAS ---
 # Las ponemos acá porque están muy relacionadas
 
-@router.post("/lecturas/", response_model=LecturaResponse)
-def crear_lectura(lectura: LecturaCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sensor = db.query(SensorDB).filter(SensorDB.id == lectura.sensor_id).first()
-    if not sensor:
-        raise HTTPException(status_code=404, detail="El sensor no existe")
+def _crear_lectura(db: Session, lectura: LecturaCreate, finca_id: Optional[int]) -> LecturaResponse:
+    sensor = _sensor_de_la_finca(db, lectura.sensor_id, finca_id, "El sensor no existe")
 
-    nueva_lectura = LecturaDB(**lectura.model_dump())
+    nueva_lectura = LecturaDB(**lectura.model_dump(), fecha=datetime.now(timezone.utc))
     db.add(nueva_lectura)
+    registro = [(nueva_lectura.sensor_id, nueva_lectura.valor, nueva_lectura.fecha)]
+    rollups.acumular(db, registro)
+    estado.anotar(db, registro)
+    eventos.anotar(db, registro, {sensor.id: (sensor.sector_id, finca_id)})
     db.commit()
     db.refresh(nueva_lectura)
-    return nueva_lectura
+    return LecturaResponse.model_validate(nueva_lectura)
 
-@router.get("/sensores/{sensor_id}/lecturas", response_model=List[LecturaResponse])
-def obtener_historial_sensor(
-    sensor_id: int, 
+@router.post("/lecturas/", response_model=LecturaResponse, responses={202: {"model": LecturaEncolada}})
+async def crear_lectura(lectura: LecturaCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    if ingesta.INGESTA_ASINCRONA:
+        filas, _ = await _encolar(db, [LecturaLoteItem(**lectura.model_dump())], current_user.finca_id)
+        if not filas:
+            raise HTTPException(status_code=404, detail="El sensor no existe")
+        encolada = LecturaEncolada(**filas[0])
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(encolada))
+    return await ejecutar(db, _crear_lectura, lectura, current_user.finca_id)
+
+@router.post("/lecturas/batch", response_model=LecturaLoteResponse, responses={202: {"model": LecturaLoteResponse}})
+async def crear_lecturas_lote(
+    lote: List[LecturaLoteItem],
+    response: Response,
     db: Session = Depends(get_db),
     current_user: UserDB = Depends(get_current_user)
 ):
-    lecturas = db.query(LecturaDB).filter(LecturaDB.sensor_id == sensor_id).all()
-    return lecturas
\ No newline at end of file
+    """
+    Ingesta de lecturas en lote para gateways.
+    Valida todos los sensores con una consulta y guarda todo en una sola transacción.
+    Con INGESTA_ASINCRONA=1 responde 202 apenas las lecturas quedan en la cola.
+    """
+    if not lote:
+        raise HTTPException(status_code=400, detail="El lote está vacío")
+    if len(lote) > MAX_LECTURAS_POR_LOTE:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {MAX_LECTURAS_POR_LOTE} lecturas")
+    if ingesta.INGESTA_ASINCRONA:
+        response.status_code = status.HTTP_202_ACCEPTED
+        _, respuesta = await _encolar(db, lote, current_user.finca_id)
+        return respuesta
+    return await ejecutar(db, _guardar_lote, lote, current_user.finca_id)
+
+def _separar_lote(lote: List[LecturaLoteItem], sector_de: dict):
+    """Separa aceptadas y rechazadas conservando el orden del lote. Devuelve (filas, respuesta)."""
+    ahora = datetime.now(timezone.utc)
+    filas = []
+    resultados = []
+    for indice, item in enumerate(lote):
+        if item.sensor_id not in sector_de:
+            resultados.append(LecturaLoteResultado(
+                indice=indice, sensor_id=item.sensor_id, aceptada=False, error="El sensor no existe"
+            ))
+            continue
+        fecha = rollups.a_utc(item.fecha) if item.fecha else ahora
+        filas.append({"valor": item.valor, "sensor_id": item.sensor_id, "fecha": fecha})
+        resultados.append(LecturaLoteResultado(indice=indice, sensor_id=item.sensor_id, aceptada=True))
+
+    respuesta = LecturaLoteResponse(aceptadas=len(filas), rechazadas=len(lote) - len(filas), resultados=resultados)
+    return filas, respuesta
+
+def _guardar_lote(db: Session, lote: List[LecturaLoteItem], finca_id: Optional[int]) -> LecturaLoteResponse:
+    # 1. Una sola consulta para saber qué sensores existen (y de qué sector y finca son)
+    ubicaciones = crud.ubicaciones_de_sensores(db, (item.sensor_id for item in lote))
+    sector_de = crud.sectores_en_finca(ubicaciones, finca_id)
+
+    # 2. Separamos aceptadas y rechazadas
+    filas, respuesta = _separar_lote(lote, sector_de)
+
+    # 3. INSERT multi-fila (+ rollups) y un único commit
+    ingesta.persistir(db, filas, ubicaciones)
+    db.commit()
+    return respuesta
+
+async def _encolar(db: Session, lote: List[LecturaLoteItem], finca_id: Optional[int]):
+    """Valida y encola (INGESTA_ASINCRONA). Devuelve (filas, respuesta) como _separar_lote."""
+    # Solo se abre la DB si hay sensores que la ingesta todavía no conoce
+    ids = [item.sensor_id for item in lote]
+    if ingesta.desconocidos(ids):
+        await ejecutar(db, ingesta.conocer_sensores, ids)
+    sector_de = ingesta.sectores_conocidos(ids, finca_id)
+
+    filas, respuesta = _separar_lote(lote, sector_de)
+    try:
+        ingesta.cola.encolar([(f["sensor_id"], f["valor"], f["fecha"]) for f in filas])
+    except ingesta.ColaLlena:
+        raise HTTPException(status_code=503, detail="La cola de ingesta está llena, reintentar más tarde")
+    return filas, respuesta
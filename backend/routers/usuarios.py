@@ -1,36 +1,78 @@
 # backend/routers/usuarios.py
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_db, ejecutar
 from ..models_db import UserDB
 from ..models import UserCreate, UserResponse, Token
-from ..auth import verificar_password, obtener_password_hash, crear_access_token 
+from ..auth import (
+    verificar_password_async, obtener_password_hash_async, crear_access_token, HashingSaturado,
+)
+from ..perfilado import RutaPerfilada
 
-router = APIRouter(tags=["Usuarios y Auth"])
+router = APIRouter(tags=["Usuarios y Auth"], route_class=RutaPerfilada)
+
+# bcrypt corre en su propio pool (ver auth.PoolHashing) y las consultas
+# cortas a la DB pasan por database.ejecutar (modo sync o async).
+
+def _buscar_usuario(db: Session, username: str):
+    """
+    Trae solo lo necesario y devuelve la conexión al pool enseguida:
+    mientras bcrypt trabaja, el request no tiene que retener una conexión.
+    """
+    try:
+        return db.execute(
+            select(UserDB.username, UserDB.hashed_password).where(UserDB.username == username)
+        ).first()
+    finally:
+        db.close()
+
+def _guardar_usuario(db: Session, usuario: UserDB):
+    db.add(usuario)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otro registro con el mismo nombre ganó la carrera mientras hasheábamos
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Usuario ya registrado")
+    db.refresh(usuario)
+    return UserResponse.model_validate(usuario)
+
+def _servicio_saturado():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Demasiados logins simultáneos, reintentá en unos segundos",
+        headers={"Retry-After": "1"},
+    )
 
 @router.post("/usuarios/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def registrar_usuario(usuario: UserCreate, db: Session = Depends(get_db)):
-    usuario_existente = db.query(UserDB).filter(UserDB.username == usuario.username).first()
+async def registrar_usuario(usuario: UserCreate, db: Session = Depends(get_db)):
+    usuario_existente = await ejecutar(db, _buscar_usuario, usuario.username)
     if usuario_existente:
         raise HTTPException(status_code=400, detail="Usuario ya registrado")
 
-    clave_hasheada = obtener_password_hash(usuario.password)
+    try:
+        clave_hasheada = await obtener_password_hash_async(usuario.password)
+    except HashingSaturado:
+        raise _servicio_saturado()
     nuevo_usuario = UserDB(username=usuario.username, hashed_password=clave_hasheada)
-    db.add(nuevo_usuario)
-    db.commit()
-    db.refresh(nuevo_usuario)
-    return nuevo_usuario
+    return await ejecutar(db, _guardar_usuario, nuevo_usuario)
 
 @router.post("/token/", response_model=Token)
-def login_para_obtener_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    usuario = db.query(UserDB).filter(UserDB.username == form_data.username).first()
-    if not usuario or not verificar_password(form_data.password, usuario.hashed_password):
+async def login_para_obtener_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    usuario = await ejecutar(db, _buscar_usuario, form_data.username)
+    try:
+        password_ok = usuario is not None and await verificar_password_async(form_data.password, usuario.hashed_password)
+    except HashingSaturado:
+        raise _servicio_saturado()
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales incorrectas",
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token = crear_access_token(data={"sub": usuario.username})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
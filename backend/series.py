@@ -0,0 +1,98 @@
+# backend/series.py
+# Series temporales compactas para análisis en memoria.
+#
+# - Una lectura ORM (LecturaDB + identity map) ocupa cientos de bytes; acá
+#   cada lectura son dos doubles (epoch UTC en segundos y valor): 16 bytes.
+# - Se llenan directo desde filas Core de select(), en bloques (yield_per),
+#   sin construir objetos ORM ni listas intermedias de filas.
+# - numpy() devuelve vistas sin copia sobre los mismos buffers, para agregar
+#   por buckets con operaciones vectorizadas.
+# - La usan los recálculos sobre lecturas crudas: rollups.reconstruir() y la
+#   hidratación del estado en memoria sin rollups. Los endpoints de monitoreo
+#   y agregados ya resuelven AVG/COUNT/MIN/MAX en la DB o en los rollups.
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+FILAS_POR_BLOQUE = 10_000
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCA_SIN_ZONA = datetime(1970, 1, 1)
+
+
+def epoch(fecha: datetime) -> float:
+    """Segundos UTC desde 1970. Las fechas sin zona horaria (SQLite) se interpretan como UTC."""
+    if fecha.tzinfo is None:
+        return (fecha - _EPOCA_SIN_ZONA).total_seconds()
+    return (fecha - _EPOCA).total_seconds()
+
+
+def fecha_de(segundos: float) -> datetime:
+    return _EPOCA + timedelta(seconds=float(segundos))
+
+
+class SerieTemporal:
+    """Lecturas de un sensor como dos arrays paralelos: tiempos (epoch) y valores."""
+
+    __slots__ = ("tiempos", "valores")
+
+    def __init__(self, tiempos: array = None, valores: array = None):
+        self.tiempos = tiempos if tiempos is not None else array("d")
+        self.valores = valores if valores is not None else array("d")
+
+    def agregar(self, fecha: datetime, valor: float) -> None:
+        self.tiempos.append(epoch(fecha))
+        self.valores.append(valor)
+
+    def __len__(self) -> int:
+        return len(self.tiempos)
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.tiempos) + len(self.valores)) * 8
+
+    def numpy(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(tiempos, valores) como arrays de NumPy sin copiar los datos."""
+        if not self.tiempos:
+            return np.empty(0), np.empty(0)
+        return np.frombuffer(self.tiempos, dtype=np.float64), np.frombuffer(self.valores, dtype=np.float64)
+
+    def buckets(self, paso: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Agregados por bucket de `paso` segundos alineados a la época:
+        (inicios, cantidad, suma, minimo, maximo), ordenados por inicio.
+        """
+        tiempos, valores = self.numpy()
+        if not len(tiempos):
+            vacio = np.empty(0)
+            return vacio, vacio.astype(np.int64), vacio, vacio, vacio
+        claves = np.floor(tiempos / paso).astype(np.int64)
+        unicas, grupo = np.unique(claves, return_inverse=True)
+        cantidad = np.bincount(grupo, minlength=len(unicas))
+        suma = np.bincount(grupo, weights=valores, minlength=len(unicas))
+        minimo = np.full(len(unicas), np.inf)
+        maximo = np.full(len(unicas), -np.inf)
+        np.minimum.at(minimo, grupo, valores)
+        np.maximum.at(maximo, grupo, valores)
+        return unicas * paso, cantidad, suma, minimo, maximo
+
+
+def cargar(db: Session, consulta) -> Dict[int, SerieTemporal]:
+    """
+    Ejecuta `consulta` (columnas sensor_id, valor, fecha) y arma una serie por sensor.
+    Las filas se consumen en bloques: nunca están todas en memoria a la vez.
+    """
+    series: Dict[int, SerieTemporal] = {}
+    resultado = db.execute(consulta.execution_options(yield_per=FILAS_POR_BLOQUE))
+    for bloque in resultado.partitions():
+        for sensor_id, valor, fecha in bloque:
+            serie = series.get(sensor_id)
+            if serie is None:
+                serie = series[sensor_id] = SerieTemporal()
+            serie.tiempos.append(epoch(fecha))
+            serie.valores.append(valor)
+    return series
+
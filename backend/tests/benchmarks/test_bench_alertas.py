@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import crud
+from backend.models_db import LecturaDB
+
+pytestmark = pytest.mark.benchmark
+
+SENSORES = 200
+LECTURAS_POR_SENSOR = 1440  # un día con muestreo de 1 minuto
+
+
+def _ultima_en_python(db, ids, limite):
+    """Estrategia anterior: traer todo el día como ORM y quedarse con la última."""
+    ultima = {}
+    for lectura in db.query(LecturaDB).filter(LecturaDB.sensor_id.in_(ids), LecturaDB.fecha >= limite).all():
+        actual = ultima.get(lectura.sensor_id)
+        if actual is None or lectura.fecha > actual.fecha:
+            ultima[lectura.sensor_id] = lectura
+    return ultima
+
+
+def test_ultima_lectura_en_db_vs_python(db_session, sembrar_flota):
+    ids = sembrar_flota(sensores=SENSORES, lecturas_por_sensor=LECTURAS_POR_SENSOR)
+    limite = datetime.now(timezone.utc) - timedelta(hours=24)
+
+    inicio = time.perf_counter()
+    en_python = _ultima_en_python(db_session, ids, limite)
+    tiempo_python = time.perf_counter() - inicio
+    db_session.expunge_all()
+
+    inicio = time.perf_counter()
+    en_db = crud.ultimas_lecturas(db_session, ids, desde=limite)
+    tiempo_db = time.perf_counter() - inicio
+
+    assert {k: v.valor for k, v in en_python.items()} == {k: v.valor for k, v in en_db.items()}
+    print(
+        f"\n📈 {SENSORES} sensores × {LECTURAS_POR_SENSOR} lecturas:"
+        f" Python {tiempo_python * 1000:.1f} ms | DB {tiempo_db * 1000:.1f} ms"
+        f" | x{tiempo_python / tiempo_db:.1f}"
+    )
+    assert tiempo_db < tiempo_python
+
+
+def test_alertas_desde_estado_en_memoria(db_session, sembrar_flota, monkeypatch):
+    from backend import estado, rollups
+    from backend.routers.monitoreo import _obtener_alertas_globales
+
+    sembrar_flota(sensores=SENSORES, lecturas_por_sensor=LECTURAS_POR_SENSOR)
+    consultas = 50
+
+    inicio = time.perf_counter()
+    for _ in range(consultas):
+        en_db = _obtener_alertas_globales(db_session, None)
+    tiempo_db = (time.perf_counter() - inicio) / consultas
+
+    # La flota se sembró sin rollups: la hidratación lee las lecturas crudas
+    monkeypatch.setattr(rollups, "ROLLUPS_HABILITADOS", False)
+    monkeypatch.setattr(estado, "ESTADO_EN_MEMORIA", True)
+    estado.estado_actual.reiniciar()
+    inicio = time.perf_counter()
+    estado.estado_actual.hidratar(db_session)
+    tiempo_hidratacion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(consultas):
+        en_memoria = _obtener_alertas_globales(db_session, None)
+    tiempo_memoria = (time.perf_counter() - inicio) / consultas
+    estado.estado_actual.reiniciar()
+
+    por_sensor = lambda r: sorted(r["detalles"], key=lambda d: d["sensor"])
+    assert por_sensor(en_memoria) == por_sensor(en_db)
+    print(
+        f"\n📈 Alertas de {SENSORES} sensores: DB {tiempo_db * 1000:.2f} ms | memoria {tiempo_memoria * 1000:.3f} ms"
+        f" | hidratación {tiempo_hidratacion * 1000:.0f} ms"
+    )
+    assert tiempo_memoria < 0.001
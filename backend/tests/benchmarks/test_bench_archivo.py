@@ -0,0 +1,38 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from backend import archivo
+
+pytestmark = pytest.mark.benchmark
+pytest.importorskip("pyarrow")
+
+LECTURAS = 60 * 1440  # 60 días con muestreo de 1 minuto
+
+
+def test_rango_largo_tabla_vs_archivo(authorized_client, db_session, sembrar_flota, tmp_path, monkeypatch):
+    """Exportación CSV de 60 días de un sensor: todo desde la tabla contra todo desde Parquet."""
+    sensor_id = sembrar_flota(sensores=1, lecturas_por_sensor=LECTURAS)[0]
+    ruta = f"/sensores/{sensor_id}/lecturas"
+
+    inicio = time.perf_counter()
+    desde_tabla = authorized_client.get(ruta, params={"formato": "csv"}).text
+    tiempo_tabla = time.perf_counter() - inicio
+
+    monkeypatch.setattr(archivo, "ARCHIVO_DIRECTORIO", str(tmp_path))
+    inicio = time.perf_counter()
+    resultado = archivo.archivar(db_session, antes_de=datetime.now(timezone.utc).date(), podar=True)
+    tiempo_archivar = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    desde_archivo = authorized_client.get(ruta, params={"formato": "csv"}).text
+    tiempo_archivo = time.perf_counter() - inicio
+
+    assert desde_archivo.count("\n") == desde_tabla.count("\n")
+    tamanio = sum(p.stat().st_size for p in tmp_path.rglob("*.parquet"))
+    print(
+        f"\n📈 {LECTURAS:,} lecturas: tabla {tiempo_tabla * 1000:.0f} ms | archivo {tiempo_archivo * 1000:.0f} ms"
+        f"\n📈 Archivar: {tiempo_archivar * 1000:.0f} ms, {resultado['archivos']} archivos, {tamanio / 1024:.0f} KiB"
+        f" ({tamanio / resultado['filas']:.1f} bytes/lectura)"
+    )
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.main import app
+from backend.database import Base, get_db
+from backend.auth import crear_access_token
+from backend.dependencies import cache_usuarios
+from backend.models_db import FincaDB, UserDB, SectorDB, SensorDB
+
+pytestmark = pytest.mark.benchmark
+
+REQUESTS_TOTALES = 400
+CONCURRENCIA = 100
+
+
+@pytest.fixture
+def base_en_archivo(tmp_path):
+    """SQLite en archivo con un usuario y un sector con sensores; devuelve (ruta, sector_id)."""
+    ruta = tmp_path / "async.db"
+    engine = create_engine(f"sqlite:///{ruta}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        finca = FincaDB(nombre="Finca")
+        db.add(finca)
+        db.flush()
+        db.add(UserDB(username="operador", hashed_password="x", finca_id=finca.id))
+        sector = SectorDB(nombre="Sector", humedad_minima=30, temp_maxima=40, finca_id=finca.id)
+        sector.sensores = [SensorDB(nombre=f"S{i}", tipo="Humedad", marca="M", modelo="X") for i in range(10)]
+        db.add(sector)
+        db.commit()
+        sector_id = sector.id
+    cache_usuarios.limpiar()
+    yield ruta, sector_id
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def _override_sync(ruta):
+    engine = create_engine(f"sqlite:///{ruta}", connect_args={"check_same_thread": False})
+    Sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Sesion()
+        try:
+            yield db
+        finally:
+            db.close()
+    return override_get_db
+
+
+def _override_async(ruta):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{ruta}")
+    Sesion = async_sessionmaker(engine, autoflush=False)
+
+    async def override_get_db():
+        async with Sesion() as db:
+            yield db
+    return override_get_db
+
+
+def _medir(sector_id) -> float:
+    """Requests por segundo con CONCURRENCIA requests en vuelo a la vez."""
+    headers = {"Authorization": f"Bearer {crear_access_token(data={'sub': 'operador'})}"}
+    rutas = ["/sensores/", f"/monitoreo/{sector_id}", "/monitoreo/alertas"]
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test", headers=headers) as cliente:
+            semaforo = asyncio.Semaphore(CONCURRENCIA)
+
+            async def pedir(i):
+                async with semaforo:
+                    return (await cliente.get(rutas[i % len(rutas)])).status_code
+
+            inicio = time.perf_counter()
+            codigos = await asyncio.gather(*(pedir(i) for i in range(REQUESTS_TOTALES)))
+            assert set(codigos) == {200}
+            return REQUESTS_TOTALES / (time.perf_counter() - inicio)
+
+    return asyncio.run(escenario())
+
+
+def test_throughput_sesion_sync_vs_async(base_en_archivo):
+    ruta, sector_id = base_en_archivo
+
+    app.dependency_overrides[get_db] = _override_sync(ruta)
+    rps_sync = _medir(sector_id)
+
+    app.dependency_overrides[get_db] = _override_async(ruta)
+    rps_async = _medir(sector_id)
+
+    print(
+        f"\n📈 {REQUESTS_TOTALES} requests con concurrencia {CONCURRENCIA}:"
+        f" sync (threadpool) {rps_sync:.0f} req/s | async (aiosqlite) {rps_async:.0f} req/s"
+    )
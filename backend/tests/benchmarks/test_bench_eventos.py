@@ -0,0 +1,83 @@
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+import pytest
+
+from backend import eventos
+from backend.main import app
+
+pytestmark = pytest.mark.benchmark
+
+CONEXIONES = 2000
+SECTORES = 20
+ALERTAS = 2 * SECTORES  # lotes que disparan una transición cada uno
+
+
+def _scope(token, sector_id=None):
+    query = f"sector_id={sector_id}".encode() if sector_id else b""
+    return {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": "/monitoreo/alertas/stream",
+        "raw_path": b"/monitoreo/alertas/stream", "query_string": query, "root_path": "",
+        "headers": [(b"authorization", token.encode())], "client": ("bench", 1), "server": ("bench", 80),
+    }
+
+
+def test_conexiones_sse_inactivas_y_latencia(authorized_client):
+    """CONEXIONES streams abiertos contra la app (la mitad filtrando un sector) y lotes que disparan alertas."""
+    sectores, sensores = [], []
+    for i in range(SECTORES):
+        sector = authorized_client.post("/sectores/", json={"nombre": f"S{i}", "humedad_minima": 30, "temp_maxima": 35}).json()
+        sectores.append(sector["id"])
+        sensores.append(authorized_client.post("/sensores/", json={
+            "nombre": f"T{i}", "tipo": "Temperatura", "marca": "M", "modelo": "X", "sector_id": sector["id"]
+        }).json()["id"])
+    token = authorized_client.headers["Authorization"]
+
+    async def escenario():
+        desconectar = asyncio.Event()
+        latencias = []  # por entrega: segundos desde la publicación hasta el send() de la conexión
+
+        async def receive():
+            await desconectar.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(mensaje):
+            if b"event: alerta" in mensaje.get("body", b""):
+                latencias.append(time.perf_counter() - publicado[0])
+
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        tareas = [
+            asyncio.create_task(app(_scope(token, sectores[(i // 2) % SECTORES] if i % 2 else None), receive, send))
+            for i in range(CONEXIONES)
+        ]
+        while eventos.central.suscriptores < CONEXIONES:
+            await asyncio.sleep(0.01)
+        por_conexion = (tracemalloc.get_traced_memory()[0] - base) / CONEXIONES
+        tracemalloc.stop()
+
+        publicado = [0.0]
+        esperadas = 0
+        for n in range(ALERTAS):
+            sensor_id = sensores[n % SECTORES]
+            valor = 20.0 if n >= SECTORES else 1.0  # primero se activa y después se resuelve
+            publicado[0] = time.perf_counter()
+            await asyncio.to_thread(authorized_client.post, "/lecturas/batch", json=[{"sensor_id": sensor_id, "valor": valor}])
+            esperadas += CONEXIONES // 2 + CONEXIONES // 2 // SECTORES
+            while len(latencias) < esperadas:
+                await asyncio.sleep(0.001)
+
+        desconectar.set()
+        await asyncio.wait_for(asyncio.gather(*tareas), 10)
+        return latencias, por_conexion
+
+    latencias, por_conexion = asyncio.run(escenario())
+    assert eventos.central.suscriptores == 0
+    latencias.sort()
+    print(
+        f"\n📈 {CONEXIONES} conexiones SSE inactivas: ~{por_conexion / 1024:.1f} KiB c/u"
+        f"\n📈 {ALERTAS} transiciones, {len(latencias)} entregas: mediana {statistics.median(latencias) * 1000:.2f} ms"
+        f" | p99 {latencias[int(len(latencias) * 0.99)] * 1000:.2f} ms (incluye el commit)"
+    )
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+TOTAL_LECTURAS = 2000
+
+
+def test_lote_vs_lectura_individual(authorized_client, sensores_bench):
+    """Compara el throughput de POST /lecturas/ contra POST /lecturas/batch."""
+    lecturas = [
+        {"valor": float(i % 100), "sensor_id": sensores_bench[i % len(sensores_bench)]}
+        for i in range(TOTAL_LECTURAS)
+    ]
+
+    inicio = time.perf_counter()
+    for lectura in lecturas:
+        assert authorized_client.post("/lecturas/", json=lectura).status_code == 200
+    tiempo_individual = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for i in range(0, TOTAL_LECTURAS, 500):
+        response = authorized_client.post("/lecturas/batch", json=lecturas[i:i + 500])
+        assert response.json()["rechazadas"] == 0
+    tiempo_lote = time.perf_counter() - inicio
+
+    print(
+        f"\n📈 Individual: {TOTAL_LECTURAS / tiempo_individual:,.0f} lecturas/s"
+        f" | Lote: {TOTAL_LECTURAS / tiempo_lote:,.0f} lecturas/s"
+        f" | x{tiempo_individual / tiempo_lote:.1f}"
+    )
+    assert tiempo_lote < tiempo_individual
+
+
+def test_ingesta_asincrona_vs_commit(authorized_client, db_session, sensores_bench, tmp_path, monkeypatch):
+    """Latencia de POST /lecturas/ esperando el commit contra encolar (INGESTA_ASINCRONA) con el escritor de fondo."""
+    from sqlalchemy.orm import sessionmaker
+    from backend import ingesta
+    from backend.models_db import LecturaDB
+
+    lecturas = [
+        {"valor": float(i % 100), "sensor_id": sensores_bench[i % len(sensores_bench)]}
+        for i in range(TOTAL_LECTURAS)
+    ]
+
+    def latencias(codigo):
+        tiempos = []
+        for lectura in lecturas:
+            inicio = time.perf_counter()
+            assert authorized_client.post("/lecturas/", json=lectura).status_code == codigo
+            tiempos.append(time.perf_counter() - inicio)
+        return sorted(tiempos)
+
+    con_commit = latencias(200)
+
+    cola = ingesta.ColaIngesta(str(tmp_path), 100_000, 500, 50, 50_000, False)
+    monkeypatch.setattr(ingesta, "INGESTA_ASINCRONA", True)
+    monkeypatch.setattr(ingesta, "cola", cola)
+    # La DB de tests es una sola conexión compartida (StaticPool): con los sensores ya
+    # conocidos los requests no la tocan y no se pisan con el escritor
+    ingesta.conocer_sensores(db_session, sensores_bench)
+    db_session.rollback()
+    detener = cola.iniciar(sessionmaker(bind=db_session.get_bind()))
+    encoladas = latencias(202)
+    detener.set()
+    assert cola.esperar(60)
+    assert db_session.query(LecturaDB).count() == 2 * TOTAL_LECTURAS
+
+    p = lambda tiempos, q: tiempos[int(len(tiempos) * q)] * 1000
+    estadisticas = cola.estadisticas()
+    print(
+        f"\n📈 POST /lecturas/ con commit: p50 {p(con_commit, 0.5):.2f} ms | p99 {p(con_commit, 0.99):.2f} ms"
+        f"\n📈 POST /lecturas/ encolada:   p50 {p(encoladas, 0.5):.2f} ms | p99 {p(encoladas, 0.99):.2f} ms"
+        f" | {estadisticas['lotes']} lotes, flush promedio {estadisticas['flush_promedio_ms']} ms"
+    )
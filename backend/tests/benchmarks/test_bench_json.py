@@ -0,0 +1,68 @@
+import json
+import time
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+from backend import crud, respuestas
+from backend.models import LecturaResponse, SensorListado
+from backend.models_db import SensorDB
+from backend.routers import sensores
+
+pytestmark = pytest.mark.benchmark
+
+ELEMENTOS = 10_000
+REPETICIONES = 5
+
+
+def _mejor(funcion) -> float:
+    """Mejor de REPETICIONES corridas, en ms."""
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos) * 1000
+
+
+def _pydantic(modelo, datos) -> bytes:
+    """Lo que hacía FastAPI con el response_model: validar, volcar y json.dumps (JSONResponse)."""
+    adaptador = TypeAdapter(List[modelo])
+    volcado = adaptador.dump_python(adaptador.validate_python(datos, from_attributes=True), mode="json")
+    return json.dumps(volcado, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def test_historial_10k(authorized_client, sembrar_flota, db_session):
+    sensor_id = sembrar_flota(sensores=1, lecturas_por_sensor=ELEMENTOS)[0]
+    filas = db_session.execute(crud.consulta_historial(sensor_id)).all()
+    assert len(filas) == ELEMENTOS
+
+    antes = _mejor(lambda: _pydantic(LecturaResponse, filas))
+    ahora = _mejor(lambda: respuestas.a_json(sensores._lecturas(filas)))
+    assert json.loads(respuestas.a_json(sensores._lecturas(filas))) == json.loads(_pydantic(LecturaResponse, filas))
+
+    ruta = f"/sensores/{sensor_id}/lecturas"
+    extremo = _mejor(lambda: authorized_client.get(ruta, params={"limite": ELEMENTOS}))
+    print(
+        f"\n📈 historial {ELEMENTOS:,} lecturas | serialización: pydantic {antes:.1f} ms"
+        f" | orjson desde filas {ahora:.1f} ms ({antes / ahora:.1f}x) | GET completo {extremo:.0f} ms"
+    )
+    assert ahora < antes
+
+
+def test_listado_sensores_10k(authorized_client, sembrar_flota, db_session):
+    sembrar_flota(sensores=ELEMENTOS, lecturas_por_sensor=1)
+    assert db_session.query(SensorDB).count() == ELEMENTOS
+    datos = sensores._listar_sensores(db_session, None, 100, None)
+
+    # Antes: SensorListado armado en el handler y vuelto a validar por el response_model
+    antes = _mejor(lambda: _pydantic(SensorListado, [SensorListado(**d) for d in datos]))
+    ahora = _mejor(lambda: respuestas.a_json(datos))
+
+    extremo = _mejor(lambda: authorized_client.get("/sensores/"))
+    print(
+        f"\n📈 GET /sensores/ con {ELEMENTOS:,} sensores | serialización: pydantic {antes:.1f} ms"
+        f" | orjson {ahora:.1f} ms ({antes / ahora:.1f}x) | GET completo {extremo:.0f} ms"
+    )
+    assert ahora < antes
@@ -0,0 +1,81 @@
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+
+from backend.database import Base
+from backend.models_db import SectorDB, SensorDB, LecturaDB
+
+pytestmark = pytest.mark.benchmark
+
+# 10M por defecto; se puede bajar para una corrida rápida (AGROTECH_BENCH_FILAS=200000)
+TOTAL_FILAS = int(os.getenv("AGROTECH_BENCH_FILAS", "10000000"))
+TOTAL_SENSORES = 1000
+DIAS_HISTORIA = 365
+LOTE = 50_000
+
+
+@pytest.fixture(scope="module")
+def engine_grande(tmp_path_factory):
+    """DB en archivo (o Postgres local vía AGROTECH_BENCH_PG_URL) con TOTAL_FILAS lecturas."""
+    url = os.getenv("AGROTECH_BENCH_PG_URL") or f"sqlite:///{tmp_path_factory.mktemp('bench') / 'lecturas.db'}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    ahora = datetime.now(timezone.utc)
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(SectorDB), [{"id": 1, "nombre": "Bench", "humedad_minima": 30, "temp_maxima": 40}])
+        conn.execute(insert(SensorDB), [
+            {"id": i, "nombre": f"S{i}", "tipo": "Humedad", "marca": "B", "modelo": "B", "sector_id": 1}
+            for i in range(1, TOTAL_SENSORES + 1)
+        ])
+    for inicio in range(0, TOTAL_FILAS, LOTE):
+        filas = [
+            {
+                "valor": rnd.uniform(0, 100),
+                "sensor_id": rnd.randint(1, TOTAL_SENSORES),
+                "fecha": ahora - timedelta(seconds=rnd.randint(0, DIAS_HISTORIA * 86400)),
+            }
+            for _ in range(min(LOTE, TOTAL_FILAS - inicio))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(LecturaDB), filas)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+
+
+def _medir_consulta(engine, repeticiones=20):
+    ids = list(range(1, 51))
+    limite = datetime.now(timezone.utc) - timedelta(hours=24)
+    consulta = select(LecturaDB.sensor_id, LecturaDB.valor).where(
+        LecturaDB.sensor_id.in_(ids), LecturaDB.fecha >= limite
+    )
+    inicio = time.perf_counter()
+    with engine.connect() as conn:
+        for _ in range(repeticiones):
+            conn.execute(consulta).all()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def test_latencia_24h_con_y_sin_indice_compuesto(engine_grande):
+    con_indice = _medir_consulta(engine_grande)
+
+    with engine_grande.begin() as conn:
+        conn.execute(text("DROP INDEX ix_lecturas_sensor_fecha"))
+    sin_indice = _medir_consulta(engine_grande, repeticiones=3)
+
+    with engine_grande.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_lecturas_sensor_fecha ON lecturas (sensor_id, fecha DESC)"))
+
+    print(
+        f"\n📈 {TOTAL_FILAS:,} lecturas | 50 sensores, últimas 24h:"
+        f" sin índice {sin_indice:.1f} ms | con índice {con_indice:.1f} ms"
+    )
+    assert con_indice < sin_indice
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from backend import perfilado
+
+pytestmark = pytest.mark.benchmark
+
+REQUESTS = 2000
+
+
+def test_costo_del_muestreo(authorized_client, sembrar_flota, monkeypatch):
+    """GET /sectores/ servido desde la caché (el request más barato, donde más pesa el overhead)."""
+    sembrar_flota(sensores=50, lecturas_por_sensor=60)
+
+    def medir(muestreo: float, cprofile: bool = False) -> float:
+        monkeypatch.setattr(perfilado, "PERFIL_MUESTREO", muestreo)
+        monkeypatch.setattr(perfilado, "PERFIL_CPROFILE", cprofile)
+        perfilado.registro.limpiar()
+        authorized_client.get("/sectores/")
+        inicio = time.perf_counter()
+        for _ in range(REQUESTS):
+            authorized_client.get("/sectores/")
+        return (time.perf_counter() - inicio) / REQUESTS * 1e6
+
+    # Alternadas para que el ruido de la máquina pese parecido en todas
+    apagado, al_1, apagado_2 = medir(0.0), medir(0.01), medir(0.0)
+    base = min(apagado, apagado_2)
+    al_100, cprofile_100 = medir(1.0), medir(1.0, cprofile=True)
+    perfilado.registro.limpiar()
+
+    print(
+        f"\n📈 GET /sectores/ (caché) por request: apagado {base:.0f} µs | 1% {al_1:.0f} µs ({al_1 / base - 1:+.1%})"
+        f" | 100% fases {al_100:.0f} µs ({al_100 / base - 1:+.1%}) | 100% cProfile {cprofile_100:.0f} µs"
+    )
+    assert al_1 < base * 1.10
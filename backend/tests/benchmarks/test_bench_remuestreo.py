@@ -0,0 +1,35 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+LECTURAS = 30 * 1440  # 30 días con muestreo de 1 minuto
+PUNTOS = 500
+
+
+def test_serie_remuestreada_vs_historial(authorized_client, sembrar_flota):
+    """Gráfico de 30 días: bajar el historial completo contra pedir 500 puntos ya remuestreados."""
+    sensor_id = sembrar_flota(sensores=1, lecturas_por_sensor=LECTURAS)[0]
+    hasta = datetime.now(timezone.utc) + timedelta(minutes=1)
+    rango = {"desde": (hasta - timedelta(days=31)).isoformat(), "hasta": hasta.isoformat()}
+
+    inicio = time.perf_counter()
+    crudo = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={**rango, "formato": "ndjson"}).content
+    tiempo_crudo = time.perf_counter() - inicio
+    assert crudo.count(b"\n") == LECTURAS
+
+    lineas = [f"\n📈 {LECTURAS:,} lecturas | historial ndjson: {tiempo_crudo * 1000:.0f} ms, {len(crudo) / 1024:.0f} KiB"]
+    for metodo in ("promedio", "minmax", "lttb"):
+        inicio = time.perf_counter()
+        respuesta = authorized_client.get(
+            f"/sensores/{sensor_id}/serie", params={**rango, "puntos": PUNTOS, "metodo": metodo}
+        )
+        tiempo = time.perf_counter() - inicio
+        datos = respuesta.json()
+        assert datos["muestras"] == LECTURAS and len(datos["puntos"]) <= PUNTOS + 2
+        lineas.append(
+            f"📈 serie {metodo}: {tiempo * 1000:.0f} ms, {len(respuesta.content) / 1024:.0f} KiB, {len(datos['puntos'])} puntos"
+        )
+    print("\n".join(lineas))
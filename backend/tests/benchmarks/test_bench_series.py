@@ -0,0 +1,59 @@
+import gc
+import time
+import tracemalloc
+
+import pytest
+from sqlalchemy import select
+
+from backend import series
+from backend.models_db import LecturaDB
+
+pytestmark = pytest.mark.benchmark
+
+SENSORES = 100
+LECTURAS_POR_SENSOR = 10_000  # 1M lecturas
+
+
+def _medir(funcion):
+    """(resultado, segundos, bytes retenidos, pico de bytes). El tiempo se mide sin tracemalloc, que lo infla."""
+    gc.collect()
+    inicio = time.perf_counter()
+    funcion()
+    segundos = time.perf_counter() - inicio
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcion()
+    retenidos, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, retenidos, pico
+
+
+def test_orm_vs_series(db_session, sembrar_flota):
+    sembrar_flota(sensores=SENSORES, lecturas_por_sensor=LECTURAS_POR_SENSOR)
+    total = SENSORES * LECTURAS_POR_SENSOR
+    db_session.expunge_all()
+
+    def con_orm():
+        db_session.expunge_all()
+        por_sensor = {}
+        for lectura in db_session.query(LecturaDB).all():
+            por_sensor.setdefault(lectura.sensor_id, []).append(lectura)
+        return por_sensor
+
+    orm, t_orm, mem_orm, pico_orm = _medir(con_orm)
+    suma_orm = sum(l.valor for lecturas in orm.values() for l in lecturas)
+    del orm
+    db_session.expunge_all()
+
+    consulta = select(LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha)
+    compactas, t_series, mem_series, pico_series = _medir(lambda: series.cargar(db_session, consulta))
+    assert sum(len(s) for s in compactas.values()) == total
+    assert sum(s.numpy()[1].sum() for s in compactas.values()) == pytest.approx(suma_orm)
+
+    mib = 1024 * 1024
+    print(
+        f"\n📈 {total:,} lecturas | ORM: {t_orm:.2f} s, {mem_orm / mib:.0f} MiB retenidos (pico {pico_orm / mib:.0f} MiB)"
+        f" | Series: {t_series:.2f} s, {mem_series / mib:.0f} MiB retenidos (pico {pico_series / mib:.0f} MiB)"
+        f"\n📈 {mem_orm / total:.0f} vs {mem_series / total:.1f} bytes por lectura"
+    )
+    assert mem_series * 10 < mem_orm
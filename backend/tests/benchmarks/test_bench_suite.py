@@ -0,0 +1,131 @@
+"""
+Suite de carga de los endpoints calientes, a varias escalas de flota.
+
+- Mide p50/p95 y statements SQL por request, y compara contra linea_base.json.
+- Más statements que la línea base es una regresión y falla (es determinístico:
+  suele ser un N+1 nuevo). Los tiempos dependen de la máquina: se reportan y
+  solo fallan con AGROTECH_BENCH_ESTRICTO=1.
+
+Variables:
+  AGROTECH_BENCH_ESCALAS=chica,mediana   escalas a correr (también "grande")
+  AGROTECH_BENCH_REPETICIONES=20         requests medidos por endpoint
+  AGROTECH_BENCH_TOLERANCIA=0.5          p50 hasta un 50% más lento no es regresión
+  AGROTECH_BENCH_ESTRICTO=1              los tiempos fuera de tolerancia también fallan
+  AGROTECH_BENCH_ACTUALIZAR=1            reescribe la línea base con esta corrida
+  AGROTECH_BENCH_PG_URL=postgresql://... corre contra PostgreSQL (ver conftest.py)
+"""
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+
+from backend.respuestas import cache_respuestas
+
+pytestmark = pytest.mark.benchmark
+
+
+class Escala(NamedTuple):
+    sectores: int
+    sensores_por_sector: int
+    dias: int
+    intervalo_minutos: int
+
+
+ESCALAS = {
+    "chica": Escala(sectores=5, sensores_por_sector=4, dias=7, intervalo_minutos=15),  # 13k lecturas
+    "mediana": Escala(sectores=20, sensores_por_sector=10, dias=14, intervalo_minutos=15),  # 269k lecturas
+    "grande": Escala(sectores=50, sensores_por_sector=20, dias=28, intervalo_minutos=10),  # 4M lecturas
+}
+ESCALAS_ELEGIDAS = os.getenv("AGROTECH_BENCH_ESCALAS", "chica,mediana").split(",")
+REPETICIONES = int(os.getenv("AGROTECH_BENCH_REPETICIONES", "20"))
+TOLERANCIA = float(os.getenv("AGROTECH_BENCH_TOLERANCIA", "0.5"))
+ACTUALIZAR = os.getenv("AGROTECH_BENCH_ACTUALIZAR", "0") == "1"
+ESTRICTO = os.getenv("AGROTECH_BENCH_ESTRICTO", "0") == "1"
+LINEA_BASE = Path(__file__).with_name("linea_base.json")
+
+
+def _endpoints(flota):
+    sector_id = next(iter(flota))
+    sensor_id = flota[sector_id][0]
+    return {
+        "GET /monitoreo/alertas": lambda c: c.get("/monitoreo/alertas"),
+        "GET /monitoreo/{id}": lambda c: c.get(f"/monitoreo/{sector_id}"),
+        "GET /sectores/": lambda c: c.get("/sectores/"),
+        "POST /lecturas/": lambda c: c.post("/lecturas/", json={"sensor_id": sensor_id, "valor": 42.0}),
+        "GET /sensores/{id}/lecturas": lambda c: c.get(f"/sensores/{sensor_id}/lecturas", params={"limite": 1000}),
+    }
+
+
+def _medir(cliente, pedir, contar_sql) -> dict:
+    """p50/p95 en ms y statements por request. Sin caché de respuestas: se mide el trabajo real."""
+    cache_respuestas.limpiar()
+    assert pedir(cliente).status_code < 300  # calentamiento: motor de reglas, caché de usuarios
+    tiempos, consultas = [], 0
+    for _ in range(REPETICIONES):
+        cache_respuestas.limpiar()
+        antes = contar_sql()
+        inicio = time.perf_counter()
+        respuesta = pedir(cliente)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas = max(consultas, contar_sql() - antes)
+        assert respuesta.status_code < 300, respuesta.text
+    tiempos.sort()
+    return {
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2),
+        "consultas": consultas,
+    }
+
+
+def _regresiones(medidas: dict, base: dict) -> tuple:
+    """(consultas de más, tiempos fuera de tolerancia) respecto de la línea base."""
+    consultas, tiempos = [], []
+    for nombre, medida in medidas.items():
+        previa = base.get(nombre)
+        if previa is None:
+            continue
+        if medida["consultas"] > previa["consultas"]:
+            consultas.append(f"{nombre}: {previa['consultas']} -> {medida['consultas']} statements")
+        if medida["p50_ms"] > previa["p50_ms"] * (1 + TOLERANCIA):
+            tiempos.append(f"{nombre}: p50 {previa['p50_ms']} -> {medida['p50_ms']} ms")
+    return consultas, tiempos
+
+
+@pytest.mark.parametrize("nombre_escala", list(ESCALAS))
+def test_endpoints_calientes(nombre_escala, authorized_client, db_session, sembrar_escala, contar_sql):
+    if nombre_escala not in ESCALAS_ELEGIDAS:
+        pytest.skip(f"escala {nombre_escala} no está en AGROTECH_BENCH_ESCALAS")
+    escala = ESCALAS[nombre_escala]
+    inicio = time.perf_counter()
+    flota = sembrar_escala(*escala)
+    tiempo_siembra = time.perf_counter() - inicio
+    lecturas = escala.sectores * escala.sensores_por_sector * escala.dias * 1440 // escala.intervalo_minutos
+
+    medidas = {nombre: _medir(authorized_client, pedir, contar_sql) for nombre, pedir in _endpoints(flota).items()}
+
+    motor = db_session.get_bind().dialect.name
+    todas = json.loads(LINEA_BASE.read_text(encoding="utf-8")) if LINEA_BASE.exists() else {}
+    base = todas.get(motor, {}).get(nombre_escala, {})
+    consultas, tiempos = _regresiones(medidas, base)
+
+    lineas = [f"\n📈 [{motor}/{nombre_escala}] {lecturas:,} lecturas sembradas en {tiempo_siembra:.1f} s"]
+    for nombre, medida in medidas.items():
+        previa = base.get(nombre, {})
+        lineas.append(
+            f"📈 {nombre:<28} p50 {medida['p50_ms']:>8.2f} ms (base {previa.get('p50_ms', '-')})"
+            f" | p95 {medida['p95_ms']:>8.2f} ms | {medida['consultas']} statements (base {previa.get('consultas', '-')})"
+        )
+    lineas += [f"⚠️ {r}" for r in consultas + tiempos]
+    print("\n".join(lineas))
+
+    if ACTUALIZAR:
+        todas.setdefault(motor, {})[nombre_escala] = medidas
+        LINEA_BASE.write_text(json.dumps(todas, indent=2, ensure_ascii=False, sort_keys=True) + "\n", encoding="utf-8")
+        return
+    assert not consultas, "Más statements por request que la línea base (¿N+1?)"
+    if ESTRICTO:
+        assert not tiempos, "Endpoints más lentos que la línea base"
@@ -1,6 +1,8 @@
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -8,6 +10,10 @@ from sqlalchemy.pool import StaticPool
 from backend.main import app
 from backend.database import Base, get_db
 from backend.auth import crear_access_token
+from backend.dependencies import cache_usuarios
+from backend import dependencies, ingesta, instrumentacion, reglas, respuestas
+from backend.models_db import LecturaDB, SectorDB, SensorDB
+from backend.respuestas import cache_respuestas
 
 # 1. Configuración de Base de Datos en Memoria (SQLite)
 # Esto crea una DB que vive solo mientras dura el test
@@ -25,6 +31,11 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 def db_session():
     """Crea las tablas, entrega una sesión y al final borra todo."""
     Base.metadata.create_all(bind=engine)
+    cache_usuarios.limpiar()
+    reglas.reiniciar()
+    cache_respuestas.limpiar()
+    ingesta.olvidar_sensores()
+    respuestas.olvidar_fincas()
     db = TestingSessionLocal()
     try:
         yield db
@@ -52,8 +63,10 @@ def client(db_session):
 # 4. Fixture de Usuario Autenticado (¡Nuevo!)
 # Esto crea un usuario y te da un cliente ya logueado con token
 @pytest.fixture(scope="function")
-def authorized_client(client, db_session):
-    # Creamos un usuario en la DB falsa
+def authorized_client(client, db_session, monkeypatch):
+    # Creamos un usuario en la DB falsa. Es administrador: sin finca asignada,
+    # solo así ve los datos sin finca que siembran los tests
+    monkeypatch.setattr(dependencies, "ADMIN_USUARIOS", {"testuser"})
     from backend.models_db import UserDB
     user = UserDB(username="testuser", hashed_password="fakehash")
     db_session.add(user)
@@ -67,4 +80,77 @@ def authorized_client(client, db_session):
         **client.headers,
         "Authorization": f"Bearer {token}",
     }
-    return client
\ No newline at end of file
+    return client
+
+
+# 5. Tope de consultas por request (para que no vuelvan los N+1)
+@pytest.fixture(scope="function")
+def max_consultas(monkeypatch):
+    """
+    Activa los headers de instrumentación y verifica los statements SQL de una respuesta.
+    Uso: max_consultas(authorized_client.get("/sectores/"), 2)
+    """
+    monkeypatch.setattr(instrumentacion, "AGROTECH_DEBUG", True)
+
+    def _verificar(respuesta, maximo: int):
+        consultas = int(respuesta.headers["X-DB-Consultas"])
+        pedido = respuesta.request
+        assert consultas <= maximo, f"{pedido.method} {pedido.url.path}: {consultas} consultas (máximo {maximo})"
+        return respuesta
+
+    return _verificar
+
+# 6. Sector con sensores (por la API, como los crea un usuario)
+@pytest.fixture(scope="function")
+def sector_con_sensores():
+    """
+    Crea un sector y un sensor por cada tipo; devuelve (sector_id, [sensor_id, ...]).
+    Uso: sector_id, (termometro,) = sector_con_sensores(authorized_client, "Norte")
+    """
+    def _crear(client, nombre="Sector de prueba", tipos=("Temperatura",), **campos):
+        sector = client.post("/sectores/", json={"nombre": nombre, "humedad_minima": 30, "temp_maxima": 35, **campos})
+        assert sector.status_code == 201, sector.text
+        sensores = []
+        for tipo in tipos:
+            sensor = client.post("/sensores/", json={
+                "nombre": f"{tipo} {nombre}", "tipo": tipo, "marca": "TestBrand", "modelo": "X1", "sector_id": sector.json()["id"]
+            })
+            assert sensor.status_code == 200, sensor.text
+            sensores.append(sensor.json()["id"])
+        return sector.json()["id"], sensores
+
+    return _crear
+
+
+# 7. Flota sembrada directo en la DB (sin pasar por la API)
+@pytest.fixture(scope="function")
+def sembrar_flota(db_session):
+    """
+    Fábrica que siembra `sectores` con `sensores` cada uno y `lecturas_por_sensor`
+    (una cada minuto hacia atrás). Devuelve los ids de los sensores en orden.
+    Uso: ids = sembrar_flota(sensores=200, lecturas_por_sensor=1440)
+    """
+    def _sembrar(sensores: int, lecturas_por_sensor: int, tipo: str = "Humedad", sectores: int = 1):
+        flota = [
+            SectorDB(
+                nombre=f"Flota {i}", humedad_minima=30, temp_maxima=40,
+                sensores=[SensorDB(nombre=f"Sensor {i}-{j}", tipo=tipo, marca="Bench", modelo="B1") for j in range(sensores)],
+            )
+            for i in range(sectores)
+        ]
+        db_session.add_all(flota)
+        db_session.commit()
+        ids = [s.id for sector in flota for s in sector.sensores]
+
+        ahora = datetime.now(timezone.utc)
+        filas = [
+            {"sensor_id": sensor_id, "valor": float((sensor_id + minuto) % 100), "fecha": ahora - timedelta(minutes=minuto)}
+            for sensor_id in ids
+            for minuto in range(lecturas_por_sensor)
+        ]
+        for inicio in range(0, len(filas), 50_000):
+            db_session.execute(insert(LecturaDB), filas[inicio:inicio + 50_000])
+        db_session.commit()
+        return ids
+
+    return _sembrar
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import archivo
+from backend.models_db import LecturaDB, SectorDB, SensorDB
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def sensor_con_historia(db_session):
+    """Un sensor con 3 lecturas por día durante los últimos 5 días."""
+    sector = SectorDB(nombre="Sector Archivo", humedad_minima=30, temp_maxima=40)
+    sector.sensores = [SensorDB(nombre="Sensor Archivo", tipo="Humedad", marca="M", modelo="X")]
+    db_session.add(sector)
+    db_session.commit()
+    sensor_id = sector.sensores[0].id
+
+    hoy = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+    db_session.add_all(
+        LecturaDB(sensor_id=sensor_id, valor=float(dias * 10 + h), fecha=hoy - timedelta(days=dias) + timedelta(hours=h))
+        for dias in range(4, -1, -1) for h in range(3)
+    )
+    db_session.commit()
+    return sensor_id, hoy.date()
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(archivo, "ARCHIVO_DIRECTORIO", str(tmp_path))
+    return tmp_path
+
+
+def test_archiva_poda_y_lee_transparente(authorized_client, db_session, sensor_con_historia, directorio):
+    sensor_id, hoy = sensor_con_historia
+    antes = [l["valor"] for l in authorized_client.get(f"/sensores/{sensor_id}/lecturas").json()]
+
+    resultado = archivo.archivar(db_session, antes_de=hoy - timedelta(days=2), podar=True)
+    assert resultado["filas"] == 6 and resultado["archivos"] == 2 and resultado["podadas"] == 6
+    assert len(list(directorio.glob(f"sensor={sensor_id}/*.parquet"))) == 2
+    assert db_session.query(LecturaDB).count() == 9
+
+    # Mismo historial, mismo orden: 6 del archivo + 9 de la tabla
+    assert [l["valor"] for l in authorized_client.get(f"/sensores/{sensor_id}/lecturas").json()] == antes
+
+    # Paginación por cursor cruzando la frontera
+    paginado, cursor = [], None
+    while True:
+        respuesta = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"limite": 4, "cursor": cursor})
+        paginado += [l["valor"] for l in respuesta.json()]
+        cursor = respuesta.headers.get("X-Siguiente-Cursor")
+        if not cursor:
+            break
+    assert paginado == antes
+
+    # Rango solo en frío, submuestreo y exportación
+    desde = datetime.combine(hoy - timedelta(days=3), datetime.min.time(), tzinfo=timezone.utc)
+    rango = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={
+        "desde": desde.isoformat(), "hasta": (desde + timedelta(days=1)).isoformat()
+    }).json()
+    assert [l["valor"] for l in rango] == [30.0, 31.0, 32.0]
+    cada_dos = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"cada": 2}).json()
+    assert [l["valor"] for l in cada_dos][:4] == [41.0, 30.0, 32.0, 21.0]
+    csv = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"formato": "csv"}).text.splitlines()
+    assert len(csv) == 1 + len(antes)
+
+
+def test_archivar_es_idempotente(db_session, sensor_con_historia, directorio):
+    sensor_id, hoy = sensor_con_historia
+    archivo.archivar(db_session, antes_de=hoy - timedelta(days=2), podar=False)
+    # Lectura que llega tarde a un día ya archivado
+    db_session.add(LecturaDB(sensor_id=sensor_id, valor=99.0, fecha=datetime.combine(
+        hoy - timedelta(days=3), datetime.min.time(), tzinfo=timezone.utc
+    )))
+    db_session.commit()
+    archivo.archivar(db_session, antes_de=hoy - timedelta(days=2), podar=False)
+
+    filas = [f for bloque in archivo.leer(sensor_id) for f in bloque]
+    assert len(filas) == 7
+    assert len({f.id for f in filas}) == 7
+    assert db_session.query(LecturaDB).count() == 16
+
+
+def test_poda_solo_lo_archivado(db_session, sensor_con_historia, directorio, monkeypatch):
+    sensor_id, hoy = sensor_con_historia
+    guardar_frontera = archivo._guardar_frontera
+
+    def llega_tarde(*args):
+        # Fila vieja que se commitea entre el SELECT y la poda (lote de un gateway)
+        db_session.add(LecturaDB(sensor_id=sensor_id, valor=-1.0, fecha=datetime.combine(
+            hoy - timedelta(days=4), datetime.min.time(), tzinfo=timezone.utc
+        )))
+        db_session.commit()
+        guardar_frontera(*args)
+
+    monkeypatch.setattr(archivo, "_guardar_frontera", llega_tarde)
+    resultado = archivo.archivar(db_session, antes_de=hoy - timedelta(days=2), podar=True)
+    assert resultado["podadas"] == 6
+    assert db_session.query(LecturaDB).filter(LecturaDB.valor == -1.0).count() == 1
+
+
+def test_una_corrida_a_la_vez(db_session, sensor_con_historia, directorio):
+    sensor_id, hoy = sensor_con_historia
+    with archivo._exclusivo(str(directorio)) as tomado:
+        assert tomado
+        resultado = archivo.archivar(db_session, antes_de=hoy - timedelta(days=2), podar=True)
+    assert resultado["omitida"] and resultado["filas"] == 0
+    assert archivo.frontera(str(directorio)) is None
+    assert archivo.archivar(db_session, antes_de=hoy - timedelta(days=2), podar=True)["filas"] == 6
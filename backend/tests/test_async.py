@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend.main import app
+from backend.database import Base, get_db
+from backend.auth import crear_access_token
+from backend import dependencies
+from backend.dependencies import cache_usuarios
+from backend.models_db import UserDB
+
+
+@pytest.fixture(scope="function")
+def async_client(tmp_path, monkeypatch):
+    """Cliente contra la app usando AsyncSession (aiosqlite) en lugar de Session."""
+    ruta = tmp_path / "async.db"
+    engine_sync = create_engine(f"sqlite:///{ruta}")
+    Base.metadata.create_all(bind=engine_sync)
+    with engine_sync.begin() as conn:
+        conn.execute(UserDB.__table__.insert().values(username="testuser", hashed_password="fakehash", is_active=True))
+    cache_usuarios.limpiar()
+    monkeypatch.setattr(dependencies, "ADMIN_USUARIOS", {"testuser"})  # sin finca: ve los datos sin finca
+
+    engine_async = create_async_engine(f"sqlite+aiosqlite:///{ruta}", poolclass=NullPool)
+    SesionAsync = async_sessionmaker(engine_async, autoflush=False)
+
+    async def override_get_db():
+        async with SesionAsync() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        c.headers["Authorization"] = f"Bearer {crear_access_token(data={'sub': 'testuser'})}"
+        yield c
+    app.dependency_overrides.pop(get_db, None)
+    engine_sync.dispose()
+
+
+def test_endpoints_con_sesion_async(async_client):
+    sector = async_client.post("/sectores/", json={"nombre": "Sector Async", "humedad_minima": 30, "temp_maxima": 35}).json()
+    sensor = async_client.post("/sensores/", json={
+        "nombre": "Termómetro Async",
+        "tipo": "Temperatura",
+        "marca": "TestBrand",
+        "modelo": "X1",
+        "sector_id": sector["id"]
+    }).json()
+
+    lote = [{"sensor_id": sensor["id"], "valor": v} for v in (38.0, 40.0, 1.0)]
+    assert async_client.post("/lecturas/batch", json=lote).json()["aceptadas"] == 3
+    assert async_client.post("/lecturas/", json={"sensor_id": sensor["id"], "valor": 1.5}).status_code == 200
+
+    listado = async_client.get("/sensores/").json()
+    assert listado[0]["lecturas_24h"] == 4
+    assert listado[0]["ultima_lectura"]["valor"] == 1.5
+
+    assert len(async_client.get(f"/sensores/{sensor['id']}").json()["lecturas"]) == 4
+    assert len(async_client.get(f"/sensores/{sensor['id']}/lecturas").json()) == 4
+
+    exportacion = async_client.get(f"/sensores/{sensor['id']}/lecturas", params={"formato": "csv"})
+    assert exportacion.text.count("\n") == 5
+
+    assert async_client.get("/monitoreo/alertas").json()["total_alertas"] == 1
+    assert async_client.get(f"/monitoreo/{sector['id']}").json()["total_lecturas_24h"] == 4
+    assert async_client.get("/sectores/").status_code == 200
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+from sqlalchemy import exc, text
+
+from backend import database
+from backend.database import QueuePoolMedido, crear_engine, get_db, get_db_lectura
+
+
+def test_pool_medido_cuenta_uso_y_timeouts(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_TAMANIO", 1)
+    monkeypatch.setattr(database, "DB_POOL_DESBORDE", 0)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.05)
+    engine = crear_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    assert isinstance(engine.pool, QueuePoolMedido)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats = engine.pool.estadisticas()
+        assert stats["en_uso"] == 1
+        assert stats["utilizacion"] == 1.0
+        # Pool lleno: el segundo checkout espera DB_POOL_TIMEOUT y falla
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    stats = engine.pool.estadisticas()
+    assert stats["en_uso"] == 0
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["espera_maxima_ms"] >= 50
+    engine.dispose()
+
+
+def test_pool_medido_no_pierde_checkouts_concurrentes(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_TAMANIO", 8)
+    monkeypatch.setattr(database, "DB_POOL_DESBORDE", 0)
+    engine = crear_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    hilos, vueltas = 8, 200
+
+    def usar():
+        for _ in range(vueltas):
+            engine.pool.connect().close()
+
+    trabajadores = [threading.Thread(target=usar) for _ in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+
+    assert engine.pool.estadisticas()["checkouts"] == hilos * vueltas
+    engine.dispose()
+
+
+def test_metricas_exponen_pool_y_lectura_sin_replica(authorized_client):
+    # Sin DATABASE_URL_LECTURA las rutas de lectura usan la misma sesión
+    assert get_db_lectura is get_db
+    assert "principal" in authorized_client.get("/metricas/").json()["pool_db"]
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.util import await_only
+
+from backend import crud, estado, rollups
+from backend.database import Base
+from backend.models_db import LecturaDB, SectorDB, SensorDB
+
+
+@pytest.fixture(params=[True, False], ids=["con_rollups", "sin_rollups"])
+def estado_en_memoria(request, monkeypatch):
+    """Estado en memoria con verificación: cada respuesta se compara contra la DB."""
+    monkeypatch.setattr(rollups, "ROLLUPS_HABILITADOS", request.param)
+    monkeypatch.setattr(estado, "ESTADO_EN_MEMORIA", True)
+    monkeypatch.setattr(estado, "ESTADO_VERIFICAR", True)
+    estado.estado_actual.reiniciar()
+    yield estado.estado_actual
+    estado.estado_actual.reiniciar()
+
+
+def test_estado_coincide_con_la_db(authorized_client, estado_en_memoria, sector_con_sensores):
+    ahora = datetime.now(timezone.utc)
+    sector_id, (termometro, higrometro) = sector_con_sensores(authorized_client, "Viñedo Este", tipos=("Temperatura", "Humedad"))
+
+    # Lecturas viejas (hidratación) + nuevas (registradas en el commit), fuera de orden y fuera de ventana
+    lote = [
+        {"sensor_id": termometro, "valor": 41.0, "fecha": (ahora - timedelta(hours=3)).isoformat()},
+        {"sensor_id": higrometro, "valor": 20.0, "fecha": (ahora - timedelta(minutes=30)).isoformat()},
+        {"sensor_id": termometro, "valor": -9.0, "fecha": (ahora - timedelta(days=2)).isoformat()},
+    ]
+    authorized_client.post("/lecturas/batch", json=lote)
+    assert authorized_client.get("/monitoreo/alertas").json()["total_alertas"] == 2
+    assert estado_en_memoria.estadisticas()["hidratado"]
+
+    authorized_client.post("/lecturas/batch", json=[
+        {"sensor_id": termometro, "valor": 39.0, "fecha": (ahora - timedelta(hours=5)).isoformat()},
+        {"sensor_id": higrometro, "valor": 30.0, "fecha": (ahora - timedelta(minutes=1)).isoformat()},
+    ])
+    authorized_client.post("/lecturas/", json={"sensor_id": termometro, "valor": 20.0})
+    assert estado_en_memoria.lecturas_registradas == 3
+
+    alertas = authorized_client.get("/monitoreo/alertas").json()
+    assert alertas["total_alertas"] == 0
+    sector = authorized_client.get(f"/monitoreo/{sector_id}").json()
+    assert sector["total_lecturas_24h"] == 5
+    assert sector["estado"] == "CRÍTICO - Baja Humedad (Sequía) (25.0%)"
+
+    # Un sector nuevo invalida la metadata y aparece sin reiniciar el estado
+    sector_con_sensores(authorized_client, "Olivar", tipos=("Temperatura", "Humedad"))
+    listado = authorized_client.get("/sectores/").json()
+    assert [s["nombre"] for s in listado] == ["Viñedo Este", "Olivar"]
+    assert listado[0]["estado"].startswith("CRÍTICO") and listado[1]["estado"] == "OK"
+    assert len(listado[0]["sensores"]) == 2
+
+
+def test_verificacion_detecta_escrituras_por_fuera(authorized_client, db_session, estado_en_memoria, sector_con_sensores):
+    _, (termometro,) = sector_con_sensores(authorized_client)
+    authorized_client.post("/lecturas/", json={"sensor_id": termometro, "valor": 20.0})
+    authorized_client.get("/monitoreo/alertas")
+
+    # Un INSERT que no pasa por la API no llega al estado en memoria
+    db_session.add(LecturaDB(sensor_id=termometro, valor=1.0, fecha=datetime.now(timezone.utc) + timedelta(seconds=1)))
+    db_session.commit()
+    with pytest.raises(estado.EstadoInconsistente):
+        authorized_client.get("/monitoreo/alertas")
+
+
+def test_commit_durante_la_hidratacion_se_cuenta_una_vez(tmp_path, estado_en_memoria, monkeypatch):
+    # SQLite en archivo con WAL: la foto y el commit de otro thread no se bloquean en la DB
+    engine = create_engine(f"sqlite:///{tmp_path / 'estado.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", lambda conexion, _: conexion.execute("PRAGMA journal_mode=WAL"))
+    Base.metadata.create_all(bind=engine)
+    Sesion = sessionmaker(bind=engine)
+    with Sesion() as db:
+        sector = SectorDB(nombre="Sector Foto", humedad_minima=30, temp_maxima=40)
+        sector.sensores = [SensorDB(nombre="S1", tipo="Humedad", marca="M", modelo="X")]
+        db.add(sector)
+        db.commit()
+        sensor_id = sector.sensores[0].id
+        estado_en_memoria.hidratar(db)
+
+    def escribir():
+        ahora = datetime.now(timezone.utc)
+        with Sesion() as db:
+            crud.insertar_lecturas(db, [{"sensor_id": sensor_id, "valor": 10.0, "fecha": ahora}])
+            estado.anotar(db, [(sensor_id, 10.0, ahora)])
+            db.commit()
+
+    leer, escritor = estado._leer, threading.Thread(target=escribir)
+
+    def leer_y_escribir(db):
+        # Commit entre la foto y el reemplazo: antes se sumaba a las ventanas viejas y se perdía
+        foto = leer(db)
+        escritor.start()
+        escritor.join(0.3)
+        return foto
+
+    monkeypatch.setattr(estado, "_leer", leer_y_escribir)
+    with Sesion() as db:
+        estado_en_memoria.hidratar(db)
+        escritor.join(5)
+        assert estado_en_memoria.agregados(db, [sensor_id], estado.inicio_ventana())[sensor_id].cantidad == 1
+    engine.dispose()
+
+
+def test_hidratacion_en_el_loop_no_lo_traba(tmp_path, estado_en_memoria, monkeypatch):
+    # DB_MODO_ASYNC: el commit y la hidratación corren en el thread del loop (run_sync)
+    ruta = tmp_path / "estado_async.db"
+    engine = create_engine(f"sqlite:///{ruta}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        sector = SectorDB(nombre="Sector Async", humedad_minima=30, temp_maxima=40)
+        sector.sensores = [SensorDB(nombre="S1", tipo="Humedad", marca="M", modelo="X")]
+        db.add(sector)
+        db.commit()
+        sensor_id = sector.sensores[0].id
+        estado_en_memoria.hidratar(db)
+    engine.dispose()
+    motor_async = create_async_engine(f"sqlite+aiosqlite:///{ruta}", poolclass=NullPool)
+    Sesion = async_sessionmaker(motor_async, autoflush=False)
+
+    monkeypatch.setattr(estado, "_ESPERA_COMMITS", 2.0)
+    compuerta = estado_en_memoria.compuerta
+    entrar, entro = compuerta.entrar_commit, asyncio.Event()
+
+    def entrar_y_seguir():
+        # El commit ya pasó la compuerta y espera su I/O: el loop atiende a la hidratación
+        entrar()
+        entro.set()
+        await_only(asyncio.sleep(0.1))
+
+    monkeypatch.setattr(compuerta, "entrar_commit", entrar_y_seguir)
+
+    def escribir(db):
+        ahora = datetime.now(timezone.utc)
+        crud.insertar_lecturas(db, [{"sensor_id": sensor_id, "valor": 10.0, "fecha": ahora}])
+        estado.anotar(db, [(sensor_id, 10.0, ahora)])
+        db.commit()
+
+    async def escenario():
+        async def hidratar():
+            await entro.wait()
+            async with Sesion() as db:
+                await db.run_sync(estado_en_memoria.hidratar)
+
+        async with Sesion() as db:
+            inicio = time.perf_counter()
+            await asyncio.gather(db.run_sync(escribir), hidratar())
+            # Antes la foto esperaba en el loop al commit que solo el loop podía terminar
+            assert time.perf_counter() - inicio < 1.0
+            agregados = await db.run_sync(lambda s: estado_en_memoria.agregados(s, [sensor_id], estado.inicio_ventana()))
+        assert agregados[sensor_id].cantidad == 1
+
+    asyncio.run(escenario())
+    asyncio.run(motor_async.dispose())
@@ -0,0 +1,109 @@
+import asyncio
+
+from backend import eventos, reglas
+from backend.main import app
+
+
+def test_cola_lenta_descarta_lo_mas_viejo():
+    async def escenario():
+        central = eventos.CentralEventos()
+        lenta = central.suscribir(tamanio=2)
+        solo_sector_2 = central.suscribir(sectores=[2])
+        central.publicar([(None, 1, {"n": 1}), (None, 1, {"n": 2}), (None, 2, {"n": 3})])
+        await asyncio.sleep(0)
+
+        assert [e.datos["n"] for e in await lenta.siguientes(1)] == [2, 3]
+        assert [e.datos["n"] for e in await solo_sector_2.siguientes(1)] == [3]
+        assert await solo_sector_2.siguientes(0.01) == []
+        assert central.estadisticas()["descartados"] == 1
+
+        central.desuscribir(lenta)
+        central.desuscribir(solo_sector_2)
+        assert central.estadisticas()["suscriptores"] == 0
+
+    asyncio.run(escenario())
+
+
+def test_transiciones_al_guardar_lecturas(authorized_client, sector_con_sensores):
+    norte, (termometro_norte,) = sector_con_sensores(authorized_client, "Norte")
+    _, (termometro_sur,) = sector_con_sensores(authorized_client, "Sur")
+
+    async def escenario():
+        todas = eventos.central.suscribir()
+        solo_norte = eventos.central.suscribir(sectores=[norte])
+
+        def escribir():
+            # Sin cambio de estado no se publica nada
+            authorized_client.post("/lecturas/", json={"sensor_id": termometro_norte, "valor": 20.0})
+            authorized_client.post("/lecturas/batch", json=[
+                {"sensor_id": termometro_norte, "valor": 1.0},
+                {"sensor_id": termometro_sur, "valor": 50.0},
+            ])
+            authorized_client.post("/lecturas/", json={"sensor_id": termometro_norte, "valor": 1.5})
+            authorized_client.post("/lecturas/", json={"sensor_id": termometro_norte, "valor": 20.0})
+        await asyncio.to_thread(escribir)
+        await asyncio.sleep(0)
+
+        recibidos = [(e.datos["sensor"], e.datos["estado"], e.datos["tipo_alerta"]) for e in await todas.siguientes(1)]
+        assert recibidos == [
+            ("Temperatura Norte", "activa", "Peligro de Helada"),
+            ("Temperatura Sur", "activa", "Alta Temperatura"),
+            ("Temperatura Norte", "resuelta", "Peligro de Helada"),
+        ]
+        assert [e.datos["sensor_id"] for e in await solo_norte.siguientes(1)] == [termometro_norte] * 2
+        eventos.central.desuscribir(todas)
+        eventos.central.desuscribir(solo_norte)
+
+    asyncio.run(escenario())
+
+
+def test_sin_suscriptores_ni_reglas_con_memoria_no_se_evalua(authorized_client, sector_con_sensores, monkeypatch):
+    sector_id, (termometro,) = sector_con_sensores(authorized_client)
+    motores = []
+    obtener_motor = reglas.obtener_motor
+    monkeypatch.setattr(reglas, "obtener_motor", lambda db, finca_id: motores.append(finca_id) or obtener_motor(db, finca_id))
+
+    authorized_client.post("/lecturas/", json={"sensor_id": termometro, "valor": 1.0})
+    authorized_client.post("/lecturas/batch", json=[{"sensor_id": termometro, "valor": 1.0}])
+    assert motores == []
+
+    # Con una regla con memoria el motor de la finca se arma en la escritura
+    authorized_client.post("/reglas/", json={
+        "sector_id": sector_id, "tipo_sensor": "Temperatura", "alerta": "Peligro de Helada",
+        "operador": "<", "umbral": 2, "duracion_minima_segundos": 600
+    })
+    authorized_client.post("/lecturas/", json={"sensor_id": termometro, "valor": 1.0})
+    assert motores
+
+
+def test_endpoint_sse(authorized_client, monkeypatch):
+    # TestClient junta todo el cuerpo antes de devolverlo: con un stream infinito
+    # hay que hablar ASGI directo y desconectar a mano
+    monkeypatch.setattr(eventos, "EVENTOS_KEEPALIVE_SEGUNDOS", 0.01)
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": "/monitoreo/alertas/stream",
+        "raw_path": b"/monitoreo/alertas/stream", "query_string": b"sector_id=1&sector_id=2", "root_path": "",
+        "headers": [(b"authorization", authorized_client.headers["Authorization"].encode())],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+
+    async def escenario():
+        mensajes, desconectado = [], asyncio.Event()
+
+        async def receive():
+            await desconectado.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(mensaje):
+            mensajes.append(mensaje)
+            if len(mensajes) == 3:  # encabezados + retry + un keepalive
+                desconectado.set()
+
+        await asyncio.wait_for(app(scope, receive, send), 5)
+        return mensajes
+
+    inicio, retry, keepalive = asyncio.run(escenario())[:3]
+    assert dict(inicio["headers"])[b"content-type"].startswith(b"text/event-stream")
+    assert retry["body"] == b"retry: 5000\n\n"
+    assert keepalive["body"] == b": keepalive\n\n"
+    assert eventos.central.suscriptores == 0
@@ -0,0 +1,116 @@
+import pytest
+
+from backend import dependencies, estado, respuestas
+from backend.auth import crear_access_token
+from backend.models_db import SectorDB, UserDB
+
+
+def _como(client, username):
+    client.headers["Authorization"] = f"Bearer {crear_access_token(data={'sub': username})}"
+    return client
+
+
+@pytest.fixture(params=[False, True], ids=["desde_db", "en_memoria"])
+def dos_fincas(request, authorized_client, db_session, monkeypatch):
+    """testuser en la finca Norte (con un sector con termómetro) y otro en Sur. Devuelve el cliente."""
+    monkeypatch.setattr(estado, "ESTADO_EN_MEMORIA", request.param)
+    monkeypatch.setattr(estado, "ESTADO_VERIFICAR", request.param)
+    estado.estado_actual.reiniciar()
+    db_session.add(UserDB(username="otro", hashed_password="fakehash"))
+    db_session.commit()
+
+    for nombre, username in (("Norte", "testuser"), ("Sur", "otro")):
+        finca = authorized_client.post("/fincas/", json={"nombre": nombre}).json()
+        asignado = authorized_client.put(f"/fincas/{finca['id']}/usuarios/{username}")
+        assert asignado.json()["finca_id"] == finca["id"]
+    yield authorized_client
+    estado.estado_actual.reiniciar()
+
+
+def test_cada_finca_ve_solo_lo_suyo(dos_fincas, sector_con_sensores):
+    client = _como(dos_fincas, "testuser")
+    sector_norte, (termometro_norte,) = sector_con_sensores(client, "Norte 1")
+    client.post("/lecturas/batch", json=[{"sensor_id": termometro_norte, "valor": 50.0}])
+    assert client.get("/monitoreo/alertas").json()["total_alertas"] == 1
+
+    client = _como(dos_fincas, "otro")
+    assert client.get("/sectores/").json() == []
+    assert client.get("/sensores/").json() == []
+    assert client.get("/monitoreo/alertas").json()["total_alertas"] == 0
+    assert client.get(f"/monitoreo/{sector_norte}").status_code == 404
+    assert client.get(f"/sensores/{termometro_norte}").status_code == 404
+    assert client.get(f"/sensores/{termometro_norte}/lecturas").json() == []
+    assert client.get(f"/sensores/{termometro_norte}/serie").status_code == 404
+    assert client.patch(f"/sectores/{sector_norte}", json={"nombre": "Mío"}).status_code == 404
+    assert client.post("/sensores/", json={
+        "nombre": "Intruso", "tipo": "Humedad", "marca": "M", "modelo": "X", "sector_id": sector_norte
+    }).status_code == 404
+    lote = client.post("/lecturas/batch", json=[{"sensor_id": termometro_norte, "valor": -5.0}]).json()
+    assert lote["rechazadas"] == 1
+
+    # Una regla global de Sur no cambia las alertas de Norte
+    client.post("/reglas/", json={"tipo_sensor": "Temperatura", "alerta": "Alta Temperatura", "operador": ">", "umbral": 99})
+    _, (termometro_sur,) = sector_con_sensores(client, "Sur 1")
+    client.post("/lecturas/batch", json=[{"sensor_id": termometro_sur, "valor": 50.0}])
+    assert client.get("/monitoreo/alertas").json()["total_alertas"] == 0
+
+    client = _como(dos_fincas, "testuser")
+    assert [s["id"] for s in client.get("/sectores/").json()] == [sector_norte]
+    assert client.get("/reglas/").json() == []
+    assert client.get("/monitoreo/alertas").json()["total_alertas"] == 1
+
+
+def test_cache_separada_por_finca(dos_fincas, sector_con_sensores):
+    client = _como(dos_fincas, "testuser")
+    sector_con_sensores(client, "Norte 1")
+    assert client.get("/sectores/").headers["X-Cache"] == "MISS"
+
+    client = _como(dos_fincas, "otro")
+    respuesta = client.get("/sectores/")
+    assert respuesta.headers["X-Cache"] == "MISS" and respuesta.json() == []
+    # Escribir en Sur no invalida lo cacheado de Norte
+    sector_con_sensores(client, "Sur 1")
+
+    client = _como(dos_fincas, "testuser")
+    assert client.get("/sectores/").headers["X-Cache"] == "HIT"
+
+
+def test_mover_un_sector_invalida_el_mapa_de_todos_los_procesos(dos_fincas, db_session, sector_con_sensores):
+    client = _como(dos_fincas, "testuser")
+    sector_id, (termometro,) = sector_con_sensores(client, "Norte 1")
+    norte = db_session.get(SectorDB, sector_id).finca_id
+    sur = db_session.query(UserDB).filter(UserDB.username == "otro").one().finca_id
+
+    db_session.get(SectorDB, sector_id).finca_id = sur
+    db_session.commit()
+    # Como si otro worker todavía lo tuviera resuelto a Norte
+    respuestas._finca_de_sector[sector_id] = norte
+
+    client = _como(dos_fincas, "otro")
+    assert [s["id"] for s in client.get("/sectores/").json()] == [sector_id]
+    assert client.get("/sectores/").headers["X-Cache"] == "HIT"
+    client.post("/lecturas/batch", json=[{"sensor_id": termometro, "valor": 20.0}])
+    assert client.get("/sectores/").headers["X-Cache"] == "MISS"
+
+
+def test_usuario_registrado_sin_finca_no_ve_nada(client, authorized_client):
+    # authorized_client: testuser es administrador
+    admin = dict(authorized_client.headers)
+    finca = authorized_client.post("/fincas/", json={"nombre": "Norte"}).json()
+    client.post("/sectores/", json={"nombre": "Legado", "humedad_minima": 30})
+
+    assert client.post("/usuarios/", json={"username": "nuevo", "password": "secreta"}).status_code == 201
+    _como(client, "nuevo")
+    assert client.get("/sectores/").status_code == 403
+    assert client.get("/sensores/").status_code == 403
+
+    client.headers = admin
+    client.put(f"/fincas/{finca['id']}/usuarios/nuevo")
+    _como(client, "nuevo")
+    assert client.get("/sectores/").json() == []
+
+
+def test_fincas_solo_para_admins(authorized_client, monkeypatch):
+    monkeypatch.setattr(dependencies, "ADMIN_USUARIOS", set())
+    assert authorized_client.post("/fincas/", json={"nombre": "Norte"}).status_code == 403
+    assert authorized_client.get("/fincas/").status_code == 403
@@ -0,0 +1,91 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend import ingesta
+from backend.models_db import LecturaDB
+
+
+@pytest.fixture
+def cola(tmp_path, monkeypatch):
+    """Ingesta asíncrona con el log en tmp_path; el escritor se corre a mano con vaciar()."""
+    nueva = ingesta.ColaIngesta(str(tmp_path), maximo=5, lote=2, intervalo_ms=10, segmento=3, fsync=False)
+    monkeypatch.setattr(ingesta, "INGESTA_ASINCRONA", True)
+    monkeypatch.setattr(ingesta, "cola", nueva)
+    return nueva
+
+
+def test_acepta_y_escribe_despues(authorized_client, db_session, cola, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+
+    respuesta = authorized_client.post("/lecturas/batch", json=[
+        {"valor": 10.0, "sensor_id": sensor_id},
+        {"valor": 11.0, "sensor_id": 9999},
+        {"valor": 12.0, "sensor_id": sensor_id, "fecha": "2026-01-01T12:00:00Z"},
+    ])
+    assert respuesta.status_code == 202
+    assert respuesta.json()["aceptadas"] == 2
+    individual = authorized_client.post("/lecturas/", json={"valor": 13.0, "sensor_id": sensor_id})
+    assert individual.status_code == 202
+    assert individual.json()["sensor_id"] == sensor_id
+    assert authorized_client.post("/lecturas/", json={"valor": 1.0, "sensor_id": 9999}).status_code == 404
+
+    # Todavía en la cola: la DB no se tocó
+    assert db_session.query(LecturaDB).count() == 0
+    assert cola.estadisticas()["profundidad"] == 3
+
+    cola.vaciar(sessionmaker(bind=db_session.get_bind()))
+    assert sorted(l.valor for l in db_session.query(LecturaDB)) == [10.0, 12.0, 13.0]
+    metricas = authorized_client.get("/metricas/").json()["ingesta"]
+    assert metricas["profundidad"] == 0 and metricas["escritas"] == 3 and metricas["lotes"] == 2
+    # Todo confirmado: al cerrar no queda nada para reproducir
+    assert cola.estadisticas()["segmentos"] <= 1
+    cola.cerrar()
+    assert ingesta.ColaIngesta(cola.directorio, 5, 2, 10, 3, False).reproducir() == 0
+
+
+def test_cola_llena_responde_503(authorized_client, cola, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    lote = [{"valor": float(i), "sensor_id": sensor_id} for i in range(4)]
+    assert authorized_client.post("/lecturas/batch", json=lote).status_code == 202
+    assert authorized_client.post("/lecturas/batch", json=lote).status_code == 503
+    assert cola.estadisticas()["rechazadas"] == 4
+
+
+def test_reproduce_el_log_tras_una_caida(authorized_client, db_session, cola, tmp_path, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    ahora = datetime.now(timezone.utc)
+    cola.encolar([(sensor_id, float(i), ahora) for i in range(3)])
+    cola.encolar([(sensor_id, 3.0, ahora)])  # segmento lleno: abre el segundo
+    assert len(list(tmp_path.glob("proceso-*/segmento-*.jsonl"))) == 2
+    # Línea a medio escribir cuando se cayó el proceso: se ignora
+    with open(os.path.join(cola.propio, "segmento-00000002.jsonl"), "a") as archivo:
+        archivo.write('[1, 99.0, "2026')
+
+    # Otro worker vivo no toca el log de este
+    vecina = ingesta.ColaIngesta(str(tmp_path), maximo=100, lote=10, intervalo_ms=10, segmento=3, fsync=False)
+    assert vecina.reproducir() == 0
+    vecina.vaciar(sessionmaker(bind=db_session.get_bind()))
+    assert len(list(tmp_path.glob("proceso-*/segmento-*.jsonl"))) == 2
+
+    # "Caída": se suelta la carpeta con lecturas pendientes y un worker nuevo la adopta
+    cola.cerrar()
+    nueva = ingesta.ColaIngesta(str(tmp_path), maximo=100, lote=10, intervalo_ms=10, segmento=3, fsync=False)
+    assert nueva.reproducir() == 4
+    assert vecina.reproducir() == 0
+    nueva.vaciar(sessionmaker(bind=db_session.get_bind()))
+    assert sorted(l.valor for l in db_session.query(LecturaDB)) == [0.0, 1.0, 2.0, 3.0]
+    assert not list(tmp_path.rglob("segmento-*.jsonl"))
+
+
+def test_al_detener_espera_al_escritor(authorized_client, db_session, cola, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    detener = cola.iniciar(sessionmaker(bind=db_session.get_bind()))
+    cola.encolar([(sensor_id, 1.0, datetime.now(timezone.utc))])
+    detener.set()
+    assert cola.esperar(5)
+    assert db_session.query(LecturaDB).count() == 1
+    # Todo escrito: la carpeta del proceso se borra al cerrar
+    assert cola.propio is None and os.listdir(cola.directorio) == [".recuperacion.lock"]
@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from backend import instrumentacion
+from backend.models_db import SensorDB
+from backend.respuestas import cache_respuestas
+
+# Statements por request, sin importar cuántos sectores/sensores haya (con la caché de usuario y el motor de reglas calientes)
+TOPES = {
+    "/sectores/": 2,
+    "/monitoreo/alertas": 2,
+    "/monitoreo/{sector_id}": 2,
+    "/sensores/": 3,
+    "/sensores/?include=lecturas": 4,
+    "/sensores/{sensor_id}": 2,
+    "/sensores/{sensor_id}/lecturas": 1,
+}
+
+
+@pytest.mark.parametrize("sectores", [1, 8])
+def test_sin_n_mas_uno(authorized_client, db_session, max_consultas, sembrar_flota, sectores):
+    sensor_id = sembrar_flota(sensores=3, lecturas_por_sensor=1, sectores=sectores)[-1]
+    sector_id = db_session.get(SensorDB, sensor_id).sector_id
+    for plantilla, maximo in TOPES.items():
+        ruta = plantilla.format(sector_id=sector_id, sensor_id=sensor_id)
+        authorized_client.get(ruta)  # calentamiento
+        cache_respuestas.limpiar()
+        respuesta = max_consultas(authorized_client.get(ruta), maximo)
+        assert respuesta.status_code == 200
+
+
+def test_headers_filas_y_objetos(authorized_client, sembrar_flota, monkeypatch):
+    sensor_id = sembrar_flota(sensores=3, lecturas_por_sensor=1)[0]
+    ruta = f"/sensores/{sensor_id}"
+    assert "X-DB-Consultas" not in authorized_client.get(ruta).headers
+
+    monkeypatch.setattr(instrumentacion, "AGROTECH_DEBUG", True)
+    headers = authorized_client.get(ruta).headers
+    # El sensor y su lectura, como filas y como objetos ORM
+    assert headers["X-DB-Consultas"] == "2"
+    assert headers["X-DB-Filas"] == "2" and headers["X-ORM-Objetos"] == "2"
+    assert float(headers["X-DB-Tiempo-Ms"]) > 0
+
+
+def test_prometheus_y_consultas_lentas(authorized_client, sembrar_flota, monkeypatch, caplog):
+    sembrar_flota(sensores=3, lecturas_por_sensor=1, sectores=2)
+    instrumentacion.registro.reiniciar()
+    monkeypatch.setattr(instrumentacion, "CONSULTA_LENTA_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="backend.instrumentacion"):
+        assert authorized_client.get("/sectores/").status_code == 200
+    assert any("Consulta lenta" in r.getMessage() and "en /sectores/" in r.getMessage() for r in caplog.records)
+
+    texto = authorized_client.get("/metricas/prometheus").text
+    assert '# TYPE agrotech_db_consultas_total counter' in texto
+    assert 'agrotech_http_requests_total{metodo="GET",ruta="/sectores/",status="200"} 1' in texto
+    assert 'agrotech_db_consultas_max{metodo="GET",ruta="/sectores/"}' in texto
+    assert "agrotech_db_consultas_lentas_total" in texto
+    # Los contadores de GET /metricas/ también salen, aplanados
+    assert "agrotech_instrumentacion_requests" in texto
+
+
+def test_statement_fallido_no_deja_inicios_colgados(db_session):
+    with db_session.get_bind().connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql("SELECT * FROM no_existe")
+        assert not conn.info.get("inicio_consulta")
+        # La conexión sigue midiendo bien después de los errores
+        assert conn.exec_driver_sql("SELECT 1").scalar() == 1
@@ -0,0 +1,93 @@
+def test_lote_acepta_y_rechaza_por_item(authorized_client, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+
+    response = authorized_client.post("/lecturas/batch", json=[
+        {"valor": 10.0, "sensor_id": sensor_id},
+        {"valor": 11.0, "sensor_id": 9999},
+        {"valor": 12.0, "sensor_id": sensor_id, "fecha": "2026-01-01T12:00:00Z"},
+    ])
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["aceptadas"] == 2
+    assert data["rechazadas"] == 1
+    assert [r["aceptada"] for r in data["resultados"]] == [True, False, True]
+    assert data["resultados"][1]["error"] == "El sensor no existe"
+
+    historial = authorized_client.get(f"/sensores/{sensor_id}/lecturas").json()
+    assert sorted(l["valor"] for l in historial) == [10.0, 12.0]
+
+
+def test_lote_respeta_limite(authorized_client, monkeypatch, sector_con_sensores):
+    from backend.routers import sensores
+    monkeypatch.setattr(sensores, "MAX_LECTURAS_POR_LOTE", 2)
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+
+    lote = [{"valor": 1.0, "sensor_id": sensor_id}] * 3
+    response = authorized_client.post("/lecturas/batch", json=lote)
+    assert response.status_code == 413
+
+    assert authorized_client.post("/lecturas/batch", json=[]).status_code == 400
+
+
+def _cargar_historial(client, sensor_id, cantidad):
+    from datetime import datetime, timedelta, timezone
+    base = datetime(2026, 5, 1, tzinfo=timezone.utc)
+    lote = [
+        {"valor": float(i), "sensor_id": sensor_id, "fecha": (base + timedelta(minutes=i)).isoformat()}
+        for i in range(cantidad)
+    ]
+    assert client.post("/lecturas/batch", json=lote).json()["aceptadas"] == cantidad
+
+
+def test_historial_paginado_por_cursor(authorized_client, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    _cargar_historial(authorized_client, sensor_id, 25)
+
+    valores, cursor, paginas = [], None, 0
+    while True:
+        params = {"limite": 10}
+        if cursor:
+            params["cursor"] = cursor
+        response = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params=params)
+        valores += [l["valor"] for l in response.json()]
+        paginas += 1
+        cursor = response.headers.get("X-Siguiente-Cursor")
+        if not cursor:
+            break
+
+    assert paginas == 3
+    assert valores == [float(i) for i in range(25)]
+
+
+def test_historial_rango_y_submuestreo(authorized_client, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    _cargar_historial(authorized_client, sensor_id, 30)
+
+    response = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={
+        "desde": "2026-05-01T00:10:00Z",
+        "hasta": "2026-05-01T00:20:00Z",
+    })
+    assert [l["valor"] for l in response.json()] == [float(i) for i in range(10, 20)]
+
+    response = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"cada": 10})
+    assert [l["valor"] for l in response.json()] == [9.0, 19.0, 29.0]
+
+    assert authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"cursor": "basura"}).status_code == 400
+
+
+def test_historial_exportacion_streaming(authorized_client, sector_con_sensores):
+    import json
+    _, (sensor_id,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    _cargar_historial(authorized_client, sensor_id, 1500)
+
+    response = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"formato": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lineas = response.text.strip().split("\n")
+    assert len(lineas) == 1500
+    assert json.loads(lineas[-1])["valor"] == 1499.0
+
+    response = authorized_client.get(f"/sensores/{sensor_id}/lecturas", params={"formato": "csv"})
+    filas = response.text.strip().split("\n")
+    assert filas[0] == "id,valor,fecha,sensor_id"
+    assert len(filas) == 1501
@@ -0,0 +1,7 @@
+from backend.logic import TIPO_HUMEDAD, TIPO_OTRO, TIPO_TEMPERATURA, codigo_tipo
+
+
+def test_codigo_tipo_ignora_mayusculas():
+    assert codigo_tipo("HUMEDAD") == TIPO_HUMEDAD
+    assert codigo_tipo("Temperatura") == TIPO_TEMPERATURA
+    assert codigo_tipo("Viento") == TIPO_OTRO
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.models_db import LecturaDB
+
+
+def test_alertas_usa_la_ultima_lectura(authorized_client, db_session, sector_con_sensores):
+    _, (sensor_id,) = sector_con_sensores(authorized_client)
+    ahora = datetime.now(timezone.utc)
+    # La más vieja dispara alerta, la más nueva no: manda la nueva
+    db_session.add_all([
+        LecturaDB(sensor_id=sensor_id, valor=45.0, fecha=ahora - timedelta(hours=2)),
+        LecturaDB(sensor_id=sensor_id, valor=20.0, fecha=ahora - timedelta(minutes=5)),
+    ])
+    db_session.commit()
+    assert authorized_client.get("/monitoreo/alertas").json()["total_alertas"] == 0
+
+    db_session.add(LecturaDB(sensor_id=sensor_id, valor=1.0, fecha=ahora - timedelta(minutes=1)))
+    db_session.commit()
+    data = authorized_client.get("/monitoreo/alertas").json()
+    assert data["total_alertas"] == 1
+    assert data["detalles"][0]["tipo_alerta"] == "Peligro de Helada"
+    assert data["detalles"][0]["valor_actual"] == "1.0°C"
+
+
+def test_monitorear_sector_promedia_y_cuenta_en_la_db(authorized_client, sector_con_sensores):
+    sector_id, (sensor_id,) = sector_con_sensores(authorized_client)
+    ahora = datetime.now(timezone.utc)
+    lote = [
+        {"sensor_id": sensor_id, "valor": valor, "fecha": (ahora - timedelta(minutes=minutos)).isoformat()}
+        for valor, minutos in ((38.0, 30), (40.0, 20), (42.0, 10))
+    ]
+    # Fuera de la ventana de 24h: no cuenta
+    lote.append({"sensor_id": sensor_id, "valor": -50.0, "fecha": (ahora - timedelta(days=2)).isoformat()})
+    assert authorized_client.post("/lecturas/batch", json=lote).json()["aceptadas"] == 4
+
+    data = authorized_client.get(f"/monitoreo/{sector_id}").json()
+    assert data["total_lecturas_24h"] == 3
+    assert data["estado"] == "CRÍTICO - Alta Temperatura (40.0°C)"
@@ -0,0 +1,70 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from backend import particiones
+from backend.models_db import LecturaDB, SectorDB, SensorDB
+
+
+def test_fallback_sqlite_mueve_meses_viejos(db_session):
+    sector = SectorDB(nombre="Sector", humedad_minima=30)
+    sector.sensores = [SensorDB(nombre="S1", tipo="Humedad", marca="M", modelo="X")]
+    db_session.add(sector)
+    db_session.commit()
+    sensor_id = sector.sensores[0].id
+
+    for mes in (1, 2, 3):
+        db_session.add(LecturaDB(valor=float(mes), sensor_id=sensor_id,
+                                 fecha=datetime(2026, mes, 15, tzinfo=timezone.utc)))
+    db_session.commit()
+
+    desprendidas = particiones.desprender_particiones(db_session.connection(), date(2026, 3, 1))
+    db_session.commit()
+
+    assert desprendidas == ["lecturas_2026_01", "lecturas_2026_02"]
+    assert [l.valor for l in db_session.query(LecturaDB).all()] == [3.0]
+    assert db_session.execute(text("SELECT valor FROM lecturas_2026_01")).scalars().all() == [1.0]
+
+    for nombre in desprendidas:
+        db_session.execute(text(f"DROP TABLE {nombre}"))
+    db_session.commit()
+
+
+class _ConexionPostgres:
+    """Registra el SQL que recibiría PostgreSQL; responde a los SELECT de control."""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self, existentes, default_con_filas):
+        self.existentes = existentes
+        self.default_con_filas = default_con_filas
+        self.sentencias = []
+
+    def execute(self, sentencia, parametros=None):
+        sql = " ".join(str(sentencia).split())
+        self.sentencias.append(sql)
+        if "to_regclass('lecturas_default')" in sql:
+            valor = True
+        elif "to_regclass(:nombre)" in sql:
+            valor = parametros["nombre"] in self.existentes
+        elif sql.startswith("SELECT EXISTS"):
+            valor = parametros["desde"] in self.default_con_filas
+        else:
+            valor = None
+        return type("Resultado", (), {"scalar": lambda _: valor, "rowcount": 3})()
+
+
+def test_crear_particion_saca_sus_filas_de_la_default():
+    conn = _ConexionPostgres(existentes={"lecturas_2026_03"}, default_con_filas={"2026-04-01"})
+    particiones.crear_particiones(conn, date(2026, 3, 20), 2)
+
+    ddl = [s for s in conn.sentencias if not s.startswith("SELECT")]
+    assert ddl == [
+        "ALTER TABLE lecturas DETACH PARTITION lecturas_default",
+        "CREATE TABLE lecturas_2026_04 PARTITION OF lecturas FOR VALUES FROM ('2026-04-01') TO ('2026-05-01')",
+        "INSERT INTO lecturas_2026_04 SELECT * FROM lecturas_default WHERE fecha >= :desde AND fecha < :hasta",
+        "DELETE FROM lecturas_default WHERE fecha >= :desde AND fecha < :hasta",
+        "ALTER TABLE lecturas ATTACH PARTITION lecturas_default DEFAULT",
+        "CREATE TABLE lecturas_2026_05 PARTITION OF lecturas FOR VALUES FROM ('2026-05-01') TO ('2026-06-01')",
+    ]
@@ -0,0 +1,80 @@
+import cProfile
+
+import pytest
+
+from backend import dependencies, perfilado
+from backend.models_db import SectorDB, SensorDB
+
+
+@pytest.fixture
+def muestrear_todo(db_session, monkeypatch):
+    sector = SectorDB(nombre="Sector Perfil", humedad_minima=30, temp_maxima=40)
+    sector.sensores = [SensorDB(nombre=f"S{i}", tipo="Humedad", marca="M", modelo="X") for i in range(3)]
+    db_session.add(sector)
+    db_session.commit()
+    monkeypatch.setattr(perfilado, "PERFIL_MUESTREO", 1.0)
+    perfilado.registro.limpiar()
+    yield
+    perfilado.registro.limpiar()
+
+
+def test_fases_por_request(authorized_client, muestrear_todo):
+    assert authorized_client.get("/sectores/").status_code == 200
+    datos = authorized_client.get("/metricas/perfiles", params={"ruta": "/sectores/"}).json()
+
+    assert datos["muestreados"] >= 1
+    perfil = datos["perfiles"][0]
+    assert perfil["metodo"] == "GET" and perfil["status"] == 200 and perfil["consultas"] >= 2
+    fases = perfil["fases_ms"]
+    assert set(fases) == {"db", "computo", "serializacion", "otros"}
+    assert fases["db"] > 0 and fases["serializacion"] > 0
+    assert sum(fases.values()) == pytest.approx(perfil["total_ms"], abs=0.05)
+    assert "funciones" not in perfil
+    assert datos["resumen"]["GET /sectores/"]["muestras"] == 1
+
+
+def test_cprofile_incluye_hilos_de_acceso_a_datos(authorized_client, muestrear_todo, monkeypatch):
+    monkeypatch.setattr(perfilado, "PERFIL_CPROFILE", True)
+    authorized_client.get("/sectores/")
+    perfil = perfilado.registro.ultimos("/sectores/")[0]
+    # _listar_sectores corre en el threadpool vía ejecutar: igual aparece
+    assert any("_listar_sectores" in f["funcion"] for f in perfil["funciones"])
+    assert len(perfil["funciones"]) <= perfilado.PERFIL_FUNCIONES
+
+
+class _PerfiladorOcupado(cProfile.Profile):
+    """Como en 3.12+ con otra herramienta en sys.monitoring."""
+
+    def enable(self, *args, **kwargs):
+        raise ValueError("Another profiling tool is already active")
+
+
+def test_cprofile_ocupado_no_rompe_el_request(authorized_client, muestrear_todo, monkeypatch):
+    monkeypatch.setattr(perfilado, "PERFIL_CPROFILE", True)
+    monkeypatch.setattr(perfilado.cProfile, "Profile", _PerfiladorOcupado)
+    assert authorized_client.get("/sectores/").status_code == 200
+    perfil = perfilado.registro.ultimos("/sectores/")[0]
+    assert "funciones" not in perfil and perfil["fases_ms"]["db"] > 0
+    # El lock quedó libre para el próximo request
+    assert perfilado._cprofile_libre.acquire(blocking=False)
+    perfilado._cprofile_libre.release()
+
+    # En los hilos: la función corre igual, sin perfilador propio
+    perfil = perfilado.Perfil(cProfile.Profile())
+    token = perfilado._actual.set(perfil)
+    try:
+        assert perfilado.en_hilo(lambda x: x * 2, 21) == 42
+        monkeypatch.setattr(perfilado, "_CPROFILE_POR_HILO", False)
+        assert perfilado.en_hilo(lambda x: x * 2, 21) == 42
+    finally:
+        perfilado._actual.reset(token)
+    assert perfil.cprofiles_hilos == []
+
+
+def test_sin_muestreo_y_solo_admins(authorized_client, muestrear_todo, monkeypatch):
+    monkeypatch.setattr(perfilado, "PERFIL_MUESTREO", 0.0)
+    authorized_client.get("/sectores/")
+    assert perfilado.registro.estadisticas()["muestreados"] == 0
+
+    monkeypatch.setattr(dependencies, "ADMIN_USUARIOS", set())
+    assert authorized_client.get("/metricas/perfiles").status_code == 403
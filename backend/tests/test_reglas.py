@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from backend.logic import TIPO_HUMEDAD, TIPO_OTRO, TIPO_TEMPERATURA
+from backend.reglas import compilar
+
+
+def _leer(client, sensor_id, valor, hace_minutos=0):
+    fecha = datetime.now(timezone.utc) - timedelta(minutes=hace_minutos)
+    client.post("/lecturas/batch", json=[{"sensor_id": sensor_id, "valor": valor, "fecha": fecha.isoformat()}])
+
+
+def _alertas(client):
+    return {d["sensor"]: d for d in client.get("/monitoreo/alertas").json()["detalles"]}
+
+
+def test_reglas_por_defecto_por_columnas():
+    motor = compilar([
+        SimpleNamespace(id=1, humedad_minima=30, temp_maxima=40, cultivo=None),
+        SimpleNamespace(id=2, humedad_minima=30, temp_maxima=0.5, cultivo=None),  # umbral absurdo
+    ], [])
+    codigos = motor.evaluar(
+        [1, 1, 1, 1, 1, 1, 2, 99],
+        [TIPO_HUMEDAD, TIPO_HUMEDAD, TIPO_TEMPERATURA, TIPO_TEMPERATURA, TIPO_TEMPERATURA, TIPO_OTRO,
+         TIPO_TEMPERATURA, TIPO_TEMPERATURA],
+        [10.0, 30.0, 45.0, 1.9, 2.0, -50.0, 1.0, 1.0],
+    )
+    # Alta temperatura gana a la helada; un sector desconocido solo tiene las de umbral fijo
+    assert [motor.regla(c).alerta if c else None for c in codigos] == [
+        "Baja Humedad (Sequía)", None, "Alta Temperatura", "Peligro de Helada", None, None,
+        "Alta Temperatura", "Peligro de Helada",
+    ]
+
+
+def test_regla_de_helada_por_cultivo(authorized_client, sector_con_sensores):
+    _, (vid,) = sector_con_sensores(authorized_client, "Viñedo", temp_maxima=40, cultivo="Vid")
+    _, (olivo,) = sector_con_sensores(authorized_client, "Olivar", temp_maxima=40, cultivo="Olivo")
+    _leer(authorized_client, vid, 3.0)
+    _leer(authorized_client, olivo, 3.0)
+    assert _alertas(authorized_client) == {}
+
+    # La vid se hiela antes: reemplaza a la regla por defecto (< 2 °C) solo para ese cultivo
+    respuesta = authorized_client.post("/reglas/", json={
+        "cultivo": "vid", "tipo_sensor": "Temperatura", "alerta": "Peligro de Helada",
+        "operador": "<", "umbral": 4.0, "severidad": "advertencia"
+    })
+    assert respuesta.status_code == 201
+
+    alertas = _alertas(authorized_client)
+    assert list(alertas) == ["Temperatura Viñedo"]
+    assert alertas["Temperatura Viñedo"]["severidad"] == "advertencia"
+
+    sector_id = authorized_client.get("/sectores/").json()[0]["id"]
+    assert authorized_client.get(f"/monitoreo/{sector_id}").json()["estado"] == "ADVERTENCIA - Peligro de Helada (3.0°C)"
+
+    # Sin cambios no se recompila en cada consulta
+    compilaciones = authorized_client.get("/metricas/").json()["reglas"]["compilaciones"]
+    _alertas(authorized_client)
+    assert authorized_client.get("/metricas/").json()["reglas"]["compilaciones"] == compilaciones
+
+    authorized_client.delete(f"/reglas/{respuesta.json()['id']}")
+    assert _alertas(authorized_client) == {}
+
+
+def test_histeresis_y_duracion_minima(authorized_client, sector_con_sensores):
+    sector_id, (sensor,) = sector_con_sensores(authorized_client, "Lote Sur", tipos=("Humedad",), temp_maxima=40)
+    authorized_client.post("/reglas/", json={
+        "sector_id": sector_id, "tipo_sensor": "Humedad", "alerta": "Baja Humedad (Sequía)",
+        "operador": "<", "umbral": 30, "histeresis": 5, "duracion_minima_segundos": 600
+    })
+
+    _leer(authorized_client, sensor, 20.0, hace_minutos=30)
+    assert _alertas(authorized_client) == {}  # recién empieza: falta la duración mínima
+    _leer(authorized_client, sensor, 22.0, hace_minutos=15)
+    assert "Humedad Lote Sur" in _alertas(authorized_client)
+
+    _leer(authorized_client, sensor, 33.0, hace_minutos=10)
+    assert "Humedad Lote Sur" in _alertas(authorized_client)  # dentro de la histéresis
+    _leer(authorized_client, sensor, 36.0, hace_minutos=5)
+    assert _alertas(authorized_client) == {}
+
+
+def test_memoria_avanza_con_cada_lectura_registrada(authorized_client, sector_con_sensores):
+    sector_id, (sensor,) = sector_con_sensores(authorized_client, "Lote Sur", tipos=("Humedad",), temp_maxima=40)
+    authorized_client.post("/reglas/", json={
+        "sector_id": sector_id, "tipo_sensor": "Humedad", "alerta": "Baja Humedad (Sequía)",
+        "operador": "<", "umbral": 30, "histeresis": 5, "duracion_minima_segundos": 600
+    })
+
+    # Nadie consulta las alertas entre lecturas: la duración se cuenta desde la primera
+    _leer(authorized_client, sensor, 20.0, hace_minutos=30)
+    _leer(authorized_client, sensor, 22.0, hace_minutos=15)
+    _leer(authorized_client, sensor, 33.0, hace_minutos=10)
+    assert "Humedad Lote Sur" in _alertas(authorized_client)  # activa y dentro de la histéresis
+
+    # Una lectura atrasada no reinicia la memoria
+    _leer(authorized_client, sensor, 50.0, hace_minutos=40)
+    _leer(authorized_client, sensor, 34.0, hace_minutos=5)
+    assert "Humedad Lote Sur" in _alertas(authorized_client)
+
+
+def test_regla_valida_alcance(authorized_client, sector_con_sensores):
+    sector_id, _ = sector_con_sensores(authorized_client, "Norte", temp_maxima=40)
+    regla = {"tipo_sensor": "Temperatura", "alerta": "Calor", "operador": ">", "umbral": 30}
+    assert authorized_client.post("/reglas/", json={**regla, "sector_id": sector_id, "cultivo": "Vid"}).status_code == 400
+    assert authorized_client.post("/reglas/", json={**regla, "sector_id": 999}).status_code == 404
+    assert authorized_client.post("/reglas/", json={**regla, "operador": "=="}).status_code == 422
@@ -0,0 +1,100 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from backend import remuestreo
+from backend.models_db import LecturaDB, SectorDB, SensorDB
+
+
+def test_promedio_minmax_y_brechas():
+    # Una muestra por minuto durante 10 min, silencio de 30 min y 10 min más
+    muestras = [(60.0 * i, float(i)) for i in range(10)] + [(60.0 * i, float(i)) for i in range(40, 50)]
+
+    puntos, brechas = remuestreo.remuestrear(muestras, 0.0, 300.0, remuestreo.PROMEDIO)
+    assert brechas == [(540.0, 2400.0)]
+    assert [p["valor"] for p in puntos] == [2.0, 7.0, None, 42.0, 47.0]
+    assert [p["cantidad"] for p in puntos if p["valor"] is not None] == [5, 5, 5, 5]
+    # El corte va en el medio del silencio
+    assert puntos[2]["fecha"].timestamp() == (540 + 2400) / 2
+
+    puntos, _ = remuestreo.remuestrear(muestras, 0.0, 300.0, remuestreo.MINMAX)
+    assert [(p["minimo"], p["maximo"]) for p in puntos if p["valor"] is not None] == [(0, 4), (5, 9), (40, 44), (45, 49)]
+
+    # Con una brecha más larga que el silencio la línea no se corta
+    _, brechas = remuestreo.remuestrear(muestras, 0.0, 300.0, remuestreo.PROMEDIO, brecha=3600)
+    assert brechas == []
+
+
+def test_brechas_al_principio_y_al_final_de_la_ventana():
+    # Ventana de 0 a 3600 s con muestras solo entre los minutos 20 y 30
+    muestras = [(60.0 * i, float(i)) for i in range(20, 31)]
+
+    puntos, brechas = remuestreo.remuestrear(muestras, 0.0, 300.0, remuestreo.PROMEDIO, hasta=3600.0)
+    assert brechas == [(0.0, 1200.0), (1800.0, 3600.0)]
+    assert puntos[0]["valor"] is None and puntos[0]["fecha"].timestamp() == 600
+    assert puntos[-1]["valor"] is None and puntos[-1]["fecha"].timestamp() == 2700
+    assert all(p["valor"] is not None for p in puntos[1:-1])
+
+    # Silencios más cortos que el umbral no cuentan; sin `hasta` tampoco se miran los bordes
+    _, brechas = remuestreo.remuestrear(muestras, 900.0, 300.0, remuestreo.LTTB, hasta=2100.0)
+    assert brechas == []
+    _, brechas = remuestreo.remuestrear(muestras, 0.0, 300.0, remuestreo.PROMEDIO)
+    assert brechas == []
+
+    # Sin muestras toda la ventana es silencio
+    puntos, brechas = remuestreo.remuestrear([], 0.0, 300.0, remuestreo.MINMAX, hasta=3600.0)
+    assert brechas == [(0.0, 3600.0)]
+    assert [p["valor"] for p in puntos] == [None]
+
+
+def test_lttb_conserva_extremos_y_picos():
+    muestras = [(float(t), math.sin(t / 50)) for t in range(1000)]
+    muestras[537] = (537.0, 25.0)  # pico aislado que el promedio aplanaría
+
+    puntos, _ = remuestreo.remuestrear(muestras, 0.0, 50.0, remuestreo.LTTB, brecha=10)
+    tiempos = [p["fecha"].timestamp() for p in puntos]
+    assert tiempos[0] == 0 and tiempos[-1] == 999
+    assert tiempos == sorted(tiempos)
+    assert 537 in tiempos
+    # Primera y última muestra más una por cada uno de los 20 buckets
+    assert len(puntos) == 22
+    # Siempre muestras reales
+    reales = dict(muestras)
+    assert all(reales[t] == p["valor"] for t, p in zip(tiempos, puntos))
+
+
+def test_endpoint_serie(authorized_client, db_session):
+    sector = SectorDB(nombre="Sector Serie", humedad_minima=30, temp_maxima=40)
+    sector.sensores = [SensorDB(nombre="Sensor Serie", tipo="Humedad", marca="M", modelo="X")]
+    db_session.add(sector)
+    db_session.commit()
+    sensor_id = sector.sensores[0].id
+
+    desde = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    minutos = [m for m in range(120) if not 60 <= m < 90]  # media hora sin reportar
+    db_session.execute(insert(LecturaDB), [
+        {"sensor_id": sensor_id, "valor": float(m), "fecha": desde + timedelta(minutes=m)} for m in minutos
+    ])
+    db_session.commit()
+
+    params = {"desde": desde.isoformat(), "hasta": (desde + timedelta(hours=2)).isoformat(), "puntos": 12}
+    respuesta = authorized_client.get(f"/sensores/{sensor_id}/serie", params=params)
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert datos["paso_segundos"] == 600 and datos["muestras"] == len(minutos)
+    assert [p["valor"] for p in datos["puntos"]] == [4.5, 14.5, 24.5, 34.5, 44.5, 54.5, None, 94.5, 104.5, 114.5]
+    assert len(datos["brechas"]) == 1
+    assert datos["brechas"][0]["desde"].startswith("2026-03-01T00:59:00")
+
+    # Media hora más de ventana sin lecturas: brecha final hasta `hasta`
+    extendida = {**params, "hasta": (desde + timedelta(hours=2, minutes=30)).isoformat()}
+    brechas = authorized_client.get(f"/sensores/{sensor_id}/serie", params=extendida).json()["brechas"]
+    assert len(brechas) == 2
+    assert brechas[1]["desde"].startswith("2026-03-01T01:59:00") and brechas[1]["hasta"].startswith("2026-03-01T02:30:00")
+
+    lttb = authorized_client.get(f"/sensores/{sensor_id}/serie", params={**params, "metodo": "lttb"}).json()
+    assert lttb["puntos"][0]["valor"] == 0.0 and lttb["puntos"][-1]["valor"] == 119.0
+
+    assert authorized_client.get(f"/sensores/{sensor_id}/serie", params={**params, "paso": 0.1}).status_code == 400
+    assert authorized_client.get("/sensores/999999/serie", params=params).status_code == 404
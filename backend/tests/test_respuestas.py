@@ -0,0 +1,125 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from backend import respuestas
+from backend.main import app
+from backend.models import LecturaResponse, SectorListResponse, SensorListado
+
+
+def test_etag_y_304(authorized_client, sector_con_sensores):
+    sector_con_sensores(authorized_client, "Norte")
+    primera = authorized_client.get("/sectores/")
+    assert primera.headers["X-Cache"] == "MISS"
+    segunda = authorized_client.get("/sectores/")
+    assert segunda.headers["X-Cache"] == "HIT"
+    assert segunda.json() == primera.json()
+
+    etag = primera.headers["ETag"]
+    no_modificada = authorized_client.get("/sectores/", headers={"If-None-Match": etag})
+    assert no_modificada.status_code == 304
+    assert no_modificada.content == b""
+    assert authorized_client.get("/metricas/").json()["cache_respuestas"]["no_modificadas"] == 1
+
+    # Lista de ETags, débiles y "*": coincidencia exacta de alguno, no de una parte
+    for cabecera in (f'"otro", {etag}', f"W/{etag}", "*"):
+        assert authorized_client.get("/sectores/", headers={"If-None-Match": cabecera}).status_code == 304
+    for cabecera in (etag[:-3] + '"', f'"x{etag[1:]}', '"otro"'):
+        assert authorized_client.get("/sectores/", headers={"If-None-Match": cabecera}).status_code == 200
+
+
+def test_invalidacion_por_sector(authorized_client, sector_con_sensores):
+    norte, (termometro_norte,) = sector_con_sensores(authorized_client, "Norte")
+    sur, _ = sector_con_sensores(authorized_client, "Sur")
+    for sector_id in (norte, sur):
+        authorized_client.get(f"/monitoreo/{sector_id}")
+    authorized_client.get("/monitoreo/alertas")
+
+    # Una lectura en Norte invalida Norte y las vistas de toda la flota, no Sur
+    authorized_client.post("/lecturas/batch", json=[{"sensor_id": termometro_norte, "valor": 1.0}])
+    norte_resp = authorized_client.get(f"/monitoreo/{norte}")
+    assert norte_resp.headers["X-Cache"] == "MISS"
+    assert norte_resp.json()["estado"].startswith("CRÍTICO")
+    assert authorized_client.get(f"/monitoreo/{sur}").headers["X-Cache"] == "HIT"
+    assert authorized_client.get("/monitoreo/alertas").json()["total_alertas"] == 1
+
+    # Una lectura suelta (insert por ORM) invalida igual
+    authorized_client.get(f"/monitoreo/{norte}")
+    authorized_client.post("/lecturas/", json={"sensor_id": termometro_norte, "valor": 2.0})
+    assert authorized_client.get(f"/monitoreo/{norte}").headers["X-Cache"] == "MISS"
+    assert authorized_client.get(f"/monitoreo/{sur}").headers["X-Cache"] == "HIT"
+
+    # Cambiar una regla invalida todo lo que depende de las reglas
+    authorized_client.post("/reglas/", json={
+        "tipo_sensor": "Temperatura", "alerta": "Peligro de Helada", "operador": "<", "umbral": 0.5
+    })
+    assert authorized_client.get(f"/monitoreo/{sur}").headers["X-Cache"] == "MISS"
+    assert authorized_client.get("/monitoreo/alertas").json()["total_alertas"] == 0
+
+
+def test_lote_rechazado_no_invalida(authorized_client, sector_con_sensores):
+    norte, _ = sector_con_sensores(authorized_client, "Norte")
+    authorized_client.get(f"/monitoreo/{norte}")
+    authorized_client.get("/monitoreo/alertas")
+
+    # Ninguna lectura aceptada: no cambia ninguna versión
+    assert authorized_client.post("/lecturas/batch", json=[{"sensor_id": 999, "valor": 1.0}]).json()["rechazadas"] == 1
+    assert authorized_client.get(f"/monitoreo/{norte}").headers["X-Cache"] == "HIT"
+    assert authorized_client.get("/monitoreo/alertas").headers["X-Cache"] == "HIT"
+
+
+def test_json_rapido_igual_a_pydantic(authorized_client, sector_con_sensores):
+    """Sin validación de salida, el cuerpo tiene que ser exactamente lo que produciría el response_model."""
+    _, (sensor_id,) = sector_con_sensores(authorized_client, "Norte")
+    authorized_client.post("/lecturas/batch", json=[{"sensor_id": sensor_id, "valor": v} for v in (20, 21.5, 23)])
+
+    for ruta, modelo in (
+        ("/sectores/", List[SectorListResponse]),
+        ("/sensores/?include=lecturas", List[SensorListado]),
+        (f"/sensores/{sensor_id}/lecturas", List[LecturaResponse]),
+    ):
+        cuerpo = authorized_client.get(ruta).json()
+        adaptador = TypeAdapter(modelo)
+        assert cuerpo and adaptador.dump_python(adaptador.validate_python(cuerpo), mode="json") == cuerpo, ruta
+
+    fecha = datetime(2026, 3, 1, 12, 30, 0, 250000, tzinfo=timezone.utc)
+    lectura = LecturaResponse(id=1, valor=2, fecha=fecha, sensor_id=3)
+    assert respuestas.a_json({"id": 1, "valor": 2.0, "fecha": fecha, "sensor_id": 3}) == lectura.model_dump_json().encode()
+
+
+def test_a_json_con_escalares_de_numpy():
+    datos = {"f64": np.float64(1.5), "f32": np.float32(0.25), "i64": np.int64(7), "b": np.bool_(True), "lista": [np.int32(1)]}
+    assert json.loads(respuestas.a_json(datos)) == {"f64": 1.5, "f32": 0.25, "i64": 7, "b": True, "lista": [1]}
+
+
+def _referenciados(documento: dict, nodo, nombres: set) -> set:
+    """Nombres de todos los esquemas de components alcanzables desde `nodo`."""
+    if isinstance(nodo, dict):
+        referencia = nodo.get("$ref")
+        if referencia and referencia.rsplit("/", 1)[-1] not in nombres:
+            nombre = referencia.rsplit("/", 1)[-1]
+            nombres.add(nombre)
+            _referenciados(documento, documento["components"]["schemas"][nombre], nombres)
+        for valor in nodo.values():
+            _referenciados(documento, valor, nombres)
+    elif isinstance(nodo, list):
+        for valor in nodo:
+            _referenciados(documento, valor, nombres)
+    return nombres
+
+
+def test_esquema_openapi_conserva_los_modelos():
+    """
+    Operación completa y esquemas alcanzables de los listados que devuelven json_rapido(),
+    contra la foto del documento de antes del cambio (openapi_listados.json).
+    """
+    documento = app.openapi()
+    esperado = json.loads((Path(__file__).parent / "openapi_listados.json").read_text(encoding="utf-8"))
+    operaciones = {ruta: documento["paths"][ruta]["get"] for ruta in esperado["operaciones"]}
+    assert operaciones == esperado["operaciones"]
+    esquemas = {n: documento["components"]["schemas"][n] for n in _referenciados(documento, operaciones, set())}
+    assert esquemas == esperado["esquemas"]
@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+
+from backend import crud, rollups
+from backend.models_db import LecturaDB, LecturaHoraDB, SectorDB, SensorDB
+
+
+def test_tramos_usa_el_rollup_mas_grueso():
+    desde = datetime(2026, 3, 1, 10, 30, 15, tzinfo=timezone.utc)
+    hasta = datetime(2026, 3, 4, 8, 45, 30, tzinfo=timezone.utc)
+
+    partes = rollups.tramos(desde, hasta)
+
+    # Cubren la ventana sin huecos ni solapamientos
+    assert partes[0][1] == desde and partes[-1][2] == hasta
+    assert all(a[2] == b[1] for a, b in zip(partes, partes[1:]))
+    # Días completos salen de lecturas_1d y solo los bordes sub-minuto van a la tabla cruda
+    assert (rollups.LecturaDiaDB, datetime(2026, 3, 2, tzinfo=timezone.utc), datetime(2026, 3, 4, tzinfo=timezone.utc)) in partes
+    crudos = [(inicio, fin) for tabla, inicio, fin in partes if tabla is None]
+    assert all(fin - inicio < timedelta(minutes=1) for inicio, fin in crudos)
+
+
+def test_rollups_coinciden_con_lecturas_crudas(db_session):
+    sector = SectorDB(nombre="Sector", humedad_minima=30)
+    sector.sensores = [SensorDB(nombre=f"S{i}", tipo="Humedad", marca="M", modelo="X") for i in range(3)]
+    db_session.add(sector)
+    db_session.commit()
+    ids = [s.id for s in sector.sensores]
+
+    rnd = random.Random(7)
+    ahora = datetime.now(timezone.utc)
+    filas = [
+        {"sensor_id": rnd.choice(ids), "valor": rnd.uniform(0, 100), "fecha": ahora - timedelta(seconds=rnd.randint(0, 3 * 86400))}
+        for _ in range(2000)
+    ]
+    crud.insertar_lecturas(db_session, filas)
+    db_session.commit()
+
+    desde = ahora - timedelta(hours=30)
+    esperado = {}
+    for f in filas:
+        if desde <= f["fecha"] < ahora:
+            esperado.setdefault(f["sensor_id"], []).append(f["valor"])
+
+    agregados = rollups.agregados_ventana(db_session, ids, desde, ahora)
+    for sensor_id, valores in esperado.items():
+        agregado = agregados[sensor_id]
+        assert agregado.cantidad == len(valores)
+        assert abs(agregado.promedio - sum(valores) / len(valores)) < 1e-9
+        assert (agregado.minimo, agregado.maximo) == (min(valores), max(valores))
+
+
+def test_backfill_reconstruye_desde_crudas(db_session):
+    sector = SectorDB(nombre="Sector", humedad_minima=30)
+    sector.sensores = [SensorDB(nombre="S1", tipo="Humedad", marca="M", modelo="X")]
+    db_session.add(sector)
+    db_session.commit()
+    sensor_id = sector.sensores[0].id
+
+    # Lecturas históricas cargadas por fuera de la API: no tienen rollups
+    base = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+    db_session.execute(insert(LecturaDB), [
+        {"sensor_id": sensor_id, "valor": float(i), "fecha": base + timedelta(minutes=i)} for i in range(120)
+    ])
+    db_session.commit()
+    assert db_session.query(LecturaHoraDB).count() == 0
+
+    procesadas = rollups.reconstruir(db_session, base, base + timedelta(days=1))
+    # Correrlo dos veces no duplica
+    rollups.reconstruir(db_session, base, base + timedelta(days=1))
+
+    assert procesadas == 120
+    horas = db_session.query(LecturaHoraDB).order_by(LecturaHoraDB.inicio).all()
+    assert [h.cantidad for h in horas] == [60, 60]
+    assert horas[1].suma == sum(range(60, 120))
+
+
+def test_borrar_sensor_borra_sus_rollups(db_session):
+    sectores = [SectorDB(nombre=f"Sector {i}", humedad_minima=30) for i in range(2)]
+    for sector in sectores:
+        sector.sensores = [SensorDB(nombre=f"S{i}", tipo="Humedad", marca="M", modelo="X") for i in range(2)]
+    db_session.add_all(sectores)
+    db_session.commit()
+    borrado, queda = (s.id for s in sectores[0].sensores)
+    del_sector = [s.id for s in sectores[1].sensores]
+
+    ahora = datetime.now(timezone.utc)
+    crud.insertar_lecturas(db_session, [
+        {"sensor_id": sensor_id, "valor": 1.0, "fecha": ahora} for sensor_id in (borrado, queda, *del_sector)
+    ])
+    db_session.commit()
+
+    # SQLite no aplica el ON DELETE CASCADE: los borra el evento, también en cascada desde el sector
+    db_session.delete(db_session.get(SensorDB, borrado))
+    db_session.delete(sectores[1])
+    db_session.commit()
+    for tabla, _ in rollups.RESOLUCIONES:
+        assert set(db_session.execute(select(tabla.sensor_id)).scalars()) == {queda}
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from backend import crud
+from backend.models_db import SensorDB
+
+
+def test_crear_sensor_no_trae_historial(authorized_client, sector_con_sensores):
+    sector_id, _ = sector_con_sensores(authorized_client, tipos=())
+    response = authorized_client.post("/sensores/", json={
+        "nombre": "S1", "tipo": "Humedad", "marca": "TestBrand", "modelo": "X1", "sector_id": sector_id
+    })
+    assert response.status_code == 200
+    assert response.json()["lecturas"] == []
+
+
+def test_listado_liviano_con_ultima_lectura_y_conteo(authorized_client, sector_con_sensores):
+    _, (s1, s2) = sector_con_sensores(authorized_client, tipos=("Humedad", "Humedad"))
+
+    ahora = datetime.now(timezone.utc)
+    authorized_client.post("/lecturas/batch", json=[
+        {"sensor_id": s1, "valor": 10.0, "fecha": (ahora - timedelta(days=3)).isoformat()},
+        {"sensor_id": s1, "valor": 20.0, "fecha": (ahora - timedelta(hours=2)).isoformat()},
+        {"sensor_id": s1, "valor": 30.0, "fecha": (ahora - timedelta(hours=1)).isoformat()},
+    ])
+
+    data = authorized_client.get("/sensores/").json()
+    por_id = {s["id"]: s for s in data}
+    assert por_id[s1]["ultima_lectura"]["valor"] == 30.0
+    assert por_id[s1]["lecturas_24h"] == 2
+    assert por_id[s1]["lecturas"] is None
+    assert por_id[s2]["ultima_lectura"] is None
+    assert por_id[s2]["lecturas_24h"] == 0
+
+    data = authorized_client.get("/sensores/", params={"include": "lecturas", "limite_lecturas": 2}).json()
+    por_id = {s["id"]: s for s in data}
+    assert [l["valor"] for l in por_id[s1]["lecturas"]] == [30.0, 20.0]
+    assert por_id[s2]["lecturas"] == []
+
+
+def test_listado_con_lectura_vieja_y_sensor_sin_sector(authorized_client, db_session, sector_con_sensores):
+    _, (viejo,) = sector_con_sensores(authorized_client, tipos=("Humedad",))
+    authorized_client.post("/lecturas/batch", json=[
+        {"sensor_id": viejo, "valor": 5.0, "fecha": (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()},
+    ])
+    suelto = SensorDB(nombre="Suelto", tipo="Humedad", marca="TestBrand", modelo="X1", sector_id=None)
+    db_session.add(suelto)
+    db_session.commit()
+    suelto_id = suelto.id
+
+    response = authorized_client.get("/sensores/")
+    assert response.status_code == 200
+    por_id = {s["id"]: s for s in response.json()}
+    # Fuera de la ventana de 24h sigue apareciendo su última lectura
+    assert por_id[viejo]["ultima_lectura"]["valor"] == 5.0
+    assert por_id[viejo]["lecturas_24h"] == 0
+    assert por_id[suelto_id]["sector_id"] is None
+
+
+class _SesionPostgres:
+    """Guarda el SQL que vería PostgreSQL sin ejecutarlo."""
+
+    class _Bind:
+        class dialect:
+            name = "postgresql"
+
+    def __init__(self):
+        self.sql = None
+
+    def get_bind(self):
+        return self._Bind
+
+    def execute(self, consulta):
+        self.sql = " ".join(str(consulta.compile(dialect=postgresql.dialect())).split())
+        return []
+
+
+def test_lecturas_recientes_en_postgres_usa_lateral_con_limite():
+    sesion = _SesionPostgres()
+    crud.lecturas_recientes(sesion, [1, 2], 5)
+    # Cada sensor corta en `limite` filas del índice: sin ROW_NUMBER sobre todo el historial
+    assert "JOIN LATERAL" in sesion.sql
+    assert "ORDER BY lecturas.fecha DESC, lecturas.id DESC LIMIT" in sesion.sql
+    assert "row_number" not in sesion.sql
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import insert, select
+
+from backend import series
+from backend.models_db import LecturaDB, SectorDB, SensorDB
+
+
+def test_buckets_sin_ordenar():
+    base = datetime(2026, 3, 1, 10, 0, tzinfo=timezone.utc)
+    serie = series.SerieTemporal()
+    for segundos, valor in ((130, 5.0), (10, 1.0), (50, 3.0), (70, 2.0)):
+        serie.agregar(base + timedelta(seconds=segundos), valor)
+    assert len(serie) == 4 and serie.nbytes == 64
+
+    inicios, cantidad, suma, minimo, maximo = serie.buckets(60)
+    assert [series.fecha_de(i) for i in inicios] == [base, base + timedelta(minutes=1), base + timedelta(minutes=2)]
+    assert cantidad.tolist() == [2, 1, 1]
+    assert suma.tolist() == [4.0, 2.0, 5.0]
+    assert minimo.tolist() == [1.0, 2.0, 5.0] and maximo.tolist() == [3.0, 2.0, 5.0]
+
+    # numpy() es una vista: no copia los buffers
+    tiempos, _ = serie.numpy()
+    assert not tiempos.flags.owndata
+    assert series.SerieTemporal().buckets(60)[0].size == 0
+
+
+def test_cargar_desde_core(db_session):
+    sector = SectorDB(nombre="Sector Series", humedad_minima=30, temp_maxima=40)
+    sector.sensores = [SensorDB(nombre=f"S{i}", tipo="Humedad", marca="M", modelo="X") for i in range(2)]
+    db_session.add(sector)
+    db_session.commit()
+    a, b = (s.id for s in sector.sensores)
+    base = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    db_session.execute(insert(LecturaDB), [
+        {"sensor_id": sensor_id, "valor": float(i), "fecha": base + timedelta(minutes=i)}
+        for i in range(5) for sensor_id in (a, b)
+    ])
+    db_session.commit()
+
+    por_sensor = series.cargar(db_session, select(LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha))
+    assert set(por_sensor) == {a, b}
+    tiempos, valores = por_sensor[a].numpy()
+    assert valores.tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert tiempos[0] == base.timestamp()
+
+    recorte = series.cargar(db_session, (
+        select(LecturaDB.sensor_id, LecturaDB.valor, LecturaDB.fecha)
+        .where(LecturaDB.sensor_id == b, LecturaDB.fecha >= base + timedelta(minutes=1), LecturaDB.fecha < base + timedelta(minutes=3))
+        .order_by(LecturaDB.fecha)
+    ))[b]
+    assert list(recorte.valores) == [1.0, 2.0]
+    assert np.all(np.diff(recorte.numpy()[0]) == 60)
+    # Sin ORM: nada quedó en el identity map
+    assert not any(clave[0] is LecturaDB for clave in db_session.identity_map.keys())
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend import dependencies
+from backend.auth import PoolHashing
+from backend.cache import BackendMemoria, Cache
+from backend.dependencies import cache_usuarios
+from backend.models_db import FincaDB, UserDB
+
+
+def test_usuario_autenticado_sale_de_cache(authorized_client):
+    authorized_client.get("/sectores/")
+    authorized_client.get("/sectores/")
+    authorized_client.get("/sectores/")
+
+    estadisticas = cache_usuarios.estadisticas()
+    assert estadisticas["fallos"] == 1
+    assert estadisticas["aciertos"] == 2
+
+
+def test_cache_no_pierde_consultas_concurrentes():
+    cache = Cache("prueba", BackendMemoria(), ttl=60)
+    cache.guardar("a", 1)
+    hilos, vueltas = 8, 500
+
+    def consultar():
+        for _ in range(vueltas):
+            cache.obtener("a")
+            cache.obtener("b")
+
+    trabajadores = [threading.Thread(target=consultar) for _ in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+
+    estadisticas = cache.estadisticas()
+    assert estadisticas["aciertos"] == estadisticas["fallos"] == hilos * vueltas
+
+
+def test_desactivar_usuario_invalida_cache(authorized_client, db_session):
+    assert authorized_client.get("/sectores/").status_code == 200
+
+    usuario = db_session.query(UserDB).filter(UserDB.username == "testuser").first()
+    usuario.is_active = False
+    db_session.commit()
+
+    assert authorized_client.get("/sectores/").status_code == 401
+
+
+def test_cache_se_invalida_recien_en_el_commit(authorized_client, db_session):
+    authorized_client.get("/sectores/")
+    usuario = db_session.query(UserDB).filter(UserDB.username == "testuser").first()
+    usuario.is_active = False
+    db_session.flush()
+    # Un request que la releyera ahora volvería a cachear la fila vieja
+    assert cache_usuarios.backend.obtener("testuser") is not None
+    db_session.commit()
+    assert cache_usuarios.backend.obtener("testuser") is None
+
+
+def test_metricas_exponen_cache(authorized_client):
+    data = authorized_client.get("/metricas/").json()
+    assert data["cache_usuarios"]["backend"] == "BackendMemoria"
+
+
+def test_metricas_solo_para_admins(authorized_client, db_session, monkeypatch):
+    finca = FincaDB(nombre="Norte")
+    db_session.add(finca)
+    db_session.flush()
+    db_session.query(UserDB).filter(UserDB.username == "testuser").first().finca_id = finca.id
+    db_session.commit()
+    monkeypatch.setattr(dependencies, "ADMIN_USUARIOS", set())
+
+    assert authorized_client.get("/sectores/").status_code == 200
+    assert authorized_client.get("/metricas/").status_code == 403
+    assert authorized_client.get("/metricas/prometheus").status_code == 403
+
+
+def test_registro_y_login(client):
+    response = client.post("/usuarios/", json={"username": "ana", "password": "secreta"})
+    assert response.status_code == 201
+
+    response = client.post("/token/", data={"username": "ana", "password": "secreta"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+    assert client.post("/token/", data={"username": "ana", "password": "otra"}).status_code == 401
+    assert client.post("/token/", data={"username": "nadie", "password": "x"}).status_code == 401
+
+
+def test_registro_concurrente_con_el_mismo_nombre(client, monkeypatch):
+    from backend.routers import usuarios
+    assert client.post("/usuarios/", json={"username": "ana", "password": "secreta"}).status_code == 201
+
+    # El otro registro pasa el chequeo previo antes de que el primero haga commit
+    monkeypatch.setattr(usuarios, "_buscar_usuario", lambda db, username: None)
+    response = client.post("/usuarios/", json={"username": "ana", "password": "otra"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Usuario ya registrado"
+
+
+def test_login_con_bcrypt_saturado_responde_503(client, monkeypatch):
+    from backend import auth
+    client.post("/usuarios/", json={"username": "ana", "password": "secreta"})
+
+    monkeypatch.setattr(auth.pool_hashing, "pendientes", auth.pool_hashing.hilos + auth.pool_hashing.max_en_cola)
+    response = client.post("/token/", data={"username": "ana", "password": "secreta"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_pool_hashing_no_cuenta_fallidas_como_completadas():
+    pool = PoolHashing(hilos=1, max_en_cola=4)
+
+    def falla():
+        raise ValueError("hash inválido")
+
+    async def usar():
+        assert await pool.ejecutar(lambda: "ok") == "ok"
+        with pytest.raises(ValueError):
+            await pool.ejecutar(falla)
+
+    asyncio.run(usar())
+    estadisticas = pool.estadisticas()
+    assert estadisticas["completadas"] == 1
+    assert estadisticas["fallidas"] == 1
+    assert estadisticas["en_cola"] == 0 and estadisticas["en_curso"] == 0
@@ -0,0 +1,28 @@
+# Crea el índice compuesto (sensor_id, fecha DESC) en una base ya existente.
+# Uso: python -m migrations.m001_indice_lecturas
+from sqlalchemy import text
+
+from backend.database import engine
+
+
+def migrar():
+    print("🔧 Creando índice ix_lecturas_sensor_fecha...")
+    if engine.dialect.name == "postgresql":
+        # CONCURRENTLY no bloquea los INSERT de los sensores, pero no puede
+        # correr dentro de una transacción
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lecturas_sensor_fecha "
+                "ON lecturas (sensor_id, fecha DESC)"
+            ))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_lecturas_sensor_fecha "
+                "ON lecturas (sensor_id, fecha DESC)"
+            ))
+    print("✅ Índice listo.")
+
+
+if __name__ == "__main__":
+    migrar()
@@ -0,0 +1,64 @@
+# Convierte la tabla lecturas existente en una tabla particionada por mes.
+# Solo PostgreSQL. Correr con la API detenida (copia todos los datos).
+# Uso: python -m migrations.m002_particionar_lecturas [--borrar-vieja]
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from backend.database import engine
+from backend.particiones import (
+    DDL_LECTURAS_PARTICIONADA, DDL_INDICES, MESES_ADELANTE, crear_particiones,
+)
+
+
+def migrar(borrar_vieja: bool = False):
+    if engine.dialect.name != "postgresql":
+        print("ℹ️ El particionado nativo es solo para PostgreSQL; en SQLite no hay nada que migrar.")
+        return
+
+    with engine.begin() as conn:
+        ya_particionada = conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'lecturas')"
+        )).scalar()
+        if ya_particionada:
+            print("✅ lecturas ya está particionada.")
+            return
+
+        print("🚚 Renombrando lecturas -> lecturas_legacy...")
+        conn.execute(text("ALTER TABLE lecturas RENAME TO lecturas_legacy"))
+        conn.execute(text("ALTER INDEX IF EXISTS ix_lecturas_id RENAME TO ix_lecturas_legacy_id"))
+        conn.execute(text("ALTER INDEX IF EXISTS ix_lecturas_sensor_fecha RENAME TO ix_lecturas_legacy_sensor_fecha"))
+
+        print("🧱 Creando tabla particionada y particiones mensuales...")
+        conn.execute(text(DDL_LECTURAS_PARTICIONADA))
+        for ddl in DDL_INDICES:
+            conn.execute(text(ddl))
+
+        minima = conn.execute(text("SELECT MIN(fecha) FROM lecturas_legacy")).scalar()
+        hoy = datetime.now(timezone.utc).date()
+        desde = minima.date() if minima else hoy
+        meses_historia = (hoy.year - desde.year) * 12 + (hoy.month - desde.month)
+        crear_particiones(conn, desde, meses_historia + MESES_ADELANTE)
+
+        print("📦 Copiando datos...")
+        copiadas = conn.execute(text(
+            "INSERT INTO lecturas (id, valor, fecha, sensor_id) "
+            "SELECT id, valor, COALESCE(fecha, now()), sensor_id FROM lecturas_legacy"
+        )).rowcount
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('lecturas', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM lecturas), 0) + 1, false)"
+        ))
+        print(f"✅ Se copiaron {copiadas} lecturas.")
+
+        if borrar_vieja:
+            conn.execute(text("DROP TABLE lecturas_legacy"))
+            print("🗑️ Tabla lecturas_legacy eliminada.")
+
+    print("🎉 Migración terminada. Activá LECTURAS_PARTICIONADAS=1 en el entorno.")
+
+
+if __name__ == "__main__":
+    migrar(borrar_vieja="--borrar-vieja" in sys.argv)
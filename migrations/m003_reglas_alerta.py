@@ -0,0 +1,24 @@
+# Agrega sectores.cultivo y la tabla reglas_alerta en una base ya existente.
+# Uso: python -m migrations.m003_reglas_alerta
+from sqlalchemy import inspect, text
+
+from backend.database import engine
+from backend.models_db import ReglaAlertaDB
+
+
+def migrar():
+    print("🔧 Agregando columna sectores.cultivo...")
+    columnas = {c["name"] for c in inspect(engine).get_columns("sectores")}
+    with engine.begin() as conn:
+        if "cultivo" not in columnas:
+            # Columna nullable sin default: en PostgreSQL no reescribe la tabla
+            conn.execute(text("ALTER TABLE sectores ADD COLUMN cultivo VARCHAR"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sectores_cultivo ON sectores (cultivo)"))
+
+    print("🔧 Creando tabla reglas_alerta...")
+    ReglaAlertaDB.__table__.create(engine, checkfirst=True)
+    print("✅ Reglas de alerta listas.")
+
+
+if __name__ == "__main__":
+    migrar()
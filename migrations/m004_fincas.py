@@ -0,0 +1,40 @@
+# Agrega la tabla fincas y finca_id (con índice) en usuarios, sectores y
+# reglas_alerta en una base ya existente. Los datos sin finca (NULL) solo los
+# ven los administradores, así que lo que ya había pasa a una finca
+# "Principal": los usuarios actuales siguen viendo lo mismo que antes.
+# Uso: python -m migrations.m004_fincas
+from sqlalchemy import inspect, text
+
+from backend.database import engine
+from backend.models_db import FincaDB
+
+TABLAS = ("usuarios", "sectores", "reglas_alerta")
+FINCA_INICIAL = "Principal"
+
+
+def migrar():
+    print("🔧 Creando tabla fincas...")
+    FincaDB.__table__.create(engine, checkfirst=True)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for tabla in TABLAS:
+            print(f"🔧 Agregando columna {tabla}.finca_id...")
+            columnas = {c["name"] for c in inspector.get_columns(tabla)}
+            if "finca_id" not in columnas:
+                # Columna nullable sin default: en PostgreSQL no reescribe la tabla
+                conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN finca_id INTEGER REFERENCES fincas (id)"))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_finca_id ON {tabla} (finca_id)"))
+
+        # Solo la primera vez: en corridas posteriores los NULL son usuarios nuevos sin asignar
+        if conn.scalar(text("SELECT COUNT(*) FROM fincas")) == 0:
+            print(f"🔧 Pasando los datos existentes a la finca \"{FINCA_INICIAL}\"...")
+            conn.execute(text("INSERT INTO fincas (nombre) VALUES (:nombre)"), {"nombre": FINCA_INICIAL})
+            finca_id = conn.scalar(text("SELECT id FROM fincas WHERE nombre = :nombre"), {"nombre": FINCA_INICIAL})
+            for tabla in TABLAS:
+                conn.execute(text(f"UPDATE {tabla} SET finca_id = :finca WHERE finca_id IS NULL"), {"finca": finca_id})
+    print("✅ Fincas listas.")
+
+
+if __name__ == "__main__":
+    migrar()